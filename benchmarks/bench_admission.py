@@ -0,0 +1,123 @@
+"""
+准入控制基准测试：20 个用户同时在一台 8 核 16 GB 的主机上开始训练（每个 2 核 2 GB），
+对比不做准入（全部立即启动，CPU 按比例共享、内存超出后换页）与 ResourceLedger 排队，
+统计完成时间、峰值占用，以及排队时给出的等待估算与实际等待的误差。
+时间按 1 秒 = 1 个模拟分钟缩放，训练时长在 2~6 分钟之间。
+最后检查多 worker：另一个 worker 的账本核对后能看到这个 worker 创建的容器，主机占满时排队
+
+运行: python -m benchmarks.bench_admission [用户数] [随机种子]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.fake_docker import start_fake_docker
+from utils import ResourceLedger as ledger_module
+from utils.AsyncDocker import AsyncDockerEngine
+from utils.ResourceLedger import ResourceLedger
+
+NCPU = 8
+MEMORY = 16 * 1024 ** 3
+CPU_NEED = 2
+MEMORY_NEED = 2 * 1024 ** 3
+# 内存超出后换页带来的额外减速倍数
+SWAP_PENALTY = 4
+
+
+def oversubscribed(durations):
+    """全部立即启动：按处理器共享推进，内存超出时所有任务再按 SWAP_PENALTY 减速"""
+    remaining = list(durations)
+    done = [None] * len(durations)
+    clock = 0.0
+    while any(r > 0 for r in remaining):
+        active = [i for i, r in enumerate(remaining) if r > 0]
+        speed = min(1.0, NCPU / (CPU_NEED * len(active)))
+        if MEMORY_NEED * len(active) > MEMORY * ledger_module.MEMORY_FRACTION:
+            speed /= SWAP_PENALTY
+        step = min(remaining[i] for i in active) / speed
+        clock += step
+        for i in active:
+            remaining[i] -= step * speed
+            if remaining[i] <= 1e-9:
+                remaining[i] = 0
+                done[i] = clock
+    return done
+
+
+async def admitted(durations):
+    server, state, url = start_fake_docker(latency=0.001, ncpu=NCPU, memory=MEMORY)
+    engine = AsyncDockerEngine(url)
+    ledger = ResourceLedger(url)
+    ledger_module.MEMORY_FRACTION = 1.0
+    await ledger.initialize(engine)
+    ledger.average_duration = statistics.mean(durations)  # 相当于已有历史数据
+    start = time.time()
+    peak = [0.0]
+    results = {}
+
+    async def user(i, duration):
+        ticket = ledger.request(i, CPU_NEED, MEMORY_NEED)
+        estimate = None if ticket.admitted else ledger.estimate_wait(str(i))
+        await ticket.wait()
+        waited = time.time() - start
+        peak[0] = max(peak[0], ledger.cpu_reserved)
+        await asyncio.sleep(duration)
+        ledger.release(i)
+        results[i] = (estimate, waited, time.time() - start)
+
+    await asyncio.gather(*(user(i, d) for i, d in enumerate(durations)))
+    engine.close()
+    server.shutdown()
+    return results, peak[0]
+
+
+async def two_workers():
+    """worker A 创建占满主机的容器，worker B 的账本 refresh 后新申请排队，容器删除后核对时分配"""
+    server, state, url = start_fake_docker(latency=0.001, ncpu=NCPU, memory=MEMORY)
+    engine = AsyncDockerEngine(url)
+    worker_a, worker_b = ResourceLedger(url), ResourceLedger(url)
+    await worker_a.initialize(engine)
+    await worker_b.initialize(engine)
+    containers = []
+    for i in range(NCPU // CPU_NEED):
+        assert worker_a.request(i, CPU_NEED, MEMORY_NEED).admitted
+        container = await engine.create_container(image="model:latest", name=f"project_{i}")
+        await engine.start(container)
+        await engine.limit_cpu(container, CPU_NEED)
+        containers.append(container)
+    worker_b.reconciled_at = 0
+    await worker_b.refresh(engine)
+    ticket = worker_b.request(100, CPU_NEED, MEMORY_NEED)
+    seen, queued = worker_b.cpu_reserved, not ticket.admitted
+    for container in containers:
+        await engine.remove(container, force=True)
+    await worker_b.reconcile(engine)
+    engine.close()
+    server.shutdown()
+    print(f"  two workers: B sees {seen:.0f}/{NCPU} cpu from A's containers, new request queued "
+          f"{queued}, admitted after A's containers exit {ticket.admitted}")
+    assert seen == NCPU and queued and ticket.admitted
+
+
+async def main(users, seed):
+    rng = random.Random(seed)
+    durations = [rng.uniform(2, 6) for _ in range(users)]
+    baseline = oversubscribed(durations)
+    results, peak = await admitted(durations)
+    completion = [results[i][2] for i in range(users)]
+    errors = [abs(est - waited) for est, waited, _ in results.values() if est is not None]
+    print(f"{users} users x {CPU_NEED} cpu / {MEMORY_NEED // 1024 ** 3} GB on {NCPU} cpu / {MEMORY // 1024 ** 3} GB "
+          f"(1 s = 1 simulated minute)")
+    print(f"  no admission: mean completion {statistics.mean(baseline):5.2f}  p50 {statistics.median(baseline):5.2f}  "
+          f"max {max(baseline):5.2f}  peak cpu demand {CPU_NEED * users}/{NCPU}")
+    print(f"  ledger queue: mean completion {statistics.mean(completion):5.2f}  p50 {statistics.median(completion):5.2f}  "
+          f"max {max(completion):5.2f}  peak cpu reserved {peak:.0f}/{NCPU}")
+    print(f"  queued {len(errors)}, wait estimate abs error mean {statistics.mean(errors):.2f} "
+          f"max {max(errors):.2f} (mean wait {statistics.mean(r[1] for r in results.values()):.2f})")
+    await two_workers()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20, int(sys.argv[2]) if len(sys.argv) > 2 else 5))
@@ -0,0 +1,65 @@
+"""
+共享依赖基础镜像基准测试：在模拟的 Docker API 上依次构建 data/Model 下的所有模型，
+模拟的守护进程对每条 pip install 计入固定的耗时和层大小，对比
+  uncached: 每个模型按原 Dockerfile 完整构建
+  context:  只按构建上下文哈希复用镜像
+  base:     构建上下文哈希 + 按 requirements.txt 共享 aiforge-base 基础镜像
+的构建耗时、依赖安装层数量和新增层大小
+
+运行: python -m benchmarks.bench_base_image [pip install 耗时毫秒] [依赖层大小MB]
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks.bench_build_cache import model_contexts
+from benchmarks.fake_docker import start_fake_docker
+from utils import ImageBuilder as image_builder_module
+from utils.AsyncDocker import AsyncDockerEngine
+from utils.ImageBuilder import ImageBuilder, BUILD_SUCCEEDED
+
+# 每次构建除依赖安装以外的固定耗时（秒）
+BUILD_OVERHEAD = 0.05
+
+
+def report(label, state, elapsed, count):
+    print(f"{label:>9}: {elapsed:6.2f}s ({elapsed / count * 1000:6.1f}ms/model)  builds {state.builds:3d}  "
+          f"pip layers {state.install_layers:3d}  new layers {state.layer_bytes / 1024 ** 2:9.1f}MB")
+
+
+async def run_case(label, contexts, install_latency, install_size, builder_cls=None):
+    server, state, url = start_fake_docker(latency=0.002, build_latency=BUILD_OVERHEAD,
+                                           install_latency=install_latency, install_size=install_size)
+    engine = AsyncDockerEngine(url)
+    started = time.perf_counter()
+    if builder_cls is None:
+        for model_id, context in contexts:
+            await engine.build_stream(context, f"{model_id}:latest")
+    else:
+        builder = builder_cls(engine)
+        for model_id, context in contexts:
+            record = await builder.build(model_id, context)
+            assert record.status == BUILD_SUCCEEDED, record.error
+    report(label, state, time.perf_counter() - started, len(contexts))
+    engine.close()
+    server.shutdown()
+
+
+async def main(install_latency, install_size):
+    contexts = model_contexts()
+    print(f"{len(contexts)} models, pip install {install_latency * 1000:.0f}ms and "
+          f"{install_size / 1024 ** 2:.0f}MB per dependency layer")
+    await run_case("uncached", contexts, install_latency, install_size)
+    plan = image_builder_module.plan_layered_build
+    image_builder_module.plan_layered_build = lambda context_dir: None
+    try:
+        await run_case("context", contexts, install_latency, install_size, ImageBuilder)
+    finally:
+        image_builder_module.plan_layered_build = plan
+    await run_case("base", contexts, install_latency, install_size, ImageBuilder)
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.5
+    size = int(float(sys.argv[2]) * 1024 ** 2) if len(sys.argv) > 2 else 300 * 1024 ** 2
+    asyncio.run(main(latency, size))
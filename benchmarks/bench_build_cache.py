@@ -0,0 +1,83 @@
+"""
+镜像构建缓存基准测试：在模拟的 Docker API（每次构建耗时固定）上依次上传 data/Model 下的所有模型，
+对比逐个完整构建与按构建上下文哈希复用镜像的构建次数和总耗时；
+再同时提交多个相同内容的构建，验证并发构建被合并为一次
+
+运行: python -m benchmarks.bench_build_cache [构建耗时毫秒] [并发数]
+"""
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.fake_docker import start_fake_docker
+from utils.AsyncDocker import AsyncDockerEngine
+from utils.ImageBuilder import ImageBuilder, find_build_context, BUILD_SUCCEEDED
+from utils.WebSocketConfig import get_channel
+
+MODEL_ROOT = os.path.join("data", "Model")
+
+
+def model_contexts():
+    model_ids = sorted((name for name in os.listdir(MODEL_ROOT) if name.isdigit()), key=int)
+    return [(model_id, find_build_context(os.path.join(MODEL_ROOT, model_id))) for model_id in model_ids]
+
+
+async def run_uncached(contexts, build_latency):
+    """原来的流程：每次上传都完整构建"""
+    server, state, url = start_fake_docker(latency=0.002, build_latency=build_latency)
+    engine = AsyncDockerEngine(url)
+    started = time.perf_counter()
+    for model_id, context in contexts:
+        await engine.build_image(context, f"{model_id}:latest")
+    elapsed = time.perf_counter() - started
+    print(f"uncached: {state.builds:3d} builds  {elapsed:6.2f}s")
+    engine.close()
+    server.shutdown()
+
+
+async def run_cached(contexts, build_latency):
+    server, state, url = start_fake_docker(latency=0.002, build_latency=build_latency)
+    engine = AsyncDockerEngine(url)
+    builder = ImageBuilder(engine)
+    started = time.perf_counter()
+    for model_id, context in contexts:
+        record = await builder.build(model_id, context, channel=f"model_{model_id}")
+        assert record.status == BUILD_SUCCEEDED, record.error
+    elapsed = time.perf_counter() - started
+    tagged = sum(f"{model_id}:latest" in state.images for model_id, _ in contexts)
+    print(f"  cached: {state.builds:3d} builds  {elapsed:6.2f}s  tagged {tagged}/{len(contexts)}  "
+          f"stats {builder.stats()}")
+    engine.close()
+    server.shutdown()
+
+
+async def run_concurrent(context, build_latency, count):
+    """同一内容的模型同时上传"""
+    server, state, url = start_fake_docker(latency=0.002, build_latency=build_latency)
+    engine = AsyncDockerEngine(url)
+    builder = ImageBuilder(engine)
+    started = time.perf_counter()
+    records = [builder.submit(f"burst{i}", context, channel=f"model_burst{i}") for i in range(count)]
+    submitted = time.perf_counter() - started
+    await asyncio.gather(*(record.task for record in records))
+    elapsed = time.perf_counter() - started
+    progress = [get_channel(f"model_burst{i}").next_seq for i in range(count)]
+    print(f"   burst: {count} uploads -> {state.builds} build  submit {submitted * 1000:.1f}ms  "
+          f"done {elapsed:.2f}s  progress messages per uploader {min(progress)}-{max(progress)}")
+    engine.close()
+    server.shutdown()
+
+
+async def main(build_latency, count):
+    contexts = model_contexts()
+    print(f"{len(contexts)} models from {MODEL_ROOT}, each build {build_latency * 1000:.0f}ms")
+    await run_uncached(contexts, build_latency)
+    await run_cached(contexts, build_latency)
+    await run_concurrent(contexts[0][1], build_latency, count)
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.5
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(latency, concurrency))
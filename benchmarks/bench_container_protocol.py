@@ -0,0 +1,127 @@
+"""
+容器请求通道基准测试：用子进程运行 data/resources/model_template/main.py（train/predict 换成
+固定耗时的桩函数），stdin/stdout 接到 socketpair 上代替 attach 连接，对比
+  stdin:  旧版模式，每次写入 predict 和参数两行，等到 PREDICT_COMPLETE 才能发下一条
+  framed: ContainerChannel 按请求 id 并发发送，结果按 id 返回
+的总耗时，并检查并发请求的日志没有串到其他请求
+
+运行: python -m benchmarks.bench_container_protocol [请求数] [单次推理耗时毫秒]
+"""
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from utils.ContainerProtocol import ContainerChannel
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "data", "resources", "model_template")
+
+STUB_PREDICT = '''import time
+
+def predict(params):
+    for step in range(3):
+        print(f"{params} step {step}")
+        time.sleep(%f / 3)
+    return {"input": params, "label": len(str(params))}
+'''
+
+STUB_TRAIN = '''def train(params):
+    print("trained", params)
+'''
+
+
+class ThreadEngine:
+    """ContainerChannel 只用到 engine.run，这里直接在线程中执行"""
+
+    async def run(self, op, func, *args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def start_container(workdir, env=None):
+    ours, theirs = socket.socketpair()
+    process = subprocess.Popen([sys.executable, "-u", "main.py"], cwd=workdir, env={**os.environ, **(env or {})},
+                               stdin=theirs.fileno(), stdout=theirs.fileno(), stderr=subprocess.STDOUT)
+    theirs.close()
+    return process, ours
+
+
+def stop_container(process, sock):
+    sock.close()
+    process.wait(timeout=5)
+
+
+def run_stdin(sock, count):
+    reader = sock.makefile("r", encoding="utf-8")
+    started = time.perf_counter()
+    for i in range(count):
+        sock.sendall(f"predict\nsample-{i}\n".encode())
+        for line in reader:
+            if line.strip() == "PREDICT_COMPLETE":
+                break
+    return time.perf_counter() - started
+
+
+async def attach_channel(sock) -> ContainerChannel:
+    """在 socketpair 上建立通道并握手，代替 ContainerChannel.open 的 attach"""
+    channel = ContainerChannel(ThreadEngine(), "bench")
+    channel._loop = asyncio.get_running_loop()
+    channel._sock = sock
+    threading.Thread(target=channel._read_loop, daemon=True).start()
+    assert await channel.hello()
+    return channel
+
+
+async def run_framed(sock, count):
+    channel = await attach_channel(sock)
+
+    async def one(i):
+        lines = []
+
+        async def on_log(line):
+            lines.append(line)
+
+        frame = await channel.request("predict", f"sample-{i}", on_log=on_log)
+        assert frame["data"] == {"input": f"sample-{i}", "label": len(f"sample-{i}")}, frame
+        assert lines == [f"sample-{i} step {step}" for step in range(3)], lines
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    channel.close()
+    return elapsed
+
+
+def main(count, latency):
+    workdir = tempfile.mkdtemp(prefix="aiforge-protocol-")
+    try:
+        # main.py 依赖模板目录中的 resident.py 和 batcher.py；模板的 predict.py 随后换成桩函数
+        shutil.copytree(TEMPLATE, workdir, dirs_exist_ok=True)
+        with open(os.path.join(workdir, "predict.py"), "w") as f:
+            f.write(STUB_PREDICT % latency)
+        with open(os.path.join(workdir, "train.py"), "w") as f:
+            f.write(STUB_TRAIN)
+        print(f"{count} predicts, {latency * 1000:.0f}ms each")
+
+        process, sock = start_container(workdir)
+        elapsed = run_stdin(sock, count)
+        stop_container(process, sock)
+        print(f"   stdin: {elapsed:6.2f}s ({count / elapsed:6.1f} req/s)")
+
+        process, sock = start_container(workdir)
+        elapsed = asyncio.run(run_framed(sock, count))
+        stop_container(process, sock)
+        print(f"  framed: {elapsed:6.2f}s ({count / elapsed:6.1f} req/s), logs and results matched by id")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.1
+    main(total, delay)
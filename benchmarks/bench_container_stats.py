@@ -0,0 +1,100 @@
+"""
+容器资源采集基准测试：模拟的 Docker API 运行在独立进程中，为 N 个运行中的项目容器每秒推送一次 stats，
+在本进程中分别只运行容器状态缓存、以及再加上 ContainerStatsCollector（每个容器一条长连接）时，
+测量事件循环的调度延迟（模拟 API worker）和本进程的 CPU 占用，并测量查询项目曲线和主机汇总的耗时
+
+运行: python -m benchmarks.bench_container_stats [容器数] [每阶段秒数]
+"""
+import asyncio
+import multiprocessing
+import statistics
+import sys
+import threading
+import time
+
+import docker
+
+from benchmarks.fake_docker import start_fake_docker
+
+PORT = 2391
+IMAGE = "python:3.10"
+TICK = 0.005
+
+
+def serve(port, ready):
+    start_fake_docker(port=port, latency=0.0, images=[IMAGE], stats_interval=1.0)
+    ready.set()
+    threading.Event().wait()
+
+
+async def measure(seconds):
+    """按 TICK 反复 sleep，记录每次实际唤醒比预期晚多少，同时统计本进程的 CPU 时间"""
+    lags = []
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    while time.perf_counter() - wall_started < seconds:
+        expected = time.perf_counter() + TICK
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - expected) * 1000)
+    cpu = (time.process_time() - cpu_started) / (time.perf_counter() - wall_started) * 100
+    lags.sort()
+    return statistics.median(lags), lags[int(len(lags) * 0.99)], lags[-1], cpu
+
+
+def report(label, result):
+    p50, p99, worst, cpu = result
+    print(f"{label:>18}: loop lag p50 {p50:6.3f}ms  p99 {p99:6.3f}ms  max {worst:6.2f}ms  process cpu {cpu:5.1f}%  "
+          f"threads {threading.active_count()}")
+
+
+def main(count, seconds):
+    from utils.ContainerStats import ContainerStatsCollector, RESOLUTION
+    from utils.DockerState import DockerStateCache
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(PORT, ready), daemon=True)
+    server.start()
+    ready.wait()
+    url = f"tcp://127.0.0.1:{PORT}"
+    client = docker.DockerClient(base_url=url, timeout=None)
+    for i in range(count):
+        client.api.start(client.api.create_container(IMAGE, name=f"project_{i}")["Id"])
+    state = DockerStateCache(client)
+    state.start()
+    print(f"{count} running project containers, stats pushed every 1s, {seconds}s per phase")
+
+    report("state cache only", asyncio.run(measure(seconds)))
+
+    collector = ContainerStatsCollector(url, state)
+    collector.start()
+    started = time.perf_counter()
+    while len(collector.streams) < count or collector.samples < count:
+        time.sleep(0.05)
+    print(f"{len(collector.streams)} streams open after {time.perf_counter() - started:.2f}s")
+    samples, busy = collector.samples, collector.busy_seconds
+    report("+ stats collector", asyncio.run(measure(seconds)))
+    rate = (collector.samples - samples) / seconds
+    print(f"    {rate:.0f} samples/s, parse+aggregate {(collector.busy_seconds - busy) / seconds * 100:.2f}% of one core")
+
+    # 等到所有项目至少有一个完整的点，再测查询
+    time.sleep(RESOLUTION)
+    timings = {}
+    for label, query in (("project series", lambda: collector.project_series(0, 120)),
+                         ("host aggregate", lambda: collector.host_series(120))):
+        samples = []
+        for _ in range(50):
+            started = time.perf_counter()
+            result = query()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[label] = statistics.median(samples)
+        print(f"{label:>18}: p50 {timings[label]:.3f}ms, {len(result['timestamps'])} points, current {result['current']}")
+    print(f"collector stats: {collector.stats()}")
+
+    collector.close()
+    state.close()
+    server.terminate()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+    main(total, duration)
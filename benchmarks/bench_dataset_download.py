@@ -0,0 +1,160 @@
+"""
+数据集下载基准测试：生成一个包含 PNG、.gz 和 CSV 文件的数据集目录，分别用原来的做法
+（在 BytesIO 中用 ZIP_DEFLATED 打包全部文件后一次返回）和 ArchiveCache（/Dataset/download 的新实现）下载，
+对比首字节时间、总耗时和服务进程的峰值 RSS，再测量缓存命中时的下载，并检查 Range 续传得到的文件与完整下载一致
+
+需要 uvicorn、httpx
+运行: python -m benchmarks.bench_dataset_download [数据集 MB]
+"""
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import httpx
+import numpy as np
+from PIL import Image
+
+PORT = 2393
+
+
+def build_app(mode: str, dataset_dir: str, cache_dir: str):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import FileResponse, Response, StreamingResponse
+    from utils.ArchiveCache import ArchiveCache
+
+    app = FastAPI()
+    cache = ArchiveCache(cache_dir)
+
+    @app.get("/rss")
+    async def rss():
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return {key: int(fields[key].split()[0]) * 1024 for key in ("VmHWM", "VmRSS")}
+
+    if mode == "before":
+        @app.get("/download")
+        async def download_before():
+            # 原来的实现返回 JSON 包装的字节，二进制内容无法编码；这里直接返回字节，只比较打包方式
+            zip_buffer = io.BytesIO()
+            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for root, dirs, files in os.walk(dataset_dir):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        zipf.write(file_path, os.path.relpath(file_path, dataset_dir))
+            return Response(zip_buffer.getvalue(), media_type="application/zip")
+    else:
+        @app.get("/download")
+        async def download_after(request: Request):
+            path, build = await cache.lookup("dataset_1", dataset_dir)
+            if build is not None and request.headers.get("range"):
+                path = await build.wait()
+            if path is not None:
+                return FileResponse(path, media_type="application/zip", filename="dataset_1.zip")
+            return StreamingResponse(cache.stream(build), media_type="application/zip")
+    return app
+
+
+def serve(mode: str, dataset_dir: str, cache_dir: str):
+    import uvicorn
+    uvicorn.run(build_app(mode, dataset_dir, cache_dir), host="127.0.0.1", port=PORT, log_level="warning")
+
+
+def make_dataset(directory: str, size: int):
+    """约一半是随机像素的 PNG（已压缩），四分之一是 .gz，其余是可压缩的 CSV"""
+    rng = np.random.default_rng(0)
+    images = os.path.join(directory, "images")
+    os.makedirs(images)
+    written, index = 0, 0
+    while written < size // 2:
+        path = os.path.join(images, f"{index:05d}.png")
+        Image.fromarray(rng.integers(0, 255, (256, 256, 3), dtype=np.uint8)).save(path, compress_level=1)
+        written += os.path.getsize(path)
+        index += 1
+    with gzip.open(os.path.join(directory, "train-images-idx3-ubyte.gz"), "wb", compresslevel=1) as f:
+        f.write(rng.bytes(size // 4))
+    labels = os.path.join(directory, "labels")
+    os.makedirs(labels)
+    rows = "".join(f"{i},{i % 10},{i * 7 % 101}\n" for i in range(200_000)).encode()
+    for i in range(max(1, size // 4 // len(rows))):
+        with open(os.path.join(labels, f"{i:03d}.csv"), "wb") as f:
+            f.write(rows)
+
+
+def download(client, headers=None):
+    started = time.perf_counter()
+    first = None
+    digest = hashlib.sha256()
+    total = 0
+    with client.stream("GET", "/download", headers=headers) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            if first is None:
+                first = time.perf_counter() - started
+            digest.update(chunk)
+            total += len(chunk)
+    return first * 1000, (time.perf_counter() - started), total, digest.hexdigest(), response.status_code
+
+
+def run(mode: str, dataset_dir: str, base: str):
+    cache_dir = os.path.join(base, f"cache-{mode}")
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_dataset_download", "serve", mode,
+                               dataset_dir, cache_dir])
+    client = httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=600)
+    try:
+        while True:
+            try:
+                idle = client.get("/rss").json()["VmRSS"]
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        labels = ("first", "cached") if mode == "after" else ("first",)
+        results = {}
+        for label in labels:
+            ttfb, elapsed, total, digest, _ = download(client)
+            results[label] = digest
+            peak = client.get("/rss").json()["VmHWM"]
+            print(f"{mode:>6} {label:>6}: ttfb {ttfb:8.1f}ms  total {elapsed:6.2f}s  {total / 1024 ** 2:6.1f}MB  "
+                  f"peak rss {peak / 1024 ** 2:6.1f}MB (idle {idle / 1024 ** 2:.1f}MB)")
+        if mode == "after":
+            assert results["first"] == results["cached"]
+            # 续传：先取前一半，再用 Range 取剩余部分
+            head = client.get("/download", headers={"range": f"bytes=0-{total // 2 - 1}"})
+            tail = client.get("/download", headers={"range": f"bytes={total // 2}-"})
+            assert head.status_code == tail.status_code == 206
+            assert hashlib.sha256(head.content + tail.content).hexdigest() == digest
+            with zipfile.ZipFile(io.BytesIO(head.content + tail.content)) as archive:
+                assert archive.testzip() is None
+                stored = sum(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+                print(f"  range resume: 206 + 206, identical archive, {stored}/{len(archive.infolist())} entries stored "
+                      f"without recompression")
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+
+
+def main(size):
+    base = tempfile.mkdtemp(prefix="aiforge-download-")
+    try:
+        dataset_dir = os.path.join(base, "dataset")
+        make_dataset(dataset_dir, size)
+        files = sum(len(names) for _, _, names in os.walk(dataset_dir))
+        print(f"dataset: {files} files, {sum(os.path.getsize(os.path.join(r, n)) for r, _, ns in os.walk(dataset_dir) for n in ns) / 1024 ** 2:.0f}MB")
+        for mode in ("before", "after"):
+            run(mode, dataset_dir, base)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        main(int(sys.argv[1] if len(sys.argv) > 1 else 400) * 1024 ** 2)
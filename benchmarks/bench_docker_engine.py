@@ -0,0 +1,90 @@
+"""
+Docker 调用基准测试：在模拟的 Docker API（每次请求固定延迟）上并发执行 N 个
+create+start 和 stop+remove，对比在事件循环中直接调用同步 SDK 与 AsyncDockerEngine，
+统计每个请求的延迟以及同时运行的心跳协程观察到的事件循环最大停顿
+
+运行: python -m benchmarks.bench_docker_engine [并发数] [延迟毫秒]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import docker
+
+from benchmarks.fake_docker import start_fake_docker
+from utils.AsyncDocker import AsyncDockerEngine
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - start - 0.005)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+async def blocking_create(client, name, started):
+    """旧实现：协程中直接调用同步 SDK"""
+    container = client.containers.create(image="python:3.10", name=name, stdin_open=True, tty=True)
+    container.start()
+    return container, time.perf_counter() - started
+
+
+async def blocking_stop(client, container, started):
+    container.stop()
+    container.remove()
+    return time.perf_counter() - started
+
+
+async def engine_create(engine: AsyncDockerEngine, name, started):
+    container = await engine.create_container(image="python:3.10", name=name, stdin_open=True, tty=True)
+    await engine.start(container)
+    return container, time.perf_counter() - started
+
+
+async def engine_stop(engine: AsyncDockerEngine, container, started):
+    await engine.stop(container)
+    await engine.remove(container)
+    return time.perf_counter() - started
+
+
+async def run_case(label, create, stop_fn, target, count):
+    """两轮并发请求：先同时创建 count 个容器，再同时停止；延迟从请求全部到达时算起"""
+    stop = asyncio.Event()
+    lags = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    start = time.perf_counter()
+    created = await asyncio.gather(*(create(target, f"{label}_{i}", start) for i in range(count)))
+    middle = time.perf_counter()
+    stops = await asyncio.gather(*(stop_fn(target, container, middle) for container, _ in created))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    creates = [c[1] * 1000 for c in created]
+    stops = [s * 1000 for s in stops]
+    print(f"{label:>8}: total {elapsed:6.2f}s | create p50 {statistics.median(creates):7.1f}ms "
+          f"p99 {percentile(creates, 0.99):7.1f}ms | stop p50 {statistics.median(stops):7.1f}ms "
+          f"p99 {percentile(stops, 0.99):7.1f}ms | loop max stall {max(lags or [0]) * 1000:7.1f}ms")
+
+
+async def main(count: int, latency: float):
+    server, state, url = start_fake_docker(latency=latency, images=["python:3.10"])
+    client = docker.DockerClient(base_url=url, timeout=None)
+    engine = AsyncDockerEngine(url)
+    print(f"{count} concurrent create/stop, fake daemon latency {latency * 1000:.0f}ms per request")
+    await run_case("blocking", blocking_create, blocking_stop, client, count)
+    await run_case("engine", engine_create, engine_stop, engine, count)
+    print(f"engine stats: {engine.stats()}")
+    engine.close()
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+                     float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.05))
@@ -0,0 +1,87 @@
+"""
+镜像/容器状态缓存基准测试：在模拟的 Docker API 上，对比按守护进程列表查询镜像是否存在
+（原 DockerCore.search_image 的做法）与查本地缓存的耗时，并在创建、重命名、停止、删除容器
+和打标签、删除镜像之后检查缓存是否与守护进程一致以及事件到达的延迟
+
+运行: python -m benchmarks.bench_docker_state [镜像数] [查询次数] [请求延迟毫秒]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import docker
+
+from benchmarks.fake_docker import start_fake_docker
+from utils.AsyncDocker import AsyncDockerEngine
+from utils.DockerState import DockerStateCache
+
+
+async def search_by_listing(engine, image_name):
+    images = await engine.list_images(name=image_name.split(":")[0])
+    return any(image_name in image.tags for image in images)
+
+
+async def wait_until(predicate, timeout=5.0):
+    """等待缓存反映守护进程上的变化，返回等待时间（毫秒）"""
+    started = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - started > timeout:
+            raise AssertionError("缓存没有在超时前更新")
+        await asyncio.sleep(0.001)
+    return (time.perf_counter() - started) * 1000
+
+
+async def main(image_count, lookups, latency):
+    images = [f"{i}:latest" for i in range(image_count)]
+    server, state, url = start_fake_docker(latency=latency, images=images, build_latency=0)
+    engine = AsyncDockerEngine(url)
+    cache = DockerStateCache(docker.DockerClient(base_url=url, timeout=None))
+    started = time.perf_counter()
+    cache.start()
+    print(f"{image_count} images, request latency {latency * 1000:.0f}ms, seed {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    targets = [images[i % image_count] for i in range(lookups)]
+    started = time.perf_counter()
+    for image in targets:
+        assert await search_by_listing(engine, image)
+    listing = (time.perf_counter() - started) / lookups
+    list_calls = state.calls["GET /images/json"]
+    started = time.perf_counter()
+    for image in targets:
+        assert cache.has_image(image)
+    cached = (time.perf_counter() - started) / lookups
+    print(f"lookup: listing {listing * 1e6:9.1f}us  cache {cached * 1e6:6.2f}us  "
+          f"daemon calls {list_calls} -> {state.calls['GET /images/json'] - list_calls}")
+
+    lags = []
+    image = await engine.find_image(images[0])
+    await engine.tag_image(image, "retagged", "v1")
+    lags.append(await wait_until(lambda: cache.image_id("retagged:v1") == image.id))
+    await asyncio.to_thread(engine.client.images.remove, "retagged:v1")
+    lags.append(await wait_until(lambda: not cache.has_image("retagged:v1")))
+    for i in range(20):
+        container = await engine.create_container(image=images[0], name=f"project_{i}")
+        lags.append(await wait_until(lambda: cache.container(f"project_{i}") is not None))
+        await engine.start(container)
+        lags.append(await wait_until(lambda: cache.container(f"project_{i}").status == "running"))
+        await engine.rename(container, f"renamed_{i}")
+        lags.append(await wait_until(lambda: cache.container(f"renamed_{i}") is not None
+                                     and cache.container(f"project_{i}") is None))
+        await engine.stop(container)
+        lags.append(await wait_until(lambda: cache.container(f"renamed_{i}").status == "exited"))
+        await engine.remove(container)
+        lags.append(await wait_until(lambda: cache.container_id(f"renamed_{i}") is None))
+    print(f"events: {len(lags)} changes applied, lag p50 {statistics.median(lags):.1f}ms  max {max(lags):.1f}ms  "
+          f"stats {cache.stats()}")
+
+    cache.close()
+    engine.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    delay = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.005
+    asyncio.run(main(count, total, delay))
@@ -0,0 +1,140 @@
+"""
+空闲容器回收基准测试：在模拟的 Docker API 上（容器启动有固定耗时、运行中的容器报告固定内存占用）
+用 DockerCore 为一批项目创建容器，模拟时间流逝让 IdleReaper 先暂停、再停止空闲容器，
+统计回收的内存，并测量下一次请求时各种恢复方式（unpause / start / 从镜像重建，冷启动与预热容器）的延迟
+
+数据库使用内存中的 SQLite；模拟的守护进程监听 2375 端口（导入 models 时会连接该地址）
+
+运行: python -m benchmarks.bench_idle_reaper [项目数] [容器启动耗时毫秒] [容器内存MB]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.fake_docker import start_fake_docker
+
+IMAGE = "1:latest"
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    return (f"p50 {statistics.median(ordered):7.1f}ms  p99 {ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]:7.1f}ms"
+            f"  (n={len(ordered)})")
+
+
+async def timed_resume(core, projects):
+    latencies = []
+    for project in projects:
+        started = time.perf_counter()
+        core.reaper.begin(project.project_id)
+        try:
+            container = await core.ensure_container(project)
+        finally:
+            core.reaper.end(project.project_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert container.status in ("running", "paused", "created", "exited")
+    return latencies
+
+
+async def recreate_each(core, projects, wait_refill):
+    """逐个重建，按是否租用到预热容器分成两组延迟；wait_refill(i) 为真时先等预热池补充完成再重建第 i 个"""
+    warm, cold = [], []
+    for i, project in enumerate(projects):
+        if wait_refill(i):
+            await wait_for(lambda: all(task.done() for task in core.warm_pool._refills.values()))
+        hits = core.warm_pool.hits
+        latency = await timed_resume(core, [project])
+        (warm if core.warm_pool.hits > hits else cold).extend(latency)
+    return warm, cold
+
+
+async def wait_for(predicate, timeout=10.0):
+    started = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - started > timeout:
+            raise AssertionError("等待超时")
+        await asyncio.sleep(0.01)
+
+
+async def main(count, start_latency, memory):
+    from tortoise import Tortoise
+    import models
+    from models import Job, Project
+    from utils import IdleReaper as reaper_module
+    from utils.DockerCore import DockerCore
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["models"]})
+    await Tortoise.generate_schemas()
+    server, state, url = start_fake_docker(port=0, latency=0.002, start_latency=start_latency,
+                                           container_memory=memory, images=[IMAGE], ncpu=256,
+                                           memory=1024 ** 4)
+    core = DockerCore(url)
+    projects = [await Project.create(project_name=f"p{i}", description="", user_id="u", visibility="0",
+                                     model_id=1, train_dataset_id=1, test_dataset_id=1, project_type="t")
+                for i in range(count)]
+    print(f"{count} projects, container start {start_latency * 1000:.0f}ms, {memory / 1024 ** 2:.0f}MB each")
+
+    # 第一次请求时还没有容器：从镜像创建，预热池按需补充
+    warm, cold = await recreate_each(core, projects, wait_refill=lambda i: False)
+    print(f"initial create cold: {summary(cold)}")
+    print(f"initial create warm: {summary(warm) if warm else '-'}")
+
+    # 空闲超过 PAUSE_AFTER：全部暂停
+    now = time.time()
+    reaped = await core.reaper.reap(now + reaper_module.PAUSE_AFTER + 1)
+    await wait_for(lambda: all(core.state.container(f"project_{p.project_id}").status == "paused" for p in projects))
+    print(f"paused {len(reaped['pause'])}, memory still held {core.reaper.reaped['pause']['memory'] / 1024 ** 2:.0f}MB, "
+          f"ledger reservations {len(core.ledger.reservations)}")
+    third = len(projects) // 3
+    unpause = await timed_resume(core, projects[:third])
+    print(f"  resume unpause: {summary(unpause)}")
+
+    # 空闲超过 STOP_AFTER：停止其余容器并释放预留
+    reaped = await core.reaper.reap(time.time() + reaper_module.STOP_AFTER + 1)
+    await wait_for(lambda: all(core.state.container(f"project_{p.project_id}").status == "exited" for p in projects))
+    print(f"stopped {len(reaped['stop'])}, memory reclaimed {core.reaper.stats()['memory_reclaimed'] / 1024 ** 2:.0f}MB, "
+          f"ledger reservations {len(core.ledger.reservations)}")
+    restart = await timed_resume(core, projects[:third])
+    print(f"    resume start: {summary(restart)}")
+
+    # 容器被删除（例如主机清理）：从镜像重建，预热池中有空闲容器时直接租用；
+    # 隔一个等待预热池补充，另一半紧接着重建，此时空闲容器刚被租走、补充还没完成，测得冷启动的延迟
+    rest = projects[third:]
+    for project in rest:
+        await core.engine.remove(await core.engine.get_container(f"project_{project.project_id}"), force=True)
+    await wait_for(lambda: all(core.state.container(f"project_{p.project_id}") is None for p in rest))
+    warm, cold = await recreate_each(core, rest, wait_refill=lambda i: i % 2 == 0)
+    print(f"resume recreate cold: {summary(cold) if cold else '-'}")
+    print(f"resume recreate warm: {summary(warm) if warm else '-'}")
+    print(f"reaper stats: {core.reaper.stats()}")
+
+    # 另一个 worker 的回收器：本进程没有它的活动记录，只能从 job 表得知项目正在执行任务
+    busy = projects[-1]
+    job = await Job.add_job(busy.project_id, "u", "predict", {})
+    await Job.claim(job.job_id, "other-worker")
+    other = reaper_module.IdleReaper(core)
+    # 第一次检查时开始计时
+    now = time.time()
+    await other.reap(now)
+    reaped = await other.reap(now + reaper_module.PAUSE_AFTER + 1)
+    assert str(busy.project_id) not in reaped["pause"] and len(reaped["pause"]) == len(projects) - 1
+    print(f"second worker's reaper: paused {len(reaped['pause'])}, skipped project {busy.project_id} "
+          f"with a job running elsewhere")
+
+    await core.warm_pool.close()
+    await core.reaper.close()
+    core.state.close()
+    core.engine.close()
+    server.shutdown()
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.8
+    size = int(float(sys.argv[3]) * 1024 ** 2) if len(sys.argv) > 3 else 350 * 1024 ** 2
+    # 导入 models 时会创建连接 localhost:2375 的 DockerFactory
+    default_server, _, _ = start_fake_docker(port=2375, latency=0.001)
+    asyncio.run(main(total, latency, size))
+    default_server.shutdown()
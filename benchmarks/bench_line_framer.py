@@ -0,0 +1,144 @@
+"""
+容器输出分行的微基准：对比原先 exec_container_log 中基于 str 拼接/split 的循环与 LineFramer，
+再让同样的数据块经过 ContainerLogReader（读取线程 + 队列），对比逐块处理与 _exec_stdin 的合并读取
+
+运行: python -m benchmarks.bench_line_framer
+"""
+import asyncio
+import time
+
+from utils.LogStream import ContainerLogReader, LineFramer
+
+
+def legacy_loop(chunks):
+    """原实现：每个分块单独解码，buffer += chunk，反复 split 并在整个 buffer 中查找完成标记"""
+    lines = []
+    buffer = ""
+    last_chunk_time = 0
+    for line in chunks:
+        chunk = line.decode('utf-8', errors='ignore')
+        buffer += chunk
+        now = time.time()
+        if ("TRAIN_COMPLETE" in buffer) or ("PREDICT_COMPLETE" in buffer):
+            break
+        if '\n' in buffer:
+            while '\n' in buffer:
+                full_line, buffer = buffer.split('\n', 1)
+                full_line = full_line.strip()
+                if full_line:
+                    lines.append(full_line)
+                last_chunk_time = 0
+        elif last_chunk_time == 0:
+            last_chunk_time = now
+        elif buffer.strip() and (last_chunk_time != 0) and (now - last_chunk_time > 1):
+            flushed = buffer.strip()
+            if flushed:
+                lines.append(flushed)
+            buffer = ""
+            last_chunk_time = now
+    return lines
+
+
+def framer_loop(chunks):
+    lines = []
+    framer = LineFramer()
+    for chunk in chunks:
+        now = time.time()
+        lines.extend(framer.feed(chunk, now))
+        partial = framer.poll(now)
+        if partial:
+            lines.append(partial)
+        if framer.complete:
+            break
+    return lines
+
+
+class ChunkContainer:
+    name = "bench"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def logs(self, **kwargs):
+        return iter(self.chunks)
+
+
+async def legacy_pipeline(chunks):
+    """原实现经 ContainerLogReader 逐块取出后处理"""
+    lines = []
+    buffer = ""
+    async with ContainerLogReader(ChunkContainer(chunks)) as reader:
+        async for chunk in reader:
+            buffer += chunk.decode('utf-8', errors='ignore')
+            if ("TRAIN_COMPLETE" in buffer) or ("PREDICT_COMPLETE" in buffer):
+                break
+            while '\n' in buffer:
+                full_line, buffer = buffer.split('\n', 1)
+                full_line = full_line.strip()
+                if full_line:
+                    lines.append(full_line)
+    return lines
+
+
+async def framer_pipeline(chunks):
+    """与 DockerCore._exec_stdin 相同：reader.get 合并积压的数据块后交给 LineFramer"""
+    lines = []
+    framer = LineFramer()
+    async with ContainerLogReader(ChunkContainer(chunks)) as reader:
+        while not framer.complete:
+            try:
+                chunk = await reader.get(timeout=framer.flush_after)
+            except StopAsyncIteration:
+                break
+            now = time.time()
+            if chunk is not None:
+                lines.extend(framer.feed(chunk, now))
+            partial = framer.poll(now)
+            if partial:
+                lines.append(partial)
+    return lines
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def workloads():
+    train = "".join(f"iter {i} loss:{1 / (i + 1):.6f} 训练中\n" for i in range(50000)).encode()
+    # 进度条：大量 \r 刷新且长时间不换行；ETA 中的 E 是完成标记的末字符，每个分块都要查找完成标记
+    progress = "".join(f"\r{i // 400:3d}%|{'█' * (i // 4000)}| {i}/200000 ETA {(200000 - i) // 1000}s"
+                       for i in range(200000)).encode() + b"\n"
+    many_lines_per_chunk = train
+    yield "short lines, 4KB chunks", split(train + b"TRAIN_COMPLETE\n", 4096)
+    yield "short lines, 64B chunks", split(train + b"TRAIN_COMPLETE\n", 64)
+    yield "progress bar, 4KB chunks", split(progress + b"TRAIN_COMPLETE\n", 4096)
+    yield "64KB chunks", split(many_lines_per_chunk + b"TRAIN_COMPLETE\n", 65536)
+
+
+def main():
+    for name, chunks in workloads():
+        results = []
+        for loop in (legacy_loop, framer_loop):
+            start = time.perf_counter()
+            lines = loop(chunks)
+            results.append((time.perf_counter() - start, len(lines)))
+        (legacy, legacy_lines), (framer, framer_lines) = results
+        print(f"{name:>26}: legacy {legacy * 1000:8.1f}ms ({legacy_lines} lines)  "
+              f"framer {framer * 1000:7.1f}ms ({framer_lines} lines)  x{legacy / framer:.1f}")
+    print("through ContainerLogReader:")
+    for name, chunks in workloads():
+        if name.startswith("progress"):
+            # 原实现处理进度条需要数秒，上面已经比较过
+            continue
+        results = []
+        for pipeline in (legacy_pipeline, framer_pipeline):
+            start = time.perf_counter()
+            lines = asyncio.run(pipeline(chunks))
+            results.append((time.perf_counter() - start, len(lines)))
+        (legacy, legacy_lines), (framer, framer_lines) = results
+        print(f"{name:>26}: legacy {legacy * 1000:8.1f}ms ({legacy_lines} lines)  "
+              f"framer {framer * 1000:7.1f}ms ({framer_lines} lines)  x{legacy / framer:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+容器日志流基准测试：伪造一个输出 10 万行日志的容器，
+在日志流式读取期间测量事件循环上其他请求的响应延迟
+
+运行: python -m benchmarks.bench_log_stream
+"""
+import asyncio
+import statistics
+import time
+
+from utils.LogStream import ContainerLogReader
+
+LINES = 100_000
+
+
+class FakeContainer:
+    name = "project_bench"
+
+    def __init__(self, lines: int = LINES, burst: int = 2000, gap: float = 0.05):
+        self.lines = lines
+        self.burst = burst
+        self.gap = gap
+
+    def logs(self, stream=True, follow=True, **kwargs):
+        for i in range(self.lines):
+            # 模拟训练计算期间 Docker 日志流的阻塞读取
+            if i % self.burst == 0:
+                time.sleep(self.gap)
+            yield f"iter {i} loss:{1.0 / (i + 1):.6f}\n".encode()
+        yield b"TRAIN_COMPLETE\n"
+
+
+async def probe(stop: asyncio.Event, samples: list):
+    """模拟其他接口：每 5ms 发起一次请求，记录实际被调度的延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        samples.append((time.perf_counter() - start - 0.005) * 1000)
+
+
+async def consume_blocking(container):
+    for chunk in container.logs(stream=True, follow=True):
+        if b"TRAIN_COMPLETE" in chunk:
+            break
+        await asyncio.sleep(0)
+
+
+async def consume_async(container):
+    async with ContainerLogReader(container) as reader:
+        async for chunk in reader:
+            if b"TRAIN_COMPLETE" in chunk:
+                break
+
+
+async def run(name, consumer):
+    stop = asyncio.Event()
+    samples = []
+    probe_task = asyncio.create_task(probe(stop, samples))
+    start = time.perf_counter()
+    await consumer(FakeContainer())
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else float("nan")
+    print(f"{name:>10}: {elapsed:.2f}s, probes={len(samples)}, "
+          f"p50={statistics.median(samples) if samples else float('nan'):.2f}ms, p99={p99:.2f}ms, "
+          f"max={max(samples) if samples else float('nan'):.2f}ms")
+
+
+async def main():
+    await run("blocking", consume_blocking)
+    await run("async", consume_async)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+训练指标提取基准测试：先检查默认格式能识别常见训练框架的日志行（包括 Keras 风格的大写 "Epoch 2/10"），
+再把一段模拟训练日志逐行交给 RunMetrics，统计提取吞吐
+
+运行: python -m benchmarks.bench_metric_extractor [行数]
+"""
+import sys
+import time
+
+from utils.MetricExtractor import MetricExtractor, RunMetrics
+
+CASES = [
+    ("=== epoch - 3 ===", 3, []),
+    ("Epoch 2/10 - loss: 0.25", 2, [("loss", 0.25)]),
+    ("EPOCH 7: train acc:0.9123, test acc:0.9050", 7, [("train_acc", 0.9123), ("test_acc", 0.905)]),
+    ("Step=5 loss=1.5e-3", 5, [("loss", 0.0015)]),
+    ("iter 120", 120, []),
+    ("loading dataset...", None, []),
+]
+
+
+def check_cases():
+    extractor = MetricExtractor()
+    for line, step, metrics in CASES:
+        assert extractor.step(line) == step, f"{line!r}: 步数 {extractor.step(line)}，应为 {step}"
+        assert extractor.extract(line) == metrics, f"{line!r}: 指标 {extractor.extract(line)}，应为 {metrics}"
+    print(f"{len(CASES)} sample lines parsed as expected")
+
+
+def main(lines: int):
+    check_cases()
+    log = []
+    for epoch in range(1, lines // 100 + 2):
+        log.append(f"Epoch {epoch}/{lines // 100 + 1}")
+        log.extend(f"{batch}/100 [====>....] - ETA: 3s - loss: {1 / (epoch + batch):.4f} - accuracy: 0.{batch:02d}"
+                   for batch in range(99))
+    log = log[:lines]
+    run = RunMetrics(1, MetricExtractor())
+    started = time.perf_counter()
+    for line in log:
+        run.feed(line)
+    elapsed = time.perf_counter() - started
+    assert run.current_step == sum(line.startswith("Epoch ") for line in log)
+    print(f"{len(log)} lines in {elapsed * 1000:.1f}ms ({len(log) / elapsed:,.0f} lines/s), "
+          f"last epoch {run.current_step}, series {sorted(run.series)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
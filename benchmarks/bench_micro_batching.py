@@ -0,0 +1,99 @@
+"""
+推理合批基准测试：复制 data/Model 下的 Neural-Network 模型，换上模板的 main.py / predict.py，
+一次并发发送一批 serve 请求（模拟突发流量），对比不同合批参数下的吞吐、p50/p99 延迟和实际批量
+
+运行: python -m benchmarks.bench_micro_batching [并发请求数] [轮数] [模型 ID]
+"""
+import asyncio
+import glob
+import importlib
+import os
+import shutil
+import statistics
+import sys
+import time
+
+from benchmarks.bench_container_protocol import attach_channel, start_container, stop_container
+from benchmarks.bench_resident_predict import ROOT, percentile, prepare
+
+# (名称, 窗口毫秒, 最大批量)
+CASES = [
+    ("no batching", 0, 1),
+    ("window 0ms", 0, 32),
+    ("window 2ms", 2, 32),
+    ("window 5ms", 5, 32),
+    ("window 5ms/64", 5, 64),
+]
+
+
+async def burst(channel, images, latencies):
+    async def one(image):
+        started = time.perf_counter()
+        frame = await channel.request("serve", image)
+        latencies.append((time.perf_counter() - started) * 1000)
+        return frame["data"]
+
+    return await asyncio.gather(*(one(image) for image in images))
+
+
+async def run_case(workdir, images, rounds, window, max_size):
+    process, sock = start_container(workdir, {"AIFORGE_BATCH_WINDOW_MS": str(window),
+                                              "AIFORGE_MAX_BATCH": str(max_size)})
+    try:
+        channel = await attach_channel(sock)
+        expected = await burst(channel, images, [])
+        before = (await channel.request("hello"))["batching"]
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(rounds):
+            assert await burst(channel, images, latencies) == expected
+        elapsed = time.perf_counter() - started
+        after = (await channel.request("hello"))["batching"]
+        channel.close()
+    finally:
+        stop_container(process, sock)
+    batches = after["batches"] - before["batches"]
+    return elapsed, latencies, (after["items"] - before["items"]) / batches, after["largest"]
+
+
+def forward_cost(workdir, image, sizes=(1, 8, 32, 64), repeat=200):
+    """在本进程中测量 predict_batch 每张图片的前向计算耗时"""
+    sys.path.insert(0, workdir)
+    try:
+        predict = importlib.import_module("predict")
+        model = predict.load_model(os.path.join(workdir, "params.pkl"))
+        x = predict.preprocess(image)
+        costs = {}
+        for size in sizes:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                predict.predict_batch([x] * size, model)
+            costs[size] = (time.perf_counter() - started) / repeat / size * 1e6
+        return costs
+    finally:
+        sys.path.remove(workdir)
+
+
+async def main(concurrency, rounds, model_id):
+    model_dir = os.path.join(ROOT, "data", "Model", model_id, "Neural-Network")
+    # 用户上传的手写数字图片尺寸较小，预处理开销小，前向计算占比更高
+    sources = sorted(glob.glob(os.path.join(model_dir, "dataset", "test_dataset", "*", "*.png")))
+    images = [sources[i % len(sources)] for i in range(concurrency)]
+    workdir = prepare(model_dir, True)
+    try:
+        costs = forward_cost(workdir, images[0])
+        print("forward pass per image: " + "  ".join(f"batch {size} {cost:6.1f}us" for size, cost in costs.items()))
+        print(f"model {model_id}, {concurrency} concurrent serve requests x {rounds} rounds")
+        for name, window, max_size in CASES:
+            elapsed, latencies, mean_size, largest = await run_case(workdir, images, rounds, window, max_size)
+            print(f"{name:>14}: {len(latencies) / elapsed:8.1f} req/s  p50 {statistics.median(latencies):7.2f}ms  "
+                  f"p99 {percentile(latencies, 0.99):7.2f}ms  batch mean {mean_size:5.1f} max {largest}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    model = sys.argv[3] if len(sys.argv) > 3 else "90"
+    asyncio.run(main(total, repeat, model))
@@ -0,0 +1,129 @@
+"""
+推理结果缓存基准测试：用模板 main.py 在子进程中运行 Neural-Network 模型（常驻 + 合批），
+按 Zipf 分布反复对少量上传图片发起推理，对比不使用缓存和使用 PredictCache（与
+DockerCore.exec_container_log 相同的查找/写入流程）时的延迟，并检查参数文件变化和训练结束后缓存失效
+
+运行: python -m benchmarks.bench_predict_cache [请求数] [图片数] [模型 ID]
+"""
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_container_protocol import attach_channel, start_container, stop_container
+from benchmarks.bench_resident_predict import ROOT, percentile, prepare
+from utils.PredictCache import PredictCache, CONTAINER_PIC_DIR
+
+
+def make_pictures(directory, count):
+    """生成 count 张不同的 28x28 图片，返回容器内路径"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        name = f"{i:04d}.png"
+        Image.fromarray(rng.integers(0, 255, (28, 28), dtype=np.uint8)).save(os.path.join(directory, name))
+        paths.append(CONTAINER_PIC_DIR + name)
+    return paths
+
+
+async def cached_predict(cache, channel, project_id, store_path, picture, generation=0):
+    """与 exec_container_log 的推理路径相同：先按键查缓存，未命中时请求容器并写入；generation 对应 project 表中的缓存代数"""
+    key = await asyncio.to_thread(cache.key_for, project_id, generation, store_path, picture)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry.data
+    lines = []
+
+    async def on_log(line):
+        lines.append(line)
+
+    started = time.perf_counter()
+    frame = await channel.request("serve", os.path.join(os.getcwd(), "data", "pic", os.path.basename(picture)),
+                                  on_log=on_log)
+    cache.put(key, frame["data"], lines, time.perf_counter() - started)
+    return frame["data"]
+
+
+async def direct_predict(channel, picture):
+    frame = await channel.request("serve", os.path.join(os.getcwd(), "data", "pic", os.path.basename(picture)))
+    return frame["data"]
+
+
+async def run(workdir, store_path, workload):
+    process, sock = start_container(workdir)
+    try:
+        channel = await attach_channel(sock)
+        cache = PredictCache()
+        results = {}
+        for label in ("no cache", "cache"):
+            latencies = []
+            for picture in workload:
+                started = time.perf_counter()
+                if label == "cache":
+                    await cached_predict(cache, channel, 1, store_path, picture)
+                else:
+                    await direct_predict(channel, picture)
+                latencies.append((time.perf_counter() - started) * 1000)
+            results[label] = latencies
+            print(f"{label:>9}: p50 {statistics.median(latencies):6.3f}ms  p99 {percentile(latencies, 0.99):6.3f}ms  "
+                  f"total {sum(latencies) / 1000:6.2f}s")
+        print(f"    stats: {cache.stats(1)}")
+
+        # 参数文件变化：键随之变化，下一次请求重新计算
+        picture = workload[0]
+        misses = cache.misses
+        with open(os.path.join(store_path, "params.pkl"), "ab") as f:
+            f.write(b"\0")
+        await cached_predict(cache, channel, 1, store_path, picture)
+        assert cache.misses == misses + 1
+        await cached_predict(cache, channel, 1, store_path, picture)
+        assert cache.misses == misses + 1
+        # 训练结束：project 表中的代数加一（PredictCache.expire），本进程和另一个 worker 的旧条目都不再命中
+        other = PredictCache()
+        await cached_predict(other, channel, 1, store_path, picture)
+        cache.invalidate(1)
+        await cached_predict(cache, channel, 1, store_path, picture, generation=1)
+        assert cache.misses == misses + 2 and cache.stats(1)["project_entries"] == 1
+        await cached_predict(other, channel, 1, store_path, picture, generation=1)
+        assert other.misses == 2
+        print("invalidation: params change -> miss, training finished -> miss in this and another worker")
+        channel.close()
+    finally:
+        stop_container(process, sock)
+
+
+def main(count, distinct, model_id):
+    model_dir = os.path.join(ROOT, "data", "Model", model_id, "Neural-Network")
+    workdir = prepare(model_dir, True)
+    base = tempfile.mkdtemp(prefix="aiforge-cache-")
+    cwd = os.getcwd()
+    try:
+        # 项目目录结构与 data/Project/<id> 相同，图片放在 data/pic
+        store_path = os.path.join(base, "data", "Project", "1")
+        shutil.copytree(workdir, store_path)
+        os.chdir(base)
+        pictures = make_pictures(os.path.join(base, "data", "pic"), distinct)
+        rng = random.Random(0)
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(distinct)]
+        workload = rng.choices(pictures, weights, k=count)
+        print(f"model {model_id}, {count} requests over {distinct} pictures (zipf 1.1)")
+        asyncio.run(run(workdir, store_path, workload))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(base, ignore_errors=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    pictures_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    model = sys.argv[3] if len(sys.argv) > 3 else "90"
+    main(total, pictures_count, model)
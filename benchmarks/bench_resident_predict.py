@@ -0,0 +1,109 @@
+"""
+常驻推理基准测试：复制 data/Model 下的 Neural-Network 模型，用模板 main.py 在子进程中运行，
+依次发送推理请求，对比
+  predict: 模型原来的 predict.py，每次请求新建 TwoLayerNet 并反序列化 params.pkl
+  serve:   模板 predict.py + 常驻模型，参数只加载一次
+的 p50/p99 延迟，并检查只修改 mtime 不会重新加载、参数内容变化后会重新加载
+
+运行: python -m benchmarks.bench_resident_predict [请求数] [模型 ID]
+"""
+import asyncio
+import glob
+import os
+import pickle
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_container_protocol import attach_channel, start_container, stop_container
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(ROOT, "data", "resources", "model_template")
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def prepare(model_dir, resident):
+    workdir = tempfile.mkdtemp(prefix="aiforge-resident-")
+    shutil.copytree(model_dir, workdir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns("__pycache__", "*.gz", "*.zip"))
+    for name in ("main.py", "resident.py", "batcher.py"):
+        shutil.copy(os.path.join(TEMPLATE_DIR, name), workdir)
+    if resident:
+        shutil.copy(os.path.join(TEMPLATE_DIR, "predict.py"), workdir)
+    return workdir
+
+
+async def measure(sock, op, image, count):
+    channel = await attach_channel(sock)
+    assert (op == "serve") == ("serve" in channel.ops)
+    # 第一次请求包含导入和首次加载，不计入统计
+    first = await channel.request(op, image)
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        frame = await channel.request(op, image)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert frame["data"] == first["data"], frame
+    return channel, first["data"], latencies
+
+
+async def check_reload(channel, workdir, image):
+    """只更新 mtime 时不重新加载；写入新参数后下一次请求使用新参数"""
+    params_file = os.path.join(workdir, "params.pkl")
+    os.utime(params_file)
+    await channel.request("serve", image)
+    touched = (await channel.request("hello"))["resident"]
+    with open(params_file, "rb") as f:
+        params = pickle.load(f)
+    params["b2"] = params["b2"].copy()
+    params["b2"][:] = -1e6
+    params["b2"][7] = 1e6
+    with open(params_file, "wb") as f:
+        pickle.dump(params, f)
+    frame = await channel.request("serve", image)
+    retrained = (await channel.request("hello"))["resident"]
+    return touched, retrained, frame["data"]
+
+
+async def run(model_dir, image, count):
+    results = {}
+    for op in ("predict", "serve"):
+        workdir = prepare(model_dir, op == "serve")
+        process, sock = start_container(workdir)
+        try:
+            channel, label, latencies = await measure(sock, op, image, count)
+            results[op] = latencies
+            print(f"{op:>8}: label {label}  p50 {statistics.median(latencies):7.2f}ms  "
+                  f"p99 {percentile(latencies, 0.99):7.2f}ms  mean {statistics.mean(latencies):7.2f}ms")
+            if op == "serve":
+                touched, retrained, label = await check_reload(channel, workdir, image)
+                assert touched["loads"] == 1 and touched["hash_checks"] == 2, touched
+                assert retrained["loads"] == 2 and label == 7, (retrained, label)
+                print(f"  reload: touch -> loads {touched['loads']} (hash checks {touched['hash_checks']}), "
+                      f"new params -> loads {retrained['loads']}, label {label}")
+            channel.close()
+        finally:
+            stop_container(process, sock)
+            shutil.rmtree(workdir, ignore_errors=True)
+    speedup = statistics.median(results["predict"]) / statistics.median(results["serve"])
+    print(f"p50 speedup {speedup:.1f}x")
+
+
+def main(count, model_id):
+    model_dir = os.path.join(ROOT, "data", "Model", model_id, "Neural-Network")
+    image = sorted(glob.glob(os.path.join(model_dir, "*.jpg")) +
+                   glob.glob(os.path.join(model_dir, "dataset", "*.png")))[0]
+    print(f"model {model_id}, image {os.path.basename(image)}, {count} sequential requests")
+    asyncio.run(run(model_dir, image, count))
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    model = sys.argv[2] if len(sys.argv) > 2 else "90"
+    main(total, model)
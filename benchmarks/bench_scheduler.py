@@ -0,0 +1,109 @@
+"""
+放置调度模拟：在 8 台规格不同的模拟主机上依次放置 1000 个项目容器，
+模型按 Zipf 分布被使用，每台主机初始只有部分镜像；项目运行时长服从指数分布，结束后释放资源。
+对比调度器与单主机（旧实现）、轮询、随机放置的拒绝数、镜像构建次数和负载均衡程度
+
+运行: python -m benchmarks.bench_scheduler [项目数] [主机数] [随机种子]
+"""
+import heapq
+import random
+import statistics
+import sys
+import time
+
+from utils.Scheduler import HostState, PROJECT_CPU, PROJECT_MEMORY, choose_host, score_host
+
+MODELS = 60
+# 项目平均运行时长（以放置次数计），稳态下约有这么多项目同时运行
+MEAN_LIFETIME = 90
+HOST_SPECS = [(64, 256), (32, 128), (32, 128), (16, 64), (16, 64), (8, 32), (8, 32), (8, 32)]  # 核数, 内存 GB
+
+
+def make_hosts(count, rng):
+    hosts = []
+    for i in range(count):
+        ncpu, memory = HOST_SPECS[i % len(HOST_SPECS)]
+        images = {f"{m}:latest" for m in range(MODELS) if rng.random() < 0.3}
+        hosts.append(HostState(f"tcp://fake-{i}:2375", ncpu, memory * 1024 ** 3, images=images))
+    return hosts
+
+
+def make_workload(count, rng):
+    weights = [1 / (rank + 1) for rank in range(MODELS)]
+    workload = []
+    for _ in range(count):
+        image = f"{rng.choices(range(MODELS), weights)[0]}:latest"
+        cpu = rng.choice([0.5, 1, 1, 2, 4])
+        memory = rng.choice([1, 2, 2, 4, 8]) * 1024 ** 3
+        workload.append((image, cpu, memory))
+    return workload
+
+
+def fits(state, image, cpu, memory):
+    return score_host(state, image, cpu, memory) is not None
+
+
+def policy_scheduler(hosts, image, cpu, memory, _):
+    return choose_host(hosts, image, cpu, memory)
+
+
+def policy_single(hosts, image, cpu, memory, _):
+    return hosts[0] if fits(hosts[0], image, cpu, memory) else None
+
+
+def policy_round_robin(hosts, image, cpu, memory, state):
+    for _ in range(len(hosts)):
+        host = hosts[state["next"] % len(hosts)]
+        state["next"] += 1
+        if fits(host, image, cpu, memory):
+            return host
+    return None
+
+
+def policy_random(hosts, image, cpu, memory, state):
+    candidates = [host for host in hosts if fits(host, image, cpu, memory)]
+    return state["rng"].choice(candidates) if candidates else None
+
+
+def simulate(name, policy, count, host_count, seed):
+    rng = random.Random(seed)
+    hosts = make_hosts(host_count, rng)
+    workload = make_workload(count, rng)
+    running = []  # (结束时刻, 序号, 主机, cpu, 内存)
+    state = {"next": 0, "rng": random.Random(seed + 1)}
+    rejected = builds = 0
+    decisions = []
+    peaks, spreads = [], []
+    for step, (image, cpu, memory) in enumerate(workload):
+        while running and running[0][0] <= step:
+            _, _, host, cpu_used, memory_used = heapq.heappop(running)
+            host.cpu_used -= cpu_used
+            host.memory_used -= memory_used
+            host.containers -= 1
+        start = time.perf_counter()
+        host = policy(hosts, image, cpu, memory, state)
+        decisions.append(time.perf_counter() - start)
+        if host is None:
+            rejected += 1
+            continue
+        if image not in host.images:
+            builds += 1
+        host.reserve(image, cpu, memory)
+        heapq.heappush(running, (step + rng.expovariate(1 / MEAN_LIFETIME), step, host, cpu, memory))
+        utilization = [h.cpu_used / h.ncpu for h in hosts]
+        peaks.append(max(utilization))
+        spreads.append(statistics.pstdev(utilization))
+    utilization = [host.cpu_used / host.ncpu for host in hosts]
+    print(f"{name:>12}: placed {count - rejected:5d}  rejected {rejected:4d}  image builds {builds:4d}  "
+          f"hottest host cpu avg {statistics.mean(peaks):.2f}  util stdev avg {statistics.mean(spreads):.2f}  decision p50 {statistics.median(decisions) * 1e6:6.1f}us")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    host_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+    print(f"{count} projects over {host_count} hosts (default need {PROJECT_CPU} cpu / "
+          f"{PROJECT_MEMORY // 1024 ** 3} GB), {MODELS} models")
+    for name, policy in [("single host", policy_single), ("round robin", policy_round_robin),
+                         ("random", policy_random), ("scheduler", policy_scheduler)]:
+        simulate(name, policy, count, host_count, seed)
@@ -0,0 +1,216 @@
+"""
+上传和解压基准测试：生成约 1GB 的数据集压缩包，分别上传到三个独立的服务进程，
+对比原来的做法（await file.read() 一次读入内存、在事件循环线程中 extractall）、
+按块保存并在线程中解压（/Dataset/uploadFile 的新实现）以及直接接收请求体（/Dataset/uploadStream）时
+服务进程的峰值 RSS 和上传期间 /ping 的最大延迟，最后检查压缩炸弹会被拒绝
+
+需要 uvicorn、httpx、python-multipart
+运行: python -m benchmarks.bench_upload [压缩包 MB]
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+import httpx
+import numpy as np
+
+PORT = 2392
+
+
+def build_app(mode: str, upload_dir: str):
+    from fastapi import FastAPI, File, Request, UploadFile
+    from utils.Upload import start_progress, get_progress, save_upload, save_stream, extract_zip, UploadRejected
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {}
+
+    @app.get("/rss")
+    async def rss():
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return {key: int(fields[key].split()[0]) * 1024 for key in ("VmHWM", "VmRSS")}
+
+    @app.get("/upload/{upload_id}")
+    async def progress(upload_id: str):
+        return get_progress(upload_id).to_dict()
+
+    async def finish(zip_path, progress):
+        try:
+            await asyncio.to_thread(extract_zip, zip_path, upload_dir, progress)
+        except UploadRejected as e:
+            return {"rejected": str(e)}
+        finally:
+            await asyncio.to_thread(os.remove, zip_path)
+        progress.finish()
+        return progress.to_dict()
+
+    if mode == "before":
+        @app.put("/uploadFile")
+        async def upload_before(file: UploadFile = File(...)):
+            zip_path = os.path.join(upload_dir, file.filename)
+            with open(zip_path, "wb") as f:
+                f.write(await file.read())
+            with zipfile.ZipFile(zip_path, "r") as archive:
+                archive.extractall(upload_dir)
+            os.remove(zip_path)
+            return {}
+    elif mode == "after":
+        @app.put("/uploadFile")
+        async def upload_after(file: UploadFile = File(...)):
+            progress = start_progress(None, file.size)
+            zip_path = os.path.join(upload_dir, file.filename)
+            await save_upload(file, zip_path, progress)
+            return await finish(zip_path, progress)
+    else:
+        @app.put("/uploadStream")
+        async def upload_stream(request: Request, filename: str, upload_id: str):
+            progress = start_progress(upload_id, int(request.headers["content-length"]))
+            zip_path = os.path.join(upload_dir, filename)
+            await save_stream(request.stream(), zip_path, progress)
+            return await finish(zip_path, progress)
+    return app
+
+
+def serve(mode: str, upload_dir: str):
+    import uvicorn
+    uvicorn.run(build_app(mode, upload_dir), host="127.0.0.1", port=PORT, log_level="warning")
+
+
+def make_archive(path: str, size: int):
+    """大部分是不可压缩的随机数据（ZIP_STORED），另有一些可压缩的文本文件"""
+    rng = np.random.default_rng(0)
+    with zipfile.ZipFile(path, "w") as archive:
+        with archive.open("dataset/images.bin", "w", force_zip64=True) as f:
+            remaining = size - 64 * 1024 ** 2
+            while remaining > 0:
+                chunk = rng.bytes(min(remaining, 16 * 1024 ** 2))
+                f.write(chunk)
+                remaining -= len(chunk)
+        for i in range(32):
+            text = "".join(f"{j},{j * i % 97},label_{j % 10}\n" for j in range(100_000))
+            archive.writestr(f"dataset/labels/{i:02d}.csv", text.encode()[:2 * 1024 ** 2],
+                             compress_type=zipfile.ZIP_DEFLATED)
+
+
+def make_bomb(path: str):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("bomb.bin", "w", force_zip64=True) as f:
+            zeros = bytes(16 * 1024 ** 2)
+            for _ in range(64):
+                f.write(zeros)
+
+
+def file_chunks(path: str):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            yield chunk
+
+
+def upload(mode: str, archive: str, base: str):
+    upload_dir = os.path.join(base, mode)
+    os.makedirs(upload_dir)
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_upload", "serve", mode, upload_dir])
+    client = httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=600)
+    try:
+        while True:
+            try:
+                client.get("/ping")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        idle_rss = client.get("/rss").json()["VmRSS"]
+        done = threading.Event()
+        pings = []
+
+        def probe():
+            with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=600) as prober:
+                while not done.is_set():
+                    started = time.perf_counter()
+                    prober.get("/ping")
+                    pings.append((time.perf_counter() - started) * 1000)
+                    time.sleep(0.02)
+
+        threading.Thread(target=probe, daemon=True).start()
+        started = time.perf_counter()
+        if mode == "stream":
+            response = client.put("/uploadStream", params={"filename": os.path.basename(archive), "upload_id": "bench"},
+                                  content=file_chunks(archive),
+                                  headers={"content-length": str(os.path.getsize(archive))})
+        else:
+            with open(archive, "rb") as f:
+                response = client.put("/uploadFile", files={"file": (os.path.basename(archive), f, "application/zip")})
+        elapsed = time.perf_counter() - started
+        done.set()
+        response.raise_for_status()
+        peak = client.get("/rss").json()["VmHWM"]
+        print(f"{mode:>7}: {elapsed:6.2f}s  peak rss {peak / 1024 ** 2:7.1f}MB (idle {idle_rss / 1024 ** 2:.1f}MB)  "
+              f"/ping max {max(pings):8.1f}ms p50 {sorted(pings)[len(pings) // 2]:6.1f}ms")
+        if mode == "stream":
+            print(f"         progress: {client.get('/upload/bench').json()}")
+            bomb = os.path.join(base, "bomb.zip")
+            make_bomb(bomb)
+            response = client.put("/uploadStream", params={"filename": "bomb.zip", "upload_id": "bomb"},
+                                  content=file_chunks(bomb), headers={"content-length": str(os.path.getsize(bomb))})
+            print(f"   bomb ({os.path.getsize(bomb) / 1024 ** 2:.1f}MB -> 1GB): {response.json()}, "
+                  f"bomb.bin left on disk: {os.path.exists(os.path.join(upload_dir, 'bomb.bin'))}")
+    finally:
+        client.close()
+        server.terminate()
+        server.wait()
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def check_cleanup(base: str):
+    """解压中途失败时只删除这次新建的文件，目标目录中原有的同名文件保留"""
+    from utils.Upload import start_progress, extract_zip
+    target = os.path.join(base, "cleanup")
+    os.makedirs(target)
+    with open(os.path.join(target, "existing.txt"), "w") as f:
+        f.write("old")
+    path = os.path.join(base, "corrupt.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("existing.txt", "new")
+        archive.writestr("created.txt", "new")
+        archive.writestr("broken.bin", b"x" * 4096)
+    # 改写最后一个条目的数据，解压到它时 CRC 校验失败
+    with open(path, "r+b") as f:
+        data = f.read()
+        f.seek(data.rindex(b"x" * 4096))
+        f.write(b"y")
+    try:
+        extract_zip(path, target, start_progress())
+        raise AssertionError("损坏的压缩包没有解压失败")
+    except zipfile.BadZipFile:
+        pass
+    left = sorted(os.listdir(target))
+    assert left == ["existing.txt"], f"失败后目录中剩余 {left}"
+    print(f"cleanup after failed extract: kept pre-existing files {left}, removed the rest")
+
+
+def main(size):
+    base = tempfile.mkdtemp(prefix="aiforge-upload-")
+    try:
+        check_cleanup(base)
+        archive = os.path.join(base, "dataset.zip")
+        make_archive(archive, size)
+        print(f"archive {os.path.getsize(archive) / 1024 ** 2:.0f}MB")
+        for mode in ("before", "after", "stream"):
+            upload(mode, archive, base)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1] if len(sys.argv) > 1 else 1024) * 1024 ** 2)
@@ -0,0 +1,82 @@
+"""
+预热容器池基准测试：在模拟的 Docker API（容器启动需要数秒）上依次启动多个项目，
+对比每次现场创建容器与从预热池租用的启动延迟，并输出池的命中统计
+
+运行: python -m benchmarks.bench_warm_pool [项目数] [启动耗时毫秒] [请求间隔毫秒]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.fake_docker import start_fake_docker
+from utils import WarmPool as warm_pool_module
+from utils.AsyncDocker import AsyncDockerEngine
+from utils.WarmPool import WarmPool
+
+IMAGE = "57:latest"
+
+
+def container_config(image):
+    return {"stdin_open": True, "tty": True, "detach": True}
+
+
+async def start_project(engine, pool, project_id):
+    """与 DockerCore.container_creator 相同的顺序：清理同名容器，租用或创建"""
+    name = f"project_{project_id}"
+    started = time.perf_counter()
+    existing = await engine.find_container(name)
+    if existing is not None:
+        await engine.remove(existing, force=True)
+    container = await pool.lease(IMAGE, name) if pool is not None else None
+    if container is None:
+        container = await engine.create_container(image=IMAGE, name=name, **container_config(IMAGE))
+        await engine.start(container)
+    return time.perf_counter() - started
+
+
+async def run_case(label, engine, pool, count, interval):
+    latencies = []
+    for i in range(count):
+        latencies.append(await start_project(engine, pool, f"{label}_{i}") * 1000)
+        await asyncio.sleep(interval)
+    print(f"{label:>5}: p50 {statistics.median(latencies):7.1f}ms  max {max(latencies):7.1f}ms  "
+          f"mean {statistics.mean(latencies):7.1f}ms")
+
+
+async def check_rebuild(engine, pool, state):
+    """另一个 worker 重新构建镜像（标签指向新的镜像 ID）后，池中旧镜像的容器不能再被租出"""
+    while not pool._idle.get(IMAGE):
+        await asyncio.sleep(0.05)
+    state.images[IMAGE] = "sha256:" + "f" * 64
+    # 补充任务可能仍在用旧镜像创建容器，租到容器之前每次都核对镜像
+    container = None
+    for attempt in range(100):
+        container = await pool.lease(IMAGE, f"project_rebuilt_{attempt}")
+        if container is not None:
+            break
+        await asyncio.sleep(0.1)
+    assert container is not None and container.attrs["Image"] == state.images[IMAGE], "租出了旧镜像的预热容器"
+    print(f"rebuild: stale warm containers discarded ({pool.stale}), next lease uses the new image")
+
+
+async def main(count, start_latency, interval):
+    warm_pool_module.WARM_POOL_SIZE = 2
+    server, state, url = start_fake_docker(latency=0.005, start_latency=start_latency, images=[IMAGE])
+    engine = AsyncDockerEngine(url)
+    print(f"{count} project starts, container boot {start_latency * 1000:.0f}ms, one every {interval * 1000:.0f}ms")
+    await run_case("cold", engine, None, count, interval)
+    # DockerCore 传入 DockerStateCache.image_id，这里直接查模拟守护进程的标签表
+    pool = WarmPool(engine, container_config, lambda image: state.images.get(image))
+    await run_case("warm", engine, pool, count, interval)
+    print(f"pool stats: {pool.stats()}")
+    await check_rebuild(engine, pool, state)
+    await pool.close()
+    engine.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+                     float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 2.0,
+                     float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 1.5))
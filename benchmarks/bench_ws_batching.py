@@ -0,0 +1,81 @@
+"""
+/ws 批量模式基准测试：按给定速率回放训练日志，
+对比逐行协议与批量协议（文本/二进制）的帧数和字节数，并估算 permessage-deflate 后的字节数
+
+运行: python -m benchmarks.bench_ws_batching [日志文件] [行/秒]
+未指定日志文件时按 Neural-Network 模板 train.py 的输出格式生成
+"""
+import asyncio
+import sys
+import time
+import zlib
+
+from utils.WebSocketConfig import BatchOptions, subscribe, broadcast_to_project, subscriptions
+
+
+def synthesize_train_log(iters: int = 10000, iter_per_epoch: int = 600):
+    yield "Training with hyper parameters: {\"lr\": \"0.1\", \"train_dataset_id\": 1, \"test_dataset_id\": 2}"
+    yield "start training"
+    yield f"iter per epoch:  {iter_per_epoch}"
+    for i in range(iters):
+        yield f"iter {i} loss:{2.3 / (1 + i / 500):.6f}"
+        if i % iter_per_epoch == 0:
+            yield f"=== epoch - {i // iter_per_epoch} ==="
+            yield f"train acc:{0.9 + i / iters / 20:.4f}, test acc:{0.9 + i / iters / 21:.4f}"
+    yield "=== training finished ==="
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.compressor = zlib.compressobj(wbits=-15)
+        self.deflated = 0
+
+    def _record(self, data: bytes):
+        self.frames += 1
+        self.bytes += len(data)
+        # 与 permessage-deflate 一致：在连接内共享压缩上下文，每帧 SYNC_FLUSH
+        self.deflated += len(self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    async def send_text(self, text: str):
+        self._record(text.encode("utf-8"))
+
+    async def send_bytes(self, data: bytes):
+        self._record(data)
+
+
+async def main(lines, rate: int):
+    clients = {
+        "legacy": (RecordingWebSocket(), None),
+        "batch-json": (RecordingWebSocket(), BatchOptions(interval_ms=100)),
+        "batch-binary": (RecordingWebSocket(), BatchOptions(interval_ms=100, binary=True)),
+    }
+    for websocket, batch in clients.values():
+        subscribe("bench", websocket, batch)
+
+    start = time.perf_counter()
+    for i, line in enumerate(lines):
+        await broadcast_to_project("bench", line, "train")
+        # 按设定速率回放
+        if i % 100 == 99:
+            await asyncio.sleep(max(start + (i + 1) / rate - time.perf_counter(), 0))
+    await asyncio.sleep(0.3)
+    duration = time.perf_counter() - start
+
+    legacy = clients["legacy"][0]
+    print(f"{len(lines)} lines in {duration:.2f}s ({len(lines) / duration:.0f} lines/s)")
+    for name, (websocket, _) in clients.items():
+        print(f"{name:>13}: {websocket.frames / duration:8.0f} frames/s {websocket.bytes / duration / 1024:8.1f} KB/s "
+              f"deflate {websocket.deflated / duration / 1024:7.1f} KB/s "
+              f"({100 * (1 - websocket.bytes / legacy.bytes):.0f}% bytes saved)")
+    print(subscriptions["bench"].stats())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8", errors="ignore") as f:
+            log_lines = [line.strip() for line in f if line.strip()]
+    else:
+        log_lines = list(synthesize_train_log())
+    asyncio.run(main(log_lines, int(sys.argv[2]) if len(sys.argv) > 2 else 5000))
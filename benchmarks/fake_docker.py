@@ -0,0 +1,395 @@
+"""
+本地测试用的最小 Docker Engine API 服务，每个请求按给定延迟返回，
+实现容器的 create/start/stop/pause/remove/inspect/list/stats（单次或持续推送）、
+镜像的 list/inspect/tag/build/delete、事件流以及 info/version，
+用于在没有 Docker 守护进程的环境中验证 AsyncDockerEngine 和调度相关代码
+
+运行: python -m benchmarks.fake_docker [端口] [延迟毫秒]
+"""
+import hashlib
+import io
+import json
+import re
+import sys
+import tarfile
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_VERSION = "1.41"
+
+
+class FakeDockerState:
+    def __init__(self, latency: float = 0.05, start_latency: float = 0.0, ncpu: int = 8,
+                 memory: int = 16 * 1024 ** 3, images=None, build_latency: float = 1.0,
+                 install_latency: float = 0.0, install_size: int = 0, container_memory: int = 0,
+                 stats_interval: float = 1.0):
+        self.latency = latency
+        # 容器启动的额外耗时，模拟镜像中解释器和依赖的加载
+        self.start_latency = start_latency
+        self.ncpu = ncpu
+        self.memory = memory
+        # 镜像标签 -> 镜像 ID
+        self.images = {tag: f"sha256:{i:064x}" for i, tag in enumerate(images or [])}
+        # 构建时指定的镜像标签（LABEL），由该镜像创建的容器继承
+        self.image_labels = {}
+        # 每次构建的耗时（秒）和构建次数
+        self.build_latency = build_latency
+        self.builds = 0
+        # Dockerfile 中每条 pip install 额外的耗时（秒）和产生的层大小
+        self.install_latency = install_latency
+        self.install_size = install_size
+        # 运行中的容器报告的内存占用（docker stats）
+        self.container_memory = container_memory
+        # stats 流推送的间隔（秒），与 Docker 守护进程相同默认每秒一次
+        self.stats_interval = stats_interval
+        # 各构建产生的层大小：依赖安装层和复制源码的层
+        self.install_layers = 0
+        self.layer_bytes = 0
+        self.containers = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        # 按 "方法 路径" 统计的请求数
+        self.calls = Counter()
+        # 事件流：已发生的事件和等待新事件的订阅者
+        self.events = []
+        self.event_added = threading.Condition()
+
+    def emit(self, event_type: str, action: str, object_id: str, **attributes):
+        with self.event_added:
+            now = time.time()
+            self.events.append({"Type": event_type, "Action": action, "time": int(now), "timeNano": int(now * 1e9),
+                                "Actor": {"ID": object_id, "Attributes": attributes}})
+            self.event_added.notify_all()
+
+    def find(self, name_or_id: str):
+        name_or_id = name_or_id.lstrip("/")
+        with self.lock:
+            for container in self.containers.values():
+                if container["Id"].startswith(name_or_id) or container["Name"] == "/" + name_or_id:
+                    return container
+        return None
+
+
+def _container_summary(container: dict) -> dict:
+    return {
+        "Id": container["Id"],
+        "Names": [container["Name"]],
+        "Image": container["Config"]["Image"],
+        "State": container["State"]["Status"],
+        "Status": container["State"]["Status"],
+        "Labels": container["Config"].get("Labels") or {},
+    }
+
+
+def make_handler(state: FakeDockerState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 响应头和响应体分两次写出，关闭 Nagle 避免与延迟确认叠加出 40ms 的等待
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body=None):
+            data = b"" if body is None else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self, method: str):
+            state.requests += 1
+            time.sleep(state.latency)
+            url = urlparse(self.path)
+            path = re.sub(r"^/v[\d.]+", "", url.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            state.calls[f"{method} {re.sub(r'/[0-9a-f]{64}', '/<id>', path)}"] += 1
+            if path == "/events":
+                return self._events(query)
+            if path == "/build" and method == "POST":
+                return self._build(query)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+            if path == "/_ping":
+                return self._reply(200, "OK")
+            if path == "/version":
+                return self._reply(200, {"ApiVersion": API_VERSION, "Version": "fake"})
+            if path == "/info":
+                with state.lock:
+                    running = sum(c["State"]["Running"] for c in state.containers.values())
+                    total = len(state.containers)
+                return self._reply(200, {"NCPU": state.ncpu, "MemTotal": state.memory,
+                                         "Containers": total, "ContainersRunning": running})
+            if path == "/images/json":
+                references = json.loads(query.get("filters") or "{}").get("reference", [])
+                with state.lock:
+                    tags_by_id = {}
+                    for tag, image_id in state.images.items():
+                        if references and not any(tag == ref or tag.split(":")[0] == ref for ref in references):
+                            continue
+                        tags_by_id.setdefault(image_id, []).append(tag)
+                return self._reply(200, [{"Id": image_id, "RepoTags": tags} for image_id, tags in tags_by_id.items()])
+            match = re.match(r"^/images/(.+)/(json|tag)$", path)
+            if match:
+                name = match.group(1)
+                with state.lock:
+                    image_id = state.images.get(name) or next(
+                        (i for i in state.images.values() if i.startswith(name) or i[7:].startswith(name)), None)
+                    if image_id is None:
+                        return self._reply(404, {"message": f"No such image: {name}"})
+                    if match.group(2) == "tag" and method == "POST":
+                        tag = f"{query['repo']}:{query.get('tag') or 'latest'}"
+                        state.images[tag] = image_id
+                        state.emit("image", "tag", image_id, name=tag)
+                        return self._reply(201)
+                    tags = [tag for tag, i in state.images.items() if i == image_id]
+                return self._reply(200, {"Id": image_id, "RepoTags": tags})
+            match = re.match(r"^/images/(.+)$", path)
+            if match and method == "DELETE":
+                name = match.group(1)
+                with state.lock:
+                    image_id = state.images.pop(name, None)
+                    if image_id is None:
+                        return self._reply(404, {"message": f"No such image: {name}"})
+                    state.emit("image", "untag", image_id, name=name)
+                    if image_id not in state.images.values():
+                        state.emit("image", "delete", image_id, name=name)
+                return self._reply(200, [{"Untagged": name}])
+            if path == "/containers/json":
+                with state.lock:
+                    containers = list(state.containers.values())
+                if query.get("all") not in ("1", "true", "True"):
+                    containers = [c for c in containers if c["State"]["Running"]]
+                filters = json.loads(query.get("filters") or "{}")
+                for name in filters.get("name", []):
+                    containers = [c for c in containers if name in c["Name"]]
+                for label in filters.get("label", []):
+                    key, _, value = label.partition("=")
+                    containers = [c for c in containers if key in c["Config"]["Labels"]
+                                  and (not value or c["Config"]["Labels"][key] == value)]
+                return self._reply(200, [_container_summary(c) for c in containers])
+            if path == "/containers/create" and method == "POST":
+                name = query.get("name") or uuid.uuid4().hex[:12]
+                if state.find(name) is not None:
+                    return self._reply(409, {"message": f"Conflict. The container name \"/{name}\" is already in use"})
+                inherited = state.image_labels.get(state.images.get(body.get("Image"), body.get("Image")), {})
+                container = {
+                    "Id": uuid.uuid4().hex + uuid.uuid4().hex,
+                    "Name": "/" + name,
+                    "Image": state.images.get(body.get("Image"), body.get("Image")),
+                    "Config": {"Image": body.get("Image"), "Labels": {**inherited, **(body.get("Labels") or {})}},
+                    "HostConfig": body.get("HostConfig") or {},
+                    "State": {"Status": "created", "Running": False, "Paused": False},
+                }
+                with state.lock:
+                    state.containers[container["Id"]] = container
+                state.emit("container", "create", container["Id"], name=name, image=body.get("Image"),
+                           **container["Config"]["Labels"])
+                return self._reply(201, {"Id": container["Id"], "Warnings": []})
+
+            match = re.match(r"^/containers/([^/]+)(?:/(\w+))?$", path)
+            if match:
+                container = state.find(match.group(1))
+                if container is None:
+                    return self._reply(404, {"message": f"No such container: {match.group(1)}"})
+                action = match.group(2)
+                status = container["State"]
+                if method == "GET" and action == "json":
+                    return self._reply(200, container)
+                if method == "GET" and action == "stats" and query.get("stream") in ("1", "true", "True"):
+                    return self._stats_stream(container)
+                if method == "GET" and action == "stats":
+                    usage = state.container_memory if status["Running"] else 0
+                    return self._reply(200, {"memory_stats": {"usage": usage, "stats": {"inactive_file": 0}}})
+                if method == "DELETE" and action is None:
+                    if status["Running"] and query.get("force") not in ("1", "true", "True"):
+                        return self._reply(409, {"message": "container is running"})
+                    with state.lock:
+                        state.containers.pop(container["Id"], None)
+                    state.emit("container", "destroy", container["Id"], name=container["Name"][1:])
+                    return self._reply(204)
+                if method == "POST" and action in ("start", "restart"):
+                    time.sleep(state.start_latency)
+                if method == "POST" and action in ("start", "stop", "kill", "pause", "unpause", "restart"):
+                    running = action in ("start", "unpause", "restart", "pause")
+                    status.update(Running=running, Paused=action == "pause",
+                                  Status={"start": "running", "restart": "running", "unpause": "running",
+                                          "pause": "paused"}.get(action, "exited"))
+                    if action in ("stop", "kill"):
+                        state.emit("container", "die", container["Id"], name=container["Name"][1:])
+                    state.emit("container", action, container["Id"], name=container["Name"][1:])
+                    return self._reply(204)
+                if method == "POST" and action == "update":
+                    container["HostConfig"].update(body)
+                    return self._reply(200, {"Warnings": []})
+                if method == "POST" and action == "rename":
+                    old_name = container["Name"]
+                    container["Name"] = "/" + query.get("name", container["Name"].lstrip("/"))
+                    state.emit("container", "rename", container["Id"], name=container["Name"][1:], oldName=old_name)
+                    return self._reply(204)
+            return self._reply(404, {"message": f"page not found: {method} {path}"})
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+        def do_DELETE(self):
+            self._route("DELETE")
+
+        def do_HEAD(self):
+            self._route("HEAD")
+
+        def _read_body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                data = b""
+                while True:
+                    size = int(self.rfile.readline().strip() or b"0", 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return data
+                    data += self.rfile.read(size)
+                    self.rfile.readline()
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _build(self, query: dict):
+            """按构建上下文的内容生成镜像 ID，逐行返回构建输出"""
+            context = self._read_body()
+            state.builds += 1
+            image_id = "sha256:" + hashlib.sha256(context).hexdigest()
+            with tarfile.open(fileobj=io.BytesIO(context)) as tar:
+                dockerfile_name = query.get("dockerfile") or "Dockerfile"
+                dockerfile = tar.extractfile(dockerfile_name).read().decode("utf-8")
+                source_bytes = sum(member.size for member in tar.getmembers()
+                                   if member.isfile() and member.name != dockerfile_name)
+            instructions = [line.strip() for line in dockerfile.splitlines()
+                            if line.strip() and not line.strip().startswith("#")]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            base = instructions[0].split()[1] if instructions else ""
+            if base.startswith("aiforge-") and base not in state.images:
+                self._write_chunk({"error": f"pull access denied for {base}"})
+                self.wfile.write(b"0\r\n\r\n")
+                return
+            time.sleep(state.build_latency)
+            for step, instruction in enumerate(instructions, 1):
+                if re.match(r"^RUN .*pip3? install", instruction):
+                    time.sleep(state.install_latency)
+                    state.install_layers += 1
+                    state.layer_bytes += state.install_size
+                elif re.match(r"^(COPY|ADD) ", instruction):
+                    state.layer_bytes += source_bytes
+                self._write_chunk({"stream": f"Step {step}/{len(instructions)} : {instruction}\n"})
+            with state.lock:
+                if query.get("labels"):
+                    state.image_labels[image_id] = json.loads(query["labels"])
+                if query.get("t"):
+                    state.images[query["t"]] = image_id
+                    state.emit("image", "tag", image_id, name=query["t"])
+            self._write_chunk({"aux": {"ID": image_id}})
+            self._write_chunk({"stream": f"Successfully built {image_id[7:19]}\n"})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _events(self, query: dict):
+            """按 since 回放已有事件，之后持续推送新事件，直到客户端断开"""
+            since = float(query.get("since") or time.time())
+            filters = json.loads(query.get("filters") or "{}")
+            types = set(filters.get("type", []))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            sent = 0
+            try:
+                while True:
+                    with state.event_added:
+                        while sent == len(state.events):
+                            state.event_added.wait(1)
+                        pending = state.events[sent:]
+                        sent = len(state.events)
+                    for event in pending:
+                        if event["time"] >= int(since) and (not types or event["Type"] in types):
+                            self._write_chunk(event)
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                return
+
+        def _stats_stream(self, container: dict):
+            """按 stats_interval 持续推送与 Docker 格式相同的资源统计，计数器递增，容器停止后结束"""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            ncpu = min(state.ncpu, 8)
+            previous = {"cpu_usage": {"total_usage": 0, "percpu_usage": [0] * ncpu}, "system_cpu_usage": 0,
+                        "online_cpus": ncpu}
+            tick = 0
+            try:
+                while container["State"]["Running"]:
+                    tick += 1
+                    busy = 0 if container["State"]["Paused"] else 250_000_000 * (1 + tick % 3)
+                    total = previous["cpu_usage"]["total_usage"] + busy
+                    current = {"cpu_usage": {"total_usage": total, "percpu_usage": [total // ncpu] * ncpu,
+                                             "usage_in_kernelmode": total // 10, "usage_in_usermode": total - total // 10},
+                               "system_cpu_usage": tick * ncpu * 1_000_000_000, "online_cpus": ncpu,
+                               "throttling_data": {"periods": 0, "throttled_periods": 0, "throttled_time": 0}}
+                    usage = state.container_memory or 256 * 1024 ** 2
+                    self._write_chunk({
+                        "read": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime()),
+                        "preread": "0001-01-01T00:00:00Z",
+                        "id": container["Id"], "name": container["Name"],
+                        "pids_stats": {"current": 4, "limit": 4096},
+                        "cpu_stats": current, "precpu_stats": previous,
+                        "memory_stats": {"usage": usage, "limit": state.memory,
+                                         "stats": {"anon": usage - usage // 8, "file": usage // 8,
+                                                   "inactive_file": usage // 16, "active_file": usage // 16,
+                                                   "kernel_stack": 65536, "slab": 1048576, "sock": 0, "shmem": 0,
+                                                   "pgfault": tick * 100, "pgmajfault": 0}},
+                        "networks": {"eth0": {"rx_bytes": tick * 20_000, "rx_packets": tick * 20, "rx_errors": 0,
+                                              "rx_dropped": 0, "tx_bytes": tick * 5_000, "tx_packets": tick * 10,
+                                              "tx_errors": 0, "tx_dropped": 0}},
+                        "blkio_stats": {"io_service_bytes_recursive": [
+                            {"major": 8, "minor": 0, "op": "read", "value": tick * 4096},
+                            {"major": 8, "minor": 0, "op": "write", "value": tick * 8192}]},
+                    })
+                    previous = current
+                    time.sleep(state.stats_interval)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                return
+
+        def _write_chunk(self, body: dict):
+            data = json.dumps(body).encode() + b"\r\n"
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_fake_docker(port: int = 0, **kwargs):
+    """在后台线程中启动，返回 (server, state, base_url)"""
+    state = FakeDockerState(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"tcp://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 2376
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.05
+    server, _, url = start_fake_docker(port, latency=latency, images=["python:3.10"])
+    print(f"fake docker listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,53 @@
+"""
+本地测试用的最小 RESP 服务，只实现 PUBLISH/SUBSCRIBE/PING/AUTH，
+用于在没有 Redis 的环境中验证 RedisBroker
+
+运行: python -m benchmarks.fake_redis [端口]
+"""
+import asyncio
+import sys
+from collections import defaultdict
+
+from utils.Broker import _encode_command, _read_reply
+
+subscribers = defaultdict(set)
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    channels = set()
+    try:
+        while True:
+            command = await _read_reply(reader)
+            name = command[0].upper()
+            if name == b"PUBLISH":
+                targets = list(subscribers[command[1]])
+                for target in targets:
+                    target.write(_encode_command("message", command[1], command[2]))
+                writer.write(f":{len(targets)}\r\n".encode())
+            elif name == b"SUBSCRIBE":
+                for i, channel in enumerate(command[1:], 1):
+                    subscribers[channel].add(writer)
+                    channels.add(channel)
+                    writer.write(_encode_command("subscribe", channel, str(i)))
+            elif name in (b"PING", b"AUTH"):
+                writer.write(b"+OK\r\n")
+            else:
+                writer.write(b"-ERR unknown command\r\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        for channel in channels:
+            subscribers[channel].discard(writer)
+        writer.close()
+
+
+async def main(port: int):
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    print(f"fake redis listening on 127.0.0.1:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 6379))
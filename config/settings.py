@@ -1,3 +1,5 @@
+import os
+
 TORTOISE_ORM = {
     "connections": {
         "default": {
@@ -17,10 +19,13 @@ TORTOISE_ORM = {
         "models": {
             "models": [
                 "models.dataset", "models.hypara", "models.model",
-                "models.project", "models.tag", "models.user", "aerich.models"
+                "models.project", "models.tag", "models.user", "models.job", "aerich.models"
             ],
             "default_connection": "default",
         },
     },
     "use_tz": False,
 }
+
+# 项目日志的跨 worker 转发方式，见 utils.Broker.create_broker
+LOG_BROKER_URL = os.environ.get("LOG_BROKER_URL", "memory://")
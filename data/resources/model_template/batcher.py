@@ -0,0 +1,66 @@
+"""
+推理请求合批：在一个时间窗口内（或凑满最大批量时）收集并发到达的请求，
+把预处理后的输入交给一次批量前向计算，再把结果分别交还给各个请求
+"""
+import queue
+import threading
+import time
+
+
+class MicroBatcher:
+
+    def __init__(self, run_batch, window: float, max_size: int):
+        """
+        run_batch(inputs: list) -> list，返回与 inputs 一一对应的结果
+        window: 第一个请求到达后最多等待的秒数；max_size: 单批最多的请求数
+        """
+        self.run_batch = run_batch
+        self.window = max(window, 0.0)
+        self.max_size = max(max_size, 1)
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        threading.Thread(target=self._loop, name="micro-batcher", daemon=True).start()
+
+    def submit(self, item, callback):
+        """加入下一批，完成后在合批线程中调用 callback(result, error)"""
+        self._queue.put((item, callback))
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"predict_batch returned {len(results)} results for {len(batch)} inputs")
+            except Exception as e:
+                for _, callback in batch:
+                    callback(None, e)
+                continue
+            for (_, callback), result in zip(batch, results):
+                callback(result, None)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "batches": self.batches,
+            "items": self.items,
+            "largest": self.largest,
+            "mean_size": round(self.items / self.batches, 2) if self.batches else 0,
+        }
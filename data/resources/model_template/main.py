@@ -0,0 +1,188 @@
+"""
+模型容器入口模板，把 train(params) 和 predict(data) 接入 AIForge 后端。
+
+后端与容器之间使用按行分帧的 JSON 协议，每帧以 "@@aiforge " 开头：
+  请求（stdin）:  {"v": 1, "id": "<请求 id>", "op": "hello" | "train" | "predict" | "serve", "params": ...}
+  响应（stdout）: {"type": "hello", "id": ..., "protocol": 1, "ops": [...], "resident": {...}}
+                 {"type": "log", "id": ..., "line": "..."}       请求执行期间 print 的每一行
+                 {"type": "result", "id": ..., "data": ...}      返回值；没有返回值时为输出的全部内容
+                 {"type": "error", "id": ..., "error": "...", "traceback": "..."}
+推理请求并发执行，训练请求依次执行。
+predict.py 提供 load_model(params_file) 时支持常驻模式（serve）：参数只加载一次，
+之后调用 predict(data, model=...)，PARAMS_FILE 的 mtime 或内容哈希变化后才重新加载。
+再提供 preprocess(data) 和 predict_batch(inputs, model) 时，并发的 serve 请求先各自预处理，
+然后在 BATCH_WINDOW_MS 窗口内合成一批（最多 MAX_BATCH_SIZE 个）做一次前向计算。
+旧版的 stdin 模式仍然可用：先发送一行 train/predict，再发送一行参数，完成后输出 TRAIN_COMPLETE/PREDICT_COMPLETE。
+"""
+import json
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import predict as predict_module
+from batcher import MicroBatcher
+from resident import ResidentModel
+from train import train
+from predict import predict
+
+FRAME_PREFIX = "@@aiforge "
+PROTOCOL_VERSION = 1
+# 同时执行的请求数
+MAX_WORKERS = 4
+
+_stdout = sys.stdout
+_write_lock = threading.Lock()
+_train_lock = threading.Lock()
+_local = threading.local()
+
+# 常驻模型，predict.py 没有提供 load_model 时为 None
+resident = None
+if hasattr(predict_module, "load_model"):
+    resident = ResidentModel(getattr(predict_module, "PARAMS_FILE", "params.pkl"), predict_module.load_model)
+
+# 合批器，predict.py 没有提供 preprocess 和 predict_batch 时为 None
+batcher = None
+if resident is not None and hasattr(predict_module, "preprocess") and hasattr(predict_module, "predict_batch"):
+    batcher = MicroBatcher(
+        lambda inputs: predict_module.predict_batch(inputs, resident.get()),
+        window=float(os.environ.get("AIFORGE_BATCH_WINDOW_MS", getattr(predict_module, "BATCH_WINDOW_MS", 0))) / 1000,
+        max_size=int(os.environ.get("AIFORGE_MAX_BATCH", getattr(predict_module, "MAX_BATCH_SIZE", 32))),
+    )
+
+
+def send(message: dict):
+    line = FRAME_PREFIX + json.dumps(message, ensure_ascii=False, default=str) + "\n"
+    with _write_lock:
+        _stdout.write(line)
+        _stdout.flush()
+
+
+class RequestOutput:
+    """替换 sys.stdout：请求执行期间 print 的内容按行转为该请求的 log 帧，并发请求的输出不会交错"""
+
+    def write(self, text: str) -> int:
+        request_id = getattr(_local, "request_id", None)
+        if request_id is None:
+            with _write_lock:
+                _stdout.write(text)
+            return len(text)
+        *lines, _local.partial = (_local.partial + text).split("\n")
+        for line in lines:
+            _local.lines.append(line)
+            send({"type": "log", "id": request_id, "line": line})
+        return len(text)
+
+    def flush(self):
+        with _write_lock:
+            _stdout.flush()
+
+    def finish(self):
+        """输出请求结束时尚未换行的内容"""
+        if _local.partial:
+            self.write("\n")
+
+
+def handle(request: dict, output: RequestOutput):
+    request_id = request.get("id")
+    _local.request_id, _local.partial, _local.lines = request_id, "", []
+    try:
+        op = request.get("op")
+        if op == "train":
+            with _train_lock:
+                data = train(request.get("params") or {})
+        elif op == "predict":
+            data = predict(request.get("params"))
+        elif op == "serve" and resident is not None:
+            data = predict(request.get("params"), model=resident.get())
+        else:
+            raise ValueError(f"Unknown op: {op}")
+        output.finish()
+        send({"type": "result", "id": request_id, "data": data if data is not None else "\n".join(_local.lines)})
+    except Exception as e:
+        output.finish()
+        send({"type": "error", "id": request_id, "error": str(e), "traceback": traceback.format_exc()})
+    finally:
+        _local.request_id = None
+
+
+def handle_batched(request: dict):
+    """预处理后加入合批队列，结果由合批线程返回，不占用请求线程"""
+    request_id = request.get("id")
+
+    def done(result, error):
+        if error is None:
+            send({"type": "result", "id": request_id, "data": result})
+        else:
+            send({"type": "error", "id": request_id, "error": str(error),
+                  "traceback": "".join(traceback.format_exception(error))})
+
+    try:
+        batcher.submit(predict_module.preprocess(request.get("params")), done)
+    except Exception as e:
+        done(None, e)
+
+
+def run_legacy(command: str):
+    """旧版 stdin 模式"""
+    params = sys.stdin.readline()
+    if command == "train":
+        print("Training with hyper parameters:", params)
+        train(json.loads(params))
+        print("TRAIN_COMPLETE")
+    else:
+        predict(params.strip())
+        print("PREDICT_COMPLETE")
+
+
+def hello(request: dict):
+    ops = ["train", "predict"] + (["serve"] if resident is not None else [])
+    send({"type": "hello", "id": request.get("id"), "protocol": PROTOCOL_VERSION, "ops": ops,
+          "resident": resident.stats() if resident is not None else None,
+          "batching": batcher.stats() if batcher is not None else None})
+
+
+def warm_up():
+    """启动时预先加载常驻模型，参数文件还不存在（尚未训练）时等到第一次请求再加载"""
+    try:
+        resident.get()
+    except OSError:
+        pass
+
+
+def main():
+    if sys.stdin.isatty():
+        # 关闭终端回显和行缓冲，请求帧不再回显，也不受单行 4096 字节的限制
+        import tty
+        tty.setcbreak(sys.stdin.fileno())
+    output = RequestOutput()
+    sys.stdout = output
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    if resident is not None:
+        pool.submit(warm_up)
+    for raw in sys.stdin:
+        line = raw.strip()
+        if line.startswith(FRAME_PREFIX.strip()):
+            try:
+                request = json.loads(line[len(FRAME_PREFIX.strip()):])
+            except ValueError:
+                continue
+            if request.get("op") == "hello":
+                hello(request)
+            elif request.get("op") == "serve" and batcher is not None:
+                pool.submit(handle_batched, request)
+            else:
+                pool.submit(handle, request, output)
+        elif line in ("train", "predict"):
+            run_legacy(line)
+        elif line == "exit":
+            print("Exiting...")
+            break
+        elif line:
+            print("Unknown command. Available commands: train, predict, exit")
+    pool.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    main()
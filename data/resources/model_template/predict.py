@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+from PIL import Image
+from two_layer_net import TwoLayerNet
+
+# 常驻模式下监视的参数文件，训练结束后 save_params 写入新内容时自动重新加载
+PARAMS_FILE = "params.pkl"
+# 合批参数：第一个请求到达后最多等待的毫秒数和单批最多的图片数，
+# 窗口越大批量越大、单个请求的延迟越高；可用环境变量 AIFORGE_BATCH_WINDOW_MS / AIFORGE_MAX_BATCH 覆盖。
+# 这个网络的前向计算只占请求耗时的很小一部分，窗口为 0：不额外等待，只合并已经排队的请求
+BATCH_WINDOW_MS = 0
+MAX_BATCH_SIZE = 32
+
+# 网络各层在 forward 时会保存中间结果，同一个网络实例不能被多个线程同时使用
+_network_lock = threading.Lock()
+
+
+def load_image(file_path, flatten=True):
+    # 加载并预处理图像
+    img = Image.open(file_path).convert('L')  # 转换为灰度
+    img = img.resize((28, 28))  # 调整尺寸
+
+    # 转换为numpy数组并处理数据类型
+    img_array = np.array(img, dtype=np.float32)
+
+    # 反转颜色（MNIST是黑底白字，一般图片可能是白底黑字）
+    img_array = 255 - img_array
+
+    # 展平处理
+    if flatten:
+        img_array = img_array.reshape(1, -1)  # 转换为(1, 784)
+
+    return img_array
+
+
+def preprocess(img_path):
+    """合批模式下在各请求的线程中并行完成的预处理"""
+    return load_image(img_path)
+
+
+def load_model(params_file=PARAMS_FILE):
+    """创建网络并加载参数，常驻模式下只在参数文件变化时调用"""
+    network = TwoLayerNet(input_size=784, hidden_size=50, output_size=10)
+    network.load_params(params_file)
+    return network
+
+
+def predict(img_path, model=None):
+    # 加载并预处理图像
+    processed_img = load_image(img_path)
+
+    # 常驻模式传入已加载的网络，否则按原来的方式每次加载
+    network = model if model is not None else load_model()
+
+    # 进行预测
+    with _network_lock:
+        confidence = network.predict(processed_img)
+    predicted_label = int(confidence.argmax(axis=1)[0])
+
+    print(f"Predict Result is: {predicted_label}")
+    return predicted_label
+
+
+def predict_batch(images, model):
+    """把多张预处理后的图片 (1, 784) 拼成 (N, 784)，一次前向计算得到全部结果"""
+    batch = np.concatenate(images, axis=0)
+    with _network_lock:
+        confidence = model.predict(batch)
+    return [int(label) for label in confidence.argmax(axis=1)]
@@ -0,0 +1,52 @@
+"""
+常驻模型：参数文件只加载一次并保留在内存中，之后每次取用时只检查文件的 mtime 和大小，
+发生变化（例如训练结束后重新保存）时再比较内容哈希，哈希不同才重新加载
+"""
+import hashlib
+import os
+import threading
+
+HASH_CHUNK = 1024 * 1024
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResidentModel:
+
+    def __init__(self, path: str, loader):
+        self.path = path
+        self.loader = loader
+        self.model = None
+        self.signature = None  # (mtime_ns, size)
+        self.digest = None
+        self.loads = 0
+        self.hash_checks = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """返回已加载的模型，参数文件变化时重新加载"""
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self.model is not None and signature == self.signature:
+            return self.model
+        with self._lock:
+            if self.model is not None and signature == self.signature:
+                return self.model
+            digest = file_hash(self.path)
+            self.hash_checks += 1
+            if self.model is None or digest != self.digest:
+                self.model = self.loader(self.path)
+                self.digest = digest
+                self.loads += 1
+                print(f"[resident] loaded {self.path} ({digest[:12]})")
+            self.signature = signature
+            return self.model
+
+    def stats(self) -> dict:
+        return {"path": self.path, "digest": self.digest, "loads": self.loads, "hash_checks": self.hash_checks}
@@ -17,7 +17,12 @@ from routers.tags import tag
 from routers.project import project
 from routers.favor import favors
 from routers.api import api
-from utils.WebSocketConfig import active_connections, subscriptions
+from routers.job import job
+from services.job import job_runner
+from utils.DockerFactory import DockerFactory
+from utils.ResultGenerator import ResultGenerator
+from utils.WebSocketConfig import active_connections, subscribe, unsubscribe_all, channel_stats, BatchOptions, \
+    broker, start_broker, stop_broker
 import numpy as np
 
 app = FastAPI()
@@ -30,6 +35,7 @@ app.include_router(tag, prefix='/Tags', tags=['标签管理'])
 app.include_router(project, prefix='/Project', tags=['项目管理'])
 app.include_router(favors, prefix='/Favors', tags=['收藏管理'])
 app.include_router(api, prefix='/api', tags=['接口化服务'])
+app.include_router(job, prefix='/Job', tags=['任务管理'])
 
 origins = [
     '*'
@@ -51,39 +57,57 @@ register_tortoise(
 
 app.mount("/static", StaticFiles(directory="./data/pic"), name="static")
 
+app.add_event_handler("startup", start_broker)
+app.add_event_handler("shutdown", stop_broker)
+app.add_event_handler("startup", DockerFactory.startup)
+app.add_event_handler("shutdown", DockerFactory.shutdown)
+app.add_event_handler("startup", job_runner.start)
+app.add_event_handler("shutdown", job_runner.stop)
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     active_connections.append(websocket)
 
-    while True:
-        data = await websocket.receive_text()
-        message = json.loads(data)
+    try:
+        while True:
+            data = await websocket.receive_text()
+            message = json.loads(data)
 
-        try:
             if message.get("action") == "subscribe":
                 channel = message.get("channel")
                 if channel:
-                    project_id = channel.split("_")[-1]
-                    print(project_id)
-                    if project_id not in subscriptions:
-                        subscriptions[project_id] = []
-                    subscriptions[project_id].append(websocket)
+                    # 模型镜像构建进度使用 model_<id> 频道，与项目频道区分
+                    project_id = channel if channel.startswith("model_") else channel.split("_")[-1]
+                    # 携带 batch 字段的客户端使用批量帧，旧客户端保持逐行推送
+                    batch = BatchOptions.from_message(message.get("batch"))
+                    # since: 已收到的最后一行序号；last: 回放最近的行数
+                    replay_from = subscribe(project_id, websocket, batch,
+                                            since=message.get("since"), last=message.get("last"))
 
                     await websocket.send_text(json.dumps({
-                        "message": f"Subscribed to {channel}"
+                        "message": f"Subscribed to {channel}",
+                        "batch": bool(batch),
+                        "replay_from": replay_from,
                     }))
-                print(subscriptions)
 
             elif message.get("action") == "message":
                 await websocket.send_text(f"Message received: {message['body']}")
-        except WebSocketDisconnect:
-            print(f"WebSocket 断开：{websocket.client}")
-            if websocket in active_connections:
-                active_connections.remove(websocket)
+    except WebSocketDisconnect:
+        print(f"WebSocket 断开：{websocket.client}")
+    finally:
+        unsubscribe_all(websocket)
+        if websocket in active_connections:
+            active_connections.remove(websocket)
+
+
+@app.get("/ws/stats")
+async def websocket_stats():
+    return ResultGenerator.gen_success_result(data={"channels": channel_stats(), "broker": broker.stats()})
 
 
 if __name__ == '__main__':
-    uvicorn.run('main:app', port=8084, reload=True)
+    # 与支持的浏览器协商 permessage-deflate，压缩日志帧
+    uvicorn.run('main:app', port=8084, reload=True, ws_per_message_deflate=True)
     print("backend start")
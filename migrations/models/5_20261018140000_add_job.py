@@ -0,0 +1,28 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `job` (
+    `job_id` VARCHAR(36) NOT NULL PRIMARY KEY,
+    `project_id` INT NOT NULL,
+    `user_id` VARCHAR(255) NOT NULL,
+    `command` VARCHAR(20) NOT NULL,
+    `payload` LONGTEXT NOT NULL,
+    `status` VARCHAR(20) NOT NULL DEFAULT 'queued',
+    `result` LONGTEXT,
+    `error` LONGTEXT,
+    `worker` VARCHAR(64) NOT NULL DEFAULT '',
+    `create_time` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    `start_time` DATETIME(6),
+    `finish_time` DATETIME(6),
+    `heartbeat_time` DATETIME(6),
+    KEY `idx_job_project_id` (`project_id`),
+    KEY `idx_job_user_id` (`user_id`),
+    KEY `idx_job_status` (`status`)
+) CHARACTER SET utf8mb4;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `job`;"""
@@ -0,0 +1,14 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `job_lock` (
+    `name` VARCHAR(32) NOT NULL PRIMARY KEY
+) CHARACTER SET utf8mb4;
+        INSERT IGNORE INTO `job_lock` (`name`) VALUES ('dispatch');"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `job_lock`;"""
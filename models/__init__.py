@@ -1,6 +1,7 @@
 from .basemodel import BaseModel
 from .dataset import Dataset
 from .hypara import Hypara
+from .job import Job, JobLock
 from .model import Model
 from .project import Project
 from .tag import Tag
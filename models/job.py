@@ -0,0 +1,177 @@
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from tortoise import BaseDBAsyncClient, fields
+from tortoise.exceptions import IntegrityError
+from tortoise.functions import Max
+from tortoise.transactions import in_transaction
+from .basemodel import BaseModel
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_CANCELLING = "cancelling"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_INTERRUPTED = "interrupted"
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING, JOB_CANCELLING)
+RUNNING_STATUSES = (JOB_RUNNING, JOB_CANCELLING)
+# job_lock 表中调度锁所在行
+DISPATCH_LOCK = "dispatch"
+
+
+class JobLock(BaseModel):
+    """跨进程的调度锁：调度时在事务中锁住一行，各进程判断并发限制和领取任务的过程不会交错"""
+    name = fields.CharField(max_length=32, pk=True)
+
+    class Meta:
+        table = "job_lock"
+
+
+class Job(BaseModel):
+    job_id = fields.CharField(max_length=36, pk=True)
+    project_id = fields.IntField(index=True)
+    user_id = fields.CharField(max_length=255, index=True)
+    command = fields.CharField(max_length=20)
+    payload = fields.TextField()  # 发送给容器的参数（JSON）
+    status = fields.CharField(max_length=20, default=JOB_QUEUED, index=True)
+    result = fields.TextField(null=True)  # 执行结果（JSON）
+    error = fields.TextField(null=True)
+    worker = fields.CharField(max_length=64, default="")  # 正在执行该任务的进程
+    create_time = fields.DatetimeField(auto_now_add=True)
+    start_time = fields.DatetimeField(null=True)
+    finish_time = fields.DatetimeField(null=True)
+    heartbeat_time = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "job"
+
+    @staticmethod
+    async def add_job(project_id: int, user_id: str, command: str, payload) -> 'Job':
+        return await Job.create(job_id=str(uuid4()), project_id=project_id, user_id=user_id, command=command,
+                                payload=json.dumps(payload, ensure_ascii=False), status=JOB_QUEUED)
+
+    @staticmethod
+    async def find_by_id(job_id: str) -> Optional['Job']:
+        return await Job.filter(job_id=job_id).first()
+
+    @staticmethod
+    async def find_active(project_id: int, command: str) -> Optional['Job']:
+        """项目正在排队或执行的同类任务"""
+        return await Job.filter(project_id=project_id, command=command, status__in=ACTIVE_STATUSES).first()
+
+    @staticmethod
+    async def find_jobs(user_id: str = None, project_id: int = None, status: str = None,
+                        limit: int = 50) -> List['Job']:
+        query = Job.all()
+        if user_id:
+            query = query.filter(user_id=user_id)
+        if project_id:
+            query = query.filter(project_id=project_id)
+        if status:
+            query = query.filter(status=status)
+        return await query.order_by("-create_time").limit(limit)
+
+    @staticmethod
+    @asynccontextmanager
+    async def dispatch_lock():
+        """
+        在事务中 SELECT ... FOR UPDATE 锁住调度锁行，返回事务连接；锁内的查询和领取都要使用该连接。
+        锁在事务提交时释放，之后获得锁的进程能读到这次领取的结果
+        """
+        async with in_transaction() as conn:
+            lock = await JobLock.filter(name=DISPATCH_LOCK).using_db(conn).select_for_update().first()
+            if lock is None:
+                # 锁行由迁移写入；缺失时补上，并发补写时以先写入的为准
+                try:
+                    async with in_transaction() as insert_conn:
+                        await JobLock.create(name=DISPATCH_LOCK, using_db=insert_conn)
+                except IntegrityError:
+                    pass
+                await JobLock.filter(name=DISPATCH_LOCK).using_db(conn).select_for_update().first()
+            yield conn
+
+    @staticmethod
+    async def find_queued(limit: int, conn: Optional[BaseDBAsyncClient] = None) -> List['Job']:
+        return await Job.filter(status=JOB_QUEUED).using_db(conn).order_by("create_time").limit(limit)
+
+    @staticmethod
+    async def find_running(conn: Optional[BaseDBAsyncClient] = None) -> List['Job']:
+        return await Job.filter(status__in=RUNNING_STATUSES).using_db(conn)
+
+    @staticmethod
+    async def project_activity(project_ids: List[int]) -> Tuple[Set[int], Dict[int, datetime]]:
+        """有排队或执行中任务的项目，以及各项目最近一次任务结束的时间；包括所有进程提交和执行的任务"""
+        active = await Job.filter(project_id__in=project_ids, status__in=ACTIVE_STATUSES) \
+            .distinct().values_list("project_id", flat=True)
+        finished = await Job.filter(project_id__in=project_ids, finish_time__not_isnull=True) \
+            .annotate(last_finish=Max("finish_time")).group_by("project_id").values_list("project_id", "last_finish")
+        return set(active), dict(finished)
+
+    @staticmethod
+    async def claim(job_id: str, worker: str, conn: Optional[BaseDBAsyncClient] = None) -> bool:
+        """
+        把排队中的任务标记为由 worker 执行，多个进程同时领取时只有一个成功；
+        并发限制只有在持有 dispatch_lock 时判断并领取才成立
+        """
+        now = datetime.now()
+        updated = await Job.filter(job_id=job_id, status=JOB_QUEUED).using_db(conn).update(
+            status=JOB_RUNNING, worker=worker, start_time=now, heartbeat_time=now)
+        return updated == 1
+
+    @staticmethod
+    async def finish(job_id: str, status: str, worker: str, result=None, error: str = None) -> bool:
+        """
+        结束 worker 正在执行的任务；任务已被标记为中断（心跳超时）或已结束时不覆盖，返回 False
+        """
+        updated = await Job.filter(job_id=job_id, worker=worker, status__in=RUNNING_STATUSES).update(
+            status=status, finish_time=datetime.now(),
+            result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+            error=error)
+        return updated == 1
+
+    @staticmethod
+    async def cancel_queued(job_id: str) -> bool:
+        updated = await Job.filter(job_id=job_id, status=JOB_QUEUED).update(
+            status=JOB_CANCELLED, finish_time=datetime.now())
+        return updated == 1
+
+    @staticmethod
+    async def request_cancel(job_id: str) -> bool:
+        """运行中的任务标记为取消中，由执行它的进程负责中断"""
+        updated = await Job.filter(job_id=job_id, status=JOB_RUNNING).update(status=JOB_CANCELLING)
+        return updated == 1
+
+    @staticmethod
+    async def heartbeat(worker: str):
+        await Job.filter(worker=worker, status__in=RUNNING_STATUSES).update(heartbeat_time=datetime.now())
+
+    @staticmethod
+    async def interrupt_stale(stale_after: int) -> List['Job']:
+        """心跳超时的运行中任务（执行它的进程已退出）标记为中断；只返回确实被标记的任务"""
+        deadline = datetime.now() - timedelta(seconds=stale_after)
+        interrupted = []
+        for job in await Job.filter(status__in=RUNNING_STATUSES, heartbeat_time__lt=deadline):
+            # 重新按心跳时间过滤：读取之后恢复心跳的任务不标记
+            if await Job.filter(job_id=job.job_id, status__in=RUNNING_STATUSES, heartbeat_time__lt=deadline).update(
+                    status=JOB_INTERRUPTED, finish_time=datetime.now(), error="执行任务的服务进程已退出"):
+                interrupted.append(job)
+        return interrupted
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "project_id": self.project_id,
+            "user_id": self.user_id,
+            "command": self.command,
+            "status": self.status,
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "create_time": self.create_time.isoformat() if self.create_time else None,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "finish_time": self.finish_time.isoformat() if self.finish_time else None,
+        }
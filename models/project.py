@@ -1,18 +1,21 @@
+import asyncio
 import os
 import shutil
 from pathlib import Path
 
 from fastapi import HTTPException
 from tortoise import fields
+from tortoise.expressions import F
 from datetime import datetime
 from typing import List, Dict, Any
 
+from services.job import submit_job
 from services.model import add_model_without_file
+from utils.BlobStore import blob_store
 from utils.DockerCore import DockerCore
 from models.basemodel import BaseModel  # 基类，假设BaseModel已经定义好
 from models.model import Model  # 假设Model模型已经定义
 from models.dataset import Dataset  # 假设Dataset模型已经定义
-from utils.DockerFactory import DockerFactory
 from utils.ResultGenerator import ResultGenerator
 from utils.OtherUtil import generate_secret_key
 
@@ -32,6 +35,8 @@ class Project(BaseModel):
     store_path = fields.CharField(max_length=255, default="")
     project_type = fields.CharField(max_length=100)
     project_field = fields.CharField(max_length=100, default="No field")
+    docker_host = fields.CharField(max_length=255, default="")  # 项目容器所在的 Docker 主机
+    predict_generation = fields.IntField(default=0)  # 推理缓存代数，训练结束或容器重建时加一
 
     class Meta:
         table = "project"
@@ -70,12 +75,9 @@ class Project(BaseModel):
         model_file = model.model_path
         project_root = os.getcwd()
         project_file = os.path.join(project_root, "data", "Project", str(project_id))
-        # 清空现有项目的目录
-        if os.path.exists(project_file):
-            shutil.rmtree(project_file)
-        # 复制模型文件到项目目录
+        # 清空现有项目的目录，按模型文件重建：文件以硬链接指向去重存储，不复制内容
         try:
-            shutil.copytree(model_file, project_file)
+            await asyncio.to_thread(blob_store.materialize, model_file, project_file)
         except IOError as e:
             print(f"Error copying model files: {e}")
 
@@ -116,6 +118,12 @@ class Project(BaseModel):
         await project.save()
         return {"detail": "Visibility updated"}
 
+    @staticmethod
+    async def bump_predict_generation(project_id: int) -> int:
+        """原子地增加推理缓存代数，返回新的代数"""
+        await Project.filter(project_id=project_id).update(predict_generation=F("predict_generation") + 1)
+        return await Project.filter(project_id=project_id).first().values_list("predict_generation", flat=True)
+
     @staticmethod
     async def update_project_status_by_id(project_id: int, status: str):
         project = await Project.get(project_id=project_id)
@@ -123,6 +131,13 @@ class Project(BaseModel):
         await project.save()
         return {"detail": "Project status updated"}
 
+    @staticmethod
+    async def update_docker_host_by_id(project_id: int, docker_host: str):
+        project = await Project.get(project_id=project_id)
+        project.docker_host = docker_host
+        await project.save()
+        return {"detail": "Docker host updated"}
+
     @staticmethod
     async def update_project_type_by_id(project_id: int, project_type: str):
         project = await Project.get(project_id=project_id)
@@ -167,14 +182,10 @@ class Project(BaseModel):
 
     @staticmethod
     async def run_project(project_id: int, command: str, hypara: Dict[str, Any]):
-        project = await Project.find_by_id(project_id)
+        """提交训练任务，立即返回任务信息，由后台任务执行器在项目容器中执行"""
+        project = await Project.filter(project_id=project_id).first()
         if project:
-            docker = DockerFactory.docker_client_pool['tcp://localhost:2375']
-            try:
-                return await docker.exec_container_log(project_id, command, hypara)
-            except Exception as e:
-                print(f"exec_container_log error: {e}")
-                return ResultGenerator.gen_error_result(code=500, message=f"项目运行失败{e}")
+            return await submit_job(project, command, hypara)
         else:
             return ResultGenerator.gen_error_result(code=404, message="项目不存在")
 
@@ -223,13 +234,9 @@ class Project(BaseModel):
         model = await add_model_without_file(model)
         new_model_path = model.model_path
         try:
-            # 复制模型文件
-            shutil.copytree(model_file, new_model_path)
-            project_file = project.store_path
-            # 复制项目文件
-            if os.path.exists(project_file):
-                shutil.rmtree(project_file)
-            shutil.copytree(new_model_path, project_file)  # 复制模型文件到项目目录
+            # 复制模型文件，再用新模型的文件重建项目目录（都只建立硬链接）
+            await asyncio.to_thread(blob_store.materialize, model_file, new_model_path)
+            await asyncio.to_thread(blob_store.materialize, new_model_path, project.store_path)
         except IOError as e:
             return ResultGenerator.gen_fail_result(message=f"复制模型文件失败: {str(e)}")
 
@@ -244,7 +251,10 @@ class Project(BaseModel):
 
     @staticmethod
     async def predict(project_id: int, command: str, hypara: Dict[str, str]):
-        docker = DockerFactory.docker_client_pool['tcp://localhost:2375']
+        """提交推理任务，立即返回任务信息"""
+        project = await Project.filter(project_id=project_id).first()
+        if not project:
+            return ResultGenerator.gen_error_result(code=404, message="项目不存在")
         is_file = bool(hypara['is_file'])
         file_name = hypara['file_path'].split('/')[-1]
         if is_file:
@@ -252,9 +262,5 @@ class Project(BaseModel):
         else:
             file_path = hypara['file_path']
         print("file_path ", file_path)
-        try:
-            return await docker.exec_container_log(project_id, command, file_path)
-        except Exception as e:
-            print(f"exec_container_log error: {e}")
-            return ResultGenerator.gen_error_result(code=500, message=f"项目运行失败{e}")
+        return await submit_job(project, command, file_path)
 
@@ -1,14 +1,16 @@
+import asyncio
 import os
-import zipfile
 from pathlib import Path
 from typing import Optional
-from io import BytesIO
 
-from fastapi import APIRouter, UploadFile, Form, File
+from fastapi import APIRouter, UploadFile, Form, File, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 
 import models
+from utils.ArchiveCache import archive_cache
 from utils.ResultGenerator import ResultGenerator
+from utils.Upload import start_progress, get_progress, save_upload, save_stream, extract_zip, UploadRejected
 
 dataset = APIRouter()
 
@@ -41,22 +43,12 @@ async def add_dataset(dataset: Dataset):
 
 
 @dataset.put("/uploadFile")
-async def upload_file(file: UploadFile = File(...), user_id: str = Form(...)):
+async def upload_file(file: UploadFile = File(...), user_id: str = Form(...), upload_id: Optional[str] = Form(None)):
     try:
         # 校验 UserID
         if not user_id:
             return ResultGenerator.gen_fail_result(message="UserID 不能为空")
 
-        # 获取当前数据库中最大的 DatasetId
-        dataset_id = await models.Dataset.find_max_dataset_id()
-        if not dataset_id:
-            return ResultGenerator.gen_fail_result(message="数据库中没有可用的数据集记录")
-
-        # 构建目标路径（使用 DatasetId）
-        project_root = os.getcwd()
-        upload_dir = Path(os.path.join(project_root, "data", "dataset", str(dataset_id)))
-        upload_dir.mkdir(parents=True, exist_ok=True)
-
         # 获取文件名
         original_filename = file.filename
         if not original_filename:
@@ -66,34 +58,76 @@ async def upload_file(file: UploadFile = File(...), user_id: str = Form(...)):
         if not original_filename.endswith(".zip"):
             return ResultGenerator.gen_fail_result(message="只支持 ZIP 格式的文件上传")
 
-        # 构造保存的目标 ZIP 文件（使用原文件名）
-        zip_file_path = upload_dir / original_filename
-        with open(zip_file_path, "wb") as f:
-            f.write(await file.read())
+        progress = start_progress(upload_id, file.size)
+        return await _store_dataset_archive(original_filename, progress, lambda path: save_upload(file, path, progress))
+    except Exception as e:
+        return ResultGenerator.gen_error_result(message=f"文件上传失败：{e}", code=500)
+
+
+@dataset.put("/uploadStream")
+async def upload_stream(request: Request, user_id: str, filename: str, upload_id: Optional[str] = None):
+    """请求体就是 ZIP 文件本身：边接收边写盘，不经过表单解析的临时文件，接收过程中即可查询进度"""
+    if not user_id:
+        return ResultGenerator.gen_fail_result(message="UserID 不能为空")
+    if not filename.endswith(".zip"):
+        return ResultGenerator.gen_fail_result(message="只支持 ZIP 格式的文件上传")
+    length = request.headers.get("content-length")
+    progress = start_progress(upload_id, int(length) if length else None)
+    try:
+        return await _store_dataset_archive(os.path.basename(filename), progress,
+                                            lambda path: save_stream(request.stream(), path, progress))
+    except Exception as e:
+        return ResultGenerator.gen_error_result(message=f"文件上传失败：{e}", code=500)
 
-        # 解压 ZIP 文件
-        unzip_file(zip_file_path, upload_dir)
 
-        # 删除 ZIP 文件
-        if zip_file_path.exists():
-            zip_file_path.unlink()
+@dataset.get("/upload/{upload_id}")
+async def get_upload_progress(upload_id: str):
+    progress = get_progress(upload_id)
+    if progress is None:
+        return ResultGenerator.gen_not_found_result(message="没有该上传记录")
+    return ResultGenerator.gen_success_result(data=progress.to_dict())
+
+
+async def _store_dataset_archive(filename: str, progress, receive):
+    """保存上传的 ZIP 到当前最大 DatasetId 的目录，在线程中按限制解压，然后删除 ZIP 并更新 DataUrl"""
+    # 获取当前数据库中最大的 DatasetId
+    dataset_id = await models.Dataset.find_max_dataset_id()
+    if not dataset_id:
+        progress.finish("数据库中没有可用的数据集记录")
+        return ResultGenerator.gen_fail_result(message="数据库中没有可用的数据集记录")
 
-        # 更新 DataUrl 字段到数据库
-        data_url = str(upload_dir)
-        is_updated = await models.Dataset.update_dataset_url(dataset_id, data_url)
-        if not is_updated:
-            return ResultGenerator.gen_fail_result(message="数据库更新失败，文件路径未能保存")
+    # 构建目标路径（使用 DatasetId）
+    project_root = os.getcwd()
+    upload_dir = Path(os.path.join(project_root, "data", "dataset", str(dataset_id)))
+    upload_dir.mkdir(parents=True, exist_ok=True)
 
-        # 返回成功结果
-        return ResultGenerator.gen_success_result(message="文件上传并解压成功")
+    # 构造保存的目标 ZIP 文件（使用原文件名），按块写盘并计算哈希
+    zip_file_path = upload_dir / filename
+    try:
+        await receive(str(zip_file_path))
+        # 解压 ZIP 文件
+        await asyncio.to_thread(extract_zip, str(zip_file_path), str(upload_dir), progress)
+    except UploadRejected as e:
+        progress.finish(str(e))
+        return ResultGenerator.gen_fail_result(message=f"压缩包不符合要求：{e}")
     except Exception as e:
-        return ResultGenerator.gen_error_result(message="文件上传失败：{e}", code=500)
+        progress.finish(str(e))
+        raise
+    finally:
+        # 删除 ZIP 文件（大文件的删除也可能耗时，放到线程中）
+        if zip_file_path.exists():
+            await asyncio.to_thread(zip_file_path.unlink)
 
+    # 更新 DataUrl 字段到数据库
+    data_url = str(upload_dir)
+    is_updated = await models.Dataset.update_dataset_url(dataset_id, data_url)
+    if not is_updated:
+        progress.finish("数据库更新失败")
+        return ResultGenerator.gen_fail_result(message="数据库更新失败，文件路径未能保存")
 
-def unzip_file(zip_file_path: Path, target_dir: Path):
-    # 解压 ZIP 文件到指定目录
-    with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-        zip_ref.extractall(target_dir)
+    progress.finish()
+    # 返回成功结果
+    return ResultGenerator.gen_success_result(message="文件上传并解压成功", data=progress.to_dict())
 
 
 @dataset.get('/files/{dataset_id}')
@@ -105,19 +139,26 @@ async def get_dataset_files(dataset_id: str):
 
 
 @dataset.get('/download/{dataset_id}')
-async def download_dataset(dataset_id: str):
+async def download_dataset(dataset_id: str, request: Request):
     dictionary_path = os.getcwd()
     dataset_dir = os.path.join(dictionary_path, "data", "dataset", dataset_id)
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # 遍历目录并添加文件到 ZIP
-        for root, dirs, files in os.walk(dataset_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, dataset_dir)
-                zipf.write(file_path, arcname)
-    zip_buffer.seek(0)
-    return ResultGenerator.gen_success_result(data=zip_buffer.getvalue())
+    if not os.path.isdir(dataset_dir):
+        return ResultGenerator.gen_error_result(code=404, message="数据集目录不存在")
+    filename = f"dataset_{dataset_id}.zip"
+    # 目录内容没有变化时直接发送缓存的压缩包（支持 Range 续传），否则边打包边发送
+    path, build = await archive_cache.lookup(f"dataset_{dataset_id}", dataset_dir)
+    if build is not None and request.headers.get("range"):
+        # 续传需要完整的文件，等待正在进行的打包完成
+        path = await build.wait()
+    if path is not None:
+        return FileResponse(path, media_type="application/zip", filename=filename)
+    return StreamingResponse(archive_cache.stream(build), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@dataset.get('/DownloadCache')
+async def get_download_cache_stats():
+    return ResultGenerator.gen_success_result(data=archive_cache.stats())
 
 
 def get_file_tree(directory_path):
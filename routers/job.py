@@ -0,0 +1,35 @@
+from typing import Optional
+
+from fastapi import APIRouter
+
+from models import Job
+from services.job import job_runner
+from utils.ResultGenerator import ResultGenerator
+
+job = APIRouter()
+
+
+@job.get('/')
+async def list_jobs(user_id: Optional[str] = None, project_id: Optional[int] = None, status: Optional[str] = None,
+                    limit: int = 50):
+    jobs = await Job.find_jobs(user_id, project_id, status, min(max(limit, 1), 200))
+    return ResultGenerator.gen_success_result(data=[item.to_dict() for item in jobs])
+
+
+@job.get('/{job_id}')
+async def get_job(job_id: str):
+    item = await Job.find_by_id(job_id)
+    if item is None:
+        return ResultGenerator.gen_error_result(code=404, message="任务不存在")
+    return ResultGenerator.gen_success_result(data=item.to_dict())
+
+
+@job.post('/{job_id}/cancel')
+async def cancel_job(job_id: str):
+    item = await Job.find_by_id(job_id)
+    if item is None:
+        return ResultGenerator.gen_error_result(code=404, message="任务不存在")
+    if not await job_runner.cancel(item):
+        return ResultGenerator.gen_fail_result(message=f"任务已结束，状态为 {item.status}")
+    item = await Job.find_by_id(job_id)
+    return ResultGenerator.gen_success_result(message="任务已取消", data=item.to_dict())
@@ -5,8 +5,9 @@ from langchain_community.chat_models import ChatOpenAI
 from pydantic import BaseModel
 
 from models.model import Model
-from services.model import add_model_service
+from services.model import add_model_service, get_build_status
 from utils.ResultGenerator import ResultGenerator
+from utils.Upload import get_progress
 
 model_service = APIRouter()
 
@@ -35,6 +36,7 @@ async def add_model(
         hypara_path: str = Form(...),
         tag: str = Form(...),
         model_file: UploadFile = File(...),
+        upload_id: Optional[str] = Form(None),
 ):
     """FastAPI 处理模型创建"""
     model_data = {
@@ -50,10 +52,25 @@ async def add_model(
     }
 
     # 调用添加模型服务
-    result = await add_model_service(model_data, model_file)
+    result = await add_model_service(model_data, model_file, upload_id)
     return result
 
 
+@model_service.get('/upload/{upload_id}')
+async def get_model_upload(upload_id: str):
+    """模型压缩包的保存和解压进度"""
+    progress = get_progress(upload_id)
+    if progress is None:
+        return ResultGenerator.gen_not_found_result(message="没有该上传记录")
+    return ResultGenerator.gen_success_result(data=progress.to_dict())
+
+
+@model_service.get('/build/{model_id}')
+async def get_model_build(model_id: int):
+    """模型镜像的构建状态，构建输出通过 /ws 的 model_<id> 频道推送"""
+    return get_build_status(model_id)
+
+
 @model_service.get('/public')
 async def find_all_public_model():
     return ResultGenerator.gen_success_result(data=(await Model.find_all_public()))
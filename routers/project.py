@@ -1,11 +1,15 @@
+import asyncio
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from fastapi import APIRouter
 from pydantic import BaseModel
 
 from models import Project, Model, Dataset
 from utils.DockerFactory import DockerFactory
+from utils.LogArchive import get_archive
+from utils import MetricExtractor
+from utils.PredictCache import predict_cache
 from utils.ResultGenerator import ResultGenerator
 
 project = APIRouter()
@@ -101,8 +105,8 @@ async def get_tree(project_id: int):
 
 @project.post('/stop/{project_id}')
 async def stop_project(project_id: int):
-    docker = DockerFactory.docker_client_pool['tcp://localhost:2375']
     project = await Project.find_by_id(project_id)
+    docker = DockerFactory.for_project(project)
     return await docker.stop_container(project_id, project)
 
 
@@ -124,8 +128,16 @@ async def create_project_docker(project_id: int):
     if not test_dataset:
         return ResultGenerator.gen_error_result(code=404, message="测试集不存在")
 
-    docker = DockerFactory.docker_client_pool['tcp://localhost:2375']
-    # 模拟调用 Docker 容器创建逻辑
+    # 按空闲资源、镜像本地性和容器数量选择主机
+    image_name = f"{model.id}:latest"
+    docker, ticket = await DockerFactory.place_project(project, image_name)
+    if docker is None:
+        return ResultGenerator.gen_fail_result("没有主机能够满足项目的资源需求")
+    if not await docker.search_image(image_name):
+        # 选中的主机上还没有该模型的镜像，先在该主机上构建
+        await docker.image_creator(str(model.id), model.model_path)
+    if docker.engine.base_url != project.docker_host:
+        await Project.update_docker_host_by_id(project.project_id, docker.engine.base_url)
     result = await docker.container_creator(
         str(model.id),
         project.project_id,
@@ -136,12 +148,49 @@ async def create_project_docker(project_id: int):
         project.store_path,
         train_dataset.data_url,
         test_dataset.data_url,
-        project
+        project,
+        ticket=ticket
     )
     print(f"create Docker result: {result}")
     return result
 
 
+@project.get('/Docker/pool')
+async def get_warm_pool_stats():
+    return ResultGenerator.gen_success_result(data={
+        host: docker.warm_pool.stats() for host, docker in DockerFactory.docker_client_pool.items()
+    })
+
+
+@project.get('/Docker/hosts')
+async def get_docker_hosts():
+    return ResultGenerator.gen_success_result(data={
+        "scheduler": DockerFactory.scheduler.stats(),
+        "ledgers": {host: docker.ledger.stats() for host, docker in DockerFactory.docker_client_pool.items()},
+    })
+
+
+@project.get('/Docker/idle')
+async def get_idle_reaper_stats():
+    return ResultGenerator.gen_success_result(data={
+        host: docker.reaper.stats() for host, docker in DockerFactory.docker_client_pool.items()
+    })
+
+
+@project.get('/Docker/resources')
+async def get_host_resources(points: int = 120):
+    data = {}
+    for host, docker in DockerFactory.docker_client_pool.items():
+        data[host] = await asyncio.to_thread(docker.resources.host_series, points)
+        data[host]["collector"] = docker.resources.stats()
+    return ResultGenerator.gen_success_result(data=data)
+
+
+@project.get('/PredictCache')
+async def get_predict_cache_stats(project_id: Optional[int] = None):
+    return ResultGenerator.gen_success_result(data=predict_cache.stats(project_id))
+
+
 @project.put('/')
 async def add_project(request: ProjectCreateRequest):
     project_dict = {
@@ -163,6 +212,47 @@ async def add_project(request: ProjectCreateRequest):
     return ResultGenerator.gen_success_result(message="创建项目成功", data=project)
 
 
+@project.get('/{project_id}/logs')
+async def get_project_logs(project_id: int, from_line: int = 0, limit: int = 100):
+    archive = await get_archive(project_id)
+    lines = await asyncio.to_thread(archive.read_lines, from_line, limit)
+    total = await asyncio.to_thread(archive.line_count)
+    return ResultGenerator.gen_success_result(data={
+        "from_line": from_line,
+        "next_line": from_line + len(lines),
+        "total": total,
+        "lines": lines,
+    })
+
+
+@project.get('/{project_id}/metrics/runs')
+async def get_project_metric_runs(project_id: int):
+    return ResultGenerator.gen_success_result(data=MetricExtractor.list_runs(project_id))
+
+
+@project.get('/{project_id}/metrics')
+async def get_project_metrics(project_id: int, run_id: Optional[int] = None, points: int = 500,
+                              names: Optional[str] = None):
+    run = MetricExtractor.find_run(project_id, run_id)
+    if run is None:
+        return ResultGenerator.gen_error_result(code=404, message="没有找到训练指标")
+    snapshot = run.snapshot(names.split(",") if names else None)
+    series = await asyncio.to_thread(MetricExtractor.downsample, snapshot, points)
+    return ResultGenerator.gen_success_result(data={"run_id": run.run_id, "series": series})
+
+
+@project.get('/{project_id}/resources')
+async def get_project_resources(project_id: int, points: int = 120):
+    project = await Project.get_or_none(project_id=project_id)
+    docker = DockerFactory.for_project(project) if project is not None else None
+    if docker is None:
+        return ResultGenerator.gen_error_result(code=404, message="项目不存在")
+    series = await asyncio.to_thread(docker.resources.project_series, project_id, points)
+    if series is None:
+        return ResultGenerator.gen_error_result(code=404, message="没有找到项目容器的资源使用数据")
+    return ResultGenerator.gen_success_result(data=series)
+
+
 @project.get('/{project_id}')
 async def get_project(project_id: str):
     project = await Project.get(project_id=project_id)
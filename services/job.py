@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import socket
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, Set
+
+from models.job import Job, JOB_RUNNING, JOB_CANCELLING, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED, \
+    JOB_INTERRUPTED, JOB_QUEUED
+from utils.PredictCache import predict_cache
+from utils.ResultGenerator import ResultGenerator
+from utils.WebSocketConfig import broadcast_to_project
+
+# 所有进程合计同时执行的训练任务数，以及每个用户同时执行的训练任务数
+GLOBAL_JOB_LIMIT = int(os.environ.get("JOB_GLOBAL_LIMIT", "8"))
+USER_JOB_LIMIT = int(os.environ.get("JOB_USER_LIMIT", "2"))
+# 推理任务单独计数：所有进程合计的上限，以及同一项目的并发数；
+# 同一项目的并发推理由容器合并成批执行，训练任务仍独占项目；
+# 只支持 stdin 的旧版容器同一时间只执行一个推理，不同 worker 写入的命令和输出会交错
+GLOBAL_PREDICT_LIMIT = int(os.environ.get("JOB_GLOBAL_PREDICT_LIMIT", "64"))
+PROJECT_PREDICT_LIMIT = int(os.environ.get("JOB_PROJECT_PREDICT_LIMIT", "16"))
+# 没有新任务通知时轮询数据库的间隔（秒），用于领取其他进程提交的任务
+POLL_INTERVAL = 5
+# 单次调度最多查看的排队任务数
+SCAN_LIMIT = 200
+# 心跳间隔（秒），同时检查本进程的任务是否被请求取消；心跳超时的任务视为中断
+HEARTBEAT_INTERVAL = 5
+STALE_AFTER = 60
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+async def publish_job(job: Job):
+    """通过项目的 /ws 频道推送任务状态"""
+    try:
+        await broadcast_to_project(job.project_id, json.dumps(job.to_dict(), ensure_ascii=False), "job")
+    except Exception as e:
+        print(f"[Job] 推送任务状态失败: {e}")
+
+
+async def _execute(job: Job) -> dict:
+    from models import Project
+    from utils.DockerFactory import DockerFactory
+    project = await Project.find_by_id(job.project_id)
+    docker = DockerFactory.for_project(project)
+    return await docker.exec_container_log(job.project_id, job.command, json.loads(job.payload))
+
+
+async def _serial_projects(project_ids: Iterable[int]) -> Set[int]:
+    """项目容器不支持分帧协议（或无法确定）的项目"""
+    from models import Project
+    from utils.DockerFactory import DockerFactory
+    project_ids = set(project_ids)
+    if not project_ids:
+        return set()
+    concurrent = set()
+    for project in await Project.filter(project_id__in=project_ids):
+        docker = DockerFactory.for_project(project)
+        if docker is not None and docker.supports_concurrent_predict(project.project_id):
+            concurrent.add(project.project_id)
+    return project_ids - concurrent
+
+
+async def _reset_container(project_id: int):
+    """中断正在执行的命令：重启项目容器，容器回到等待命令的状态"""
+    from models import Project
+    from utils.DockerFactory import DockerFactory
+    project = await Project.find_by_id(project_id)
+    docker = DockerFactory.for_project(project)
+    container = await docker.engine.find_container(f"project_{project_id}")
+    if container is not None:
+        docker.close_channel(f"project_{project_id}")
+        await docker.engine.restart(container)
+        await predict_cache.expire(project_id)
+    await Project.update_project_status_by_id(project_id, "wait")
+
+
+class JobRunner:
+    """
+    后台任务执行器：任务持久化在 job 表中，每个进程按全局、每用户、每项目的并发限制
+    领取排队任务并执行，状态变化通过 /ws 推送；判断限制和领取在跨进程的调度锁内完成，多个进程合计也不超限
+    """
+
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._loops = []
+
+    async def start(self):
+        for job in await Job.interrupt_stale(STALE_AFTER):
+            job.status = JOB_INTERRUPTED
+            await publish_job(job)
+        self._loops = [asyncio.create_task(self._dispatch_loop()), asyncio.create_task(self._heartbeat_loop())]
+
+    async def stop(self):
+        for task in self._loops:
+            task.cancel()
+        # 服务关闭时中断本进程正在执行的任务，不等待心跳超时
+        tasks = dict(self.tasks)
+        self.tasks.clear()
+        for job_id, task in tasks.items():
+            task.cancel()
+            try:
+                await Job.finish(job_id, JOB_INTERRUPTED, WORKER_ID, error="服务关闭")
+            except Exception as e:
+                # 数据库连接可能已关闭，下次启动时按心跳超时标记为中断
+                print(f"[Job] 标记任务 {job_id} 中断失败: {e}")
+
+    def notify(self):
+        self._wakeup.set()
+
+    # ---------- 调度 ----------
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._dispatch()
+            except Exception as e:
+                print(f"[Job] 调度失败: {e}")
+
+    async def _dispatch(self):
+        claimed = []
+        async with Job.dispatch_lock() as conn:
+            running = await Job.find_running(conn)
+            predicts = sum(job.command == "predict" for job in running)
+            slots = {True: GLOBAL_PREDICT_LIMIT - predicts, False: GLOBAL_JOB_LIMIT - (len(running) - predicts)}
+            if slots[True] <= 0 and slots[False] <= 0:
+                return
+            per_user = Counter(job.user_id for job in running if job.command != "predict")
+            per_project = Counter(job.project_id for job in running)
+            training = {job.project_id for job in running if job.command != "predict"}
+            queued = await Job.find_queued(SCAN_LIMIT, conn)
+            serial = await _serial_projects(job.project_id for job in queued if job.command == "predict")
+            for job in queued:
+                if slots[True] <= 0 and slots[False] <= 0:
+                    break
+                is_predict = job.command == "predict"
+                if slots[is_predict] <= 0 or not self._project_available(job, per_project, training, serial):
+                    continue
+                if not is_predict and per_user[job.user_id] >= USER_JOB_LIMIT:
+                    continue
+                if not await Job.claim(job.job_id, WORKER_ID, conn):
+                    continue  # 已被取消
+                slots[is_predict] -= 1
+                per_project[job.project_id] += 1
+                if not is_predict:
+                    per_user[job.user_id] += 1
+                    training.add(job.project_id)
+                job.status = JOB_RUNNING
+                claimed.append(job)
+        # 事务提交后才开始执行，任务的状态更新不会早于领取生效
+        for job in claimed:
+            self.tasks[job.job_id] = asyncio.create_task(self._run(job))
+
+    @staticmethod
+    def _project_available(job: Job, per_project: Counter, training: set, serial: set) -> bool:
+        """
+        训练任务独占项目；推理任务在没有训练时最多并发 PROJECT_PREDICT_LIMIT 个，
+        旧版 stdin 容器（serial）只执行一个
+        """
+        if job.project_id in training:
+            return False
+        if job.command != "predict":
+            return per_project[job.project_id] == 0
+        return per_project[job.project_id] < (1 if job.project_id in serial else PROJECT_PREDICT_LIMIT)
+
+    async def _run(self, job: Job):
+        await publish_job(job)
+        try:
+            result = await _execute(job)
+            succeeded = result.get("resultCode") == ResultGenerator.RESULT_CODE_SUCCESS
+            if not await Job.finish(job.job_id, JOB_SUCCEEDED if succeeded else JOB_FAILED, WORKER_ID,
+                                    result=result, error=None if succeeded else result.get("message")):
+                print(f"[Job] 任务 {job.job_id} 已被标记为中断，不再记录执行结果")
+        except asyncio.CancelledError:
+            if job.job_id in self.tasks:
+                await Job.finish(job.job_id, JOB_CANCELLED, WORKER_ID)
+            raise
+        except Exception as e:
+            print(f"[Job] 任务 {job.job_id} 执行失败: {e}")
+            await Job.finish(job.job_id, JOB_FAILED, WORKER_ID, error=str(e))
+        finally:
+            self.tasks.pop(job.job_id, None)
+            self.notify()
+            try:
+                finished = await Job.find_by_id(job.job_id)
+                if finished is not None:
+                    await publish_job(finished)
+            except Exception as e:
+                print(f"[Job] 读取任务 {job.job_id} 状态失败: {e}")
+
+    # ---------- 取消 ----------
+
+    async def cancel(self, job: Job) -> bool:
+        """取消排队中的任务；运行中的任务由执行它的进程中断并重启项目容器"""
+        if job.status == JOB_QUEUED:
+            if await Job.cancel_queued(job.job_id):
+                job.status = JOB_CANCELLED
+                await publish_job(job)
+                return True
+            job = await Job.find_by_id(job.job_id)
+        if job.status == JOB_RUNNING and await Job.request_cancel(job.job_id):
+            if job.job_id in self.tasks:
+                await self._interrupt(job.job_id, job.project_id)
+            return True
+        return job.status == JOB_CANCELLING
+
+    async def _interrupt(self, job_id: str, project_id: int):
+        task = self.tasks.get(job_id)
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        try:
+            await _reset_container(project_id)
+        except Exception as e:
+            print(f"[Job] 重启项目 {project_id} 的容器失败: {e}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                if self.tasks:
+                    await Job.heartbeat(WORKER_ID)
+                    for job in await Job.find_running():
+                        if job.worker == WORKER_ID and job.status == JOB_CANCELLING:
+                            await self._interrupt(job.job_id, job.project_id)
+                await Job.interrupt_stale(STALE_AFTER)
+            except Exception as e:
+                print(f"[Job] 心跳失败: {e}")
+
+
+job_runner = JobRunner()
+
+
+async def submit_job(project, command: str, payload) -> dict:
+    """提交任务并立即返回；同一项目已有排队或运行中的训练时直接返回该任务，避免重复训练"""
+    if command == "train":
+        existing = await Job.find_active(project.project_id, command)
+        if existing is not None:
+            return ResultGenerator.gen_success_result(message="项目已有进行中的训练任务", data=existing.to_dict())
+    job = await Job.add_job(project.project_id, project.user_id, command, payload)
+    await publish_job(job)
+    job_runner.notify()
+    return ResultGenerator.gen_success_result(message="任务已提交", data=job.to_dict())
@@ -1,30 +1,30 @@
+import asyncio
 import json
 import os
-import shutil
-import zipfile
 from pathlib import Path
+from typing import Optional
 
 import docker
 from fastapi import UploadFile
 
 from models import Model
+from utils.BlobStore import blob_store
 from utils.DockerFactory import DockerFactory
 from utils.ResultGenerator import ResultGenerator
+from utils.Upload import start_progress, save_upload, extract_zip
 
 docker_factory = DockerFactory()
-
-
-def unzip(zip_path: str, extract_to: str):
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
+# 后台镜像构建任务，保持引用避免被回收
+build_tasks = set()
 
 
 def delete_directory(directory_path: str):
     if os.path.exists(directory_path):
-        shutil.rmtree(directory_path)
+        # 同时删除不再被其他模型或项目引用的文件内容
+        blob_store.remove_tree(directory_path)
 
 
-async def add_model_service(model_dict: dict, model_file: UploadFile):
+async def add_model_service(model_dict: dict, model_file: UploadFile, upload_id: Optional[str] = None):
     global upload_path
     print(model_dict)
     if not model_dict.get("user_id"):
@@ -59,14 +59,20 @@ async def add_model_service(model_dict: dict, model_file: UploadFile):
         # 保证要找的目录存在
         upload_path.mkdir(parents=True, exist_ok=True)
 
-        # 保存 zip 文件
+        # 按块保存 zip 文件并计算哈希，在线程中按限制解压，进度可通过 upload_id 查询
+        progress = start_progress(upload_id, model_file.size)
         zip_file_path = upload_path / model_file.filename
-        with open(zip_file_path, "wb") as buffer:
-            shutil.copyfileobj(model_file.file, buffer)
-        # 解压文件
-        unzip(str(zip_file_path), str(upload_path))
-        # 删除 zip 文件
-        os.remove(zip_file_path)
+        try:
+            await save_upload(model_file, str(zip_file_path), progress)
+            await asyncio.to_thread(extract_zip, str(zip_file_path), str(upload_path), progress)
+        except Exception as e:
+            progress.finish(str(e))
+            raise
+        finally:
+            # 删除 zip 文件
+            if zip_file_path.exists():
+                await asyncio.to_thread(os.remove, zip_file_path)
+        progress.finish()
 
         await model.update_model_path(str(upload_path))
 
@@ -76,35 +82,55 @@ async def add_model_service(model_dict: dict, model_file: UploadFile):
 
         if not dockerfile_path.exists():
             await Model.delete_model(model_id)
-            delete_directory(str(upload_path))
+            await asyncio.to_thread(delete_directory, str(upload_path))
             return ResultGenerator.gen_fail_result(message="Dockerfile not found")
 
+        # 模型文件放入去重存储，与已有模型相同的文件（例如数据集压缩包）只保留一份
+        await asyncio.to_thread(blob_store.ingest_tree, str(upload_path))
+
         print(docker_factory.docker_client_pool)
-        docker_core = docker_factory.docker_client_pool.get("tcp://localhost:2375")
+        docker_core = DockerFactory.get_docker_core()
         if not docker_core:
             await Model.delete_model(model_id)
-            delete_directory(str(upload_path))
+            await asyncio.to_thread(delete_directory, str(upload_path))
             return ResultGenerator.gen_fail_result(message="未找到对应主机的 DockerCore 实例")
 
-        # 使用 Docker 客户端构建镜像
-        try:
-            # 假设 create_docker_image 是一个同步操作
-            print('start build')
-            result = docker_core.image_creator(str(model_id), str(dockerfile_dir))
-            if not result:
-                return ResultGenerator.gen_fail_result(message="创建镜像失败")
-        except Exception as e:
-            await Model.delete_model(model_id)
-            delete_directory(str(upload_path))
-            return ResultGenerator.gen_fail_result(message=f"创建镜像失败{e}")
+        # 镜像在后台构建，上传请求立即返回，构建进度推送到 model_<id> 频道
+        channel = f"model_{model_id}"
+        task = asyncio.create_task(_build_model_image(docker_core, model_id, str(dockerfile_dir),
+                                                          str(upload_path), channel))
+        build_tasks.add(task)
+        task.add_done_callback(build_tasks.discard)
     except Exception as e:
         await Model.delete_model(model_id)
         if os.path.exists(str(upload_path)):
-            delete_directory(str(upload_path))
+            await asyncio.to_thread(delete_directory, str(upload_path))
         return ResultGenerator.gen_fail_result(message=f"File upload or processing failed: {str(e)}")
 
     await Model.add_tag_to_model(model_dict['model_id'], model_dict['tag'])
-    return ResultGenerator.gen_success_result(message='模型上传成功')
+    return ResultGenerator.gen_success_result(message='模型上传成功，镜像正在构建',
+                                              data={"model_id": model_id, "channel": channel,
+                                                    "upload": progress.to_dict()})
+
+
+async def _build_model_image(docker_core, model_id: int, dockerfile_dir: str, upload_dir: str, channel: str):
+    """后台构建模型镜像，失败时删除模型和上传的文件"""
+    result = await docker_core.image_creator(str(model_id), dockerfile_dir, channel=channel)
+    if result["resultCode"] != ResultGenerator.RESULT_CODE_SUCCESS:
+        await Model.delete_model(model_id)
+        await asyncio.to_thread(delete_directory, upload_dir)
+
+
+def get_build_status(model_id: int):
+    """模型镜像在各主机上的构建状态"""
+    builds = {}
+    for host, docker_core in DockerFactory.docker_client_pool.items():
+        record = docker_core.builder.find(str(model_id))
+        if record is not None:
+            builds[host] = record.to_dict()
+    if not builds:
+        return ResultGenerator.gen_not_found_result(message="没有该模型的镜像构建记录")
+    return ResultGenerator.gen_success_result(data=builds)
 
 
 async def get_hypara_by_model_service(model_id: int):
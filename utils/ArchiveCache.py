@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# 打包好的压缩包缓存目录和总大小上限
+CACHE_DIR = os.path.join("data", "cache", "archives")
+CACHE_BYTES = int(os.environ.get("ARCHIVE_CACHE_BYTES", str(10 * 1024 ** 3)))
+# 已经压缩过的格式直接存储（ZIP_STORED），再压缩一遍只浪费 CPU
+STORED_SUFFIXES = {".gz", ".tgz", ".zip", ".bz2", ".xz", ".7z", ".png", ".jpg", ".jpeg", ".gif", ".webp",
+                   ".mp3", ".mp4", ".npz"}
+# 其余文件的压缩级别：级别 1 的速度约是默认级别 6 的 7 倍，压缩率相差不到一成，边打包边下载时不会成为瓶颈
+COMPRESS_LEVEL = int(os.environ.get("ARCHIVE_COMPRESS_LEVEL", "1"))
+# 读写时每次处理的字节数
+CHUNK_SIZE = 1024 * 1024
+# 打包规则变化时修改，旧的缓存随之失效
+ARCHIVE_FORMAT = 1
+# 超过这个时间（秒）仍未完成的临时文件视为进程退出后遗留的，淘汰时删除
+STALE_PART_SECONDS = 24 * 3600
+
+
+def scan_manifest(directory: str) -> Tuple[str, List[Tuple[str, str, int]]]:
+    """列出目录中的文件 (相对路径, 绝对路径, 大小)，按相对路径、大小和 mtime 计算清单哈希"""
+    digest = hashlib.sha256(f"format:{ARCHIVE_FORMAT}:{COMPRESS_LEVEL}\n".encode())
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            arcname = os.path.relpath(path, directory).replace(os.sep, "/")
+            entries.append((arcname, path, stat.st_size))
+            digest.update(f"{arcname}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest(), entries
+
+
+class _AppendOnly:
+    """
+    只支持追加写入的文件包装：zipfile 无法 seek 时改用数据描述符，不会回头改写已经写出的头部，
+    已经写出的字节可以立即发给客户端
+    """
+
+    def __init__(self, build: "ArchiveBuild", f):
+        self.build = build
+        self.f = f
+
+    def write(self, data) -> int:
+        written = self.f.write(data)
+        self.build.advance(written)
+        return written
+
+    def flush(self):
+        pass
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ArchiveBuild:
+    """
+    一次正在进行的打包：后台线程写入临时文件，下载请求跟随已写出的部分读取。
+    下载请求在事件循环中等待进度，打包线程通过 call_soon_threadsafe 唤醒，不占用线程池的线程
+    """
+
+    def __init__(self, key: str, path: str, entries: List[Tuple[str, str, int]]):
+        self.key = key
+        self.path = path
+        # 每次打包使用独立的临时文件，多个 worker 同时打包同一清单时互不覆盖，完成后原子替换
+        self.part_path: Optional[str] = None
+        self.entries = entries
+        self.written = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _wake(self):
+        """调用方持有 self._lock"""
+        waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # 等待方的事件循环已经关闭
+                pass
+
+    def advance(self, count: int):
+        with self._lock:
+            self.written += count
+            self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self.done = True
+            self.error = error
+            self._wake()
+
+    async def _until(self, ready: Callable[[], bool]):
+        """等到 ready() 为真；在锁内检查并登记，不会漏掉两次检查之间的唤醒"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if ready():
+                    return
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            await future
+
+    def run(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            fd, part_path = tempfile.mkstemp(prefix=f"{self.key}_", suffix=".part", dir=directory)
+        except BaseException as e:
+            self.finish(e)
+            return
+        with self._lock:
+            self.part_path = part_path
+        try:
+            with open(fd, "wb", buffering=0) as f:
+                with zipfile.ZipFile(_AppendOnly(self, f), "w", strict_timestamps=False) as archive:
+                    for arcname, path, _ in self.entries:
+                        suffix = os.path.splitext(arcname)[1].lower()
+                        compress_type = zipfile.ZIP_STORED if suffix in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+                        archive.write(path, arcname, compress_type=compress_type, compresslevel=COMPRESS_LEVEL)
+            # mkstemp 创建的文件只有属主可读，改成与普通文件一致的权限
+            os.chmod(part_path, 0o644)
+            os.replace(part_path, self.path)
+            self.finish()
+        except BaseException as e:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            self.finish(e)
+
+    async def open(self) -> int:
+        """打包线程写出第一段数据后打开临时文件；已经完成并改名时打开缓存文件"""
+        await self._until(lambda: self.written > 0 or self.done)
+        if self.part_path is None:
+            return os.open(await self.wait(), os.O_RDONLY)
+        try:
+            return os.open(self.part_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return os.open(await self.wait(), os.O_RDONLY)
+
+    async def read_at(self, fd: int, offset: int) -> bytes:
+        """等到 offset 之后有数据或打包结束，返回下一段数据；返回空字节表示已经读完"""
+        await self._until(lambda: self.written > offset or self.done)
+        if self.error is not None:
+            raise RuntimeError(f"打包失败: {self.error}")
+        available = self.written - offset
+        if available <= 0:
+            return b""
+        # 数据已经写出，读取不会等待打包；每个下载请求有自己的描述符，按顺序读取
+        return await asyncio.to_thread(os.read, fd, min(available, CHUNK_SIZE))
+
+    async def wait(self) -> str:
+        """等待打包完成，返回缓存文件路径"""
+        await self._until(lambda: self.done)
+        if self.error is not None:
+            raise RuntimeError(f"打包失败: {self.error}")
+        return self.path
+
+
+class ArchiveCache:
+    """
+    目录的 ZIP 打包缓存：按目录清单（路径、大小、mtime）的哈希命名，内容不变时直接返回缓存文件，
+    可以按 Range 续传；没有缓存时在后台线程中逐个条目打包，下载请求边打包边发送，
+    同一清单的并发请求共享一次打包，客户端断开也不影响缓存的生成
+    """
+
+    def __init__(self, directory: Optional[str] = None, capacity: int = CACHE_BYTES):
+        self.directory = os.path.abspath(directory or os.path.join(os.getcwd(), CACHE_DIR))
+        self.capacity = capacity
+        self.builds: Dict[str, ArchiveBuild] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def _lookup(self, key: str, source_dir: str) -> Tuple[Optional[str], Optional[ArchiveBuild]]:
+        digest, entries = scan_manifest(source_dir)
+        path = os.path.join(self.directory, f"{key}_{digest[:32]}.zip")
+        with self._lock:
+            build = self.builds.get(path)
+            if build is None and os.path.exists(path):
+                self.hits += 1
+                # 用 mtime 记录最近一次使用，淘汰时先删最久未用的
+                os.utime(path)
+                return path, None
+            if build is None:
+                self.misses += 1
+                build = self.builds[path] = ArchiveBuild(key, path, entries)
+                threading.Thread(target=self._build, args=(build,), daemon=True, name=f"archive-{key}").start()
+        return None, build
+
+    async def lookup(self, key: str, source_dir: str) -> Tuple[Optional[str], Optional[ArchiveBuild]]:
+        """返回 (缓存文件路径, None) 或 (None, 正在进行的打包)"""
+        return await asyncio.to_thread(self._lookup, key, source_dir)
+
+    def _build(self, build: ArchiveBuild):
+        """打包线程入口：失败原因记录在 build.error 中，由等待这次打包的下载请求抛出，这里只做统计"""
+        build.run()
+        with self._lock:
+            self.builds.pop(build.path, None)
+        stage, error = "打包", build.error
+        if error is None:
+            try:
+                self._evict(build)
+            except OSError as e:
+                # 其他 worker 可能同时在淘汰同一批文件；缓存文件本身已经生成，不影响下载
+                stage, error = "淘汰旧缓存", e
+        if error is not None:
+            with self._lock:
+                self.failures += 1
+                self.last_error = f"{stage} {build.key}: {error}"
+            print(f"[ArchiveCache] {stage} {build.key} 失败: {error}")
+
+    def _evict(self, latest: ArchiveBuild):
+        """删除同一目录的旧版本，再按最近使用时间淘汰到容量以内"""
+        files = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(".part"):
+                    if now - entry.stat().st_mtime > STALE_PART_SECONDS:
+                        os.remove(entry.path)
+                    continue
+                if not entry.name.endswith(".zip") or entry.path == latest.path:
+                    continue
+                if entry.name.startswith(f"{latest.key}_"):
+                    os.remove(entry.path)
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = os.path.getsize(latest.path) + sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.capacity:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    @staticmethod
+    async def stream(build: ArchiveBuild) -> AsyncIterator[bytes]:
+        """跟随正在写入的临时文件读取；打包完成后文件被重命名，已经打开的描述符不受影响"""
+        fd = await build.open()
+        offset = 0
+        try:
+            while True:
+                chunk = await build.read_at(fd, offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+        finally:
+            os.close(fd)
+
+    def stats(self) -> dict:
+        files = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".zip")] \
+            if os.path.isdir(self.directory) else []
+        return {
+            "archives": len(files),
+            "bytes": sum(entry.stat().st_size for entry in files),
+            "capacity": self.capacity,
+            "building": len(self.builds),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+archive_cache = ArchiveCache()
@@ -0,0 +1,179 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import docker
+
+# 每个 Docker 主机的线程数，同时也是 HTTP 连接池大小
+DEFAULT_MAX_WORKERS = 16
+# HTTP 请求的读写超时（秒），防止守护进程无响应时线程被永久占用
+HTTP_TIMEOUT = 120
+# 各类操作的超时时间（秒）
+OPERATION_TIMEOUTS: Dict[str, float] = {
+    "list": 15,
+    "get": 10,
+    "create": 60,
+    "start": 30,
+    "stop": 60,
+    "restart": 60,
+    "remove": 30,
+    "rename": 10,
+    "pause": 10,
+    "unpause": 10,
+    "reload": 10,
+    "update": 10,
+    "stats": 10,
+    "info": 10,
+    "images": 30,
+    "tag": 10,
+    "build": 3600,
+}
+# 各类操作的并发上限，未列出的只受线程池大小限制
+OPERATION_CONCURRENCY: Dict[str, int] = {
+    "build": 2,
+    "create": 8,
+}
+
+
+class DockerOperationTimeout(TimeoutError):
+    def __init__(self, host: str, operation: str, timeout: float):
+        super().__init__(f"Docker 操作超时: {operation} ({host}, {timeout}s)")
+        self.operation = operation
+
+
+class AsyncDockerEngine:
+    """
+    docker SDK 的异步适配层：所有阻塞调用在每个主机独立的有界线程池中执行，
+    按操作类型限制并发并设置超时，事件循环中只 await 结果
+    """
+
+    def __init__(self, base_url: str, max_workers: int = DEFAULT_MAX_WORKERS, http_timeout: int = HTTP_TIMEOUT):
+        self.base_url = base_url
+        # 连接池大小与线程数一致，避免线程在等待连接时阻塞
+        self.client = docker.DockerClient(base_url=base_url, timeout=http_timeout, max_pool_size=max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"docker-{base_url}")
+        self._limits: Dict[str, asyncio.Semaphore] = {
+            operation: asyncio.Semaphore(limit) for operation, limit in OPERATION_CONCURRENCY.items()
+        }
+        self.calls: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+
+    async def run(self, operation: str, func, *args, **kwargs):
+        """在线程池中执行一个阻塞的 docker SDK 调用"""
+        timeout = OPERATION_TIMEOUTS.get(operation, HTTP_TIMEOUT)
+        limit = self._limits.get(operation)
+        loop = asyncio.get_running_loop()
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if limit is not None:
+            await limit.acquire()
+        try:
+            future = loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts[operation] = self.timeouts.get(operation, 0) + 1
+            raise DockerOperationTimeout(self.base_url, operation, timeout)
+        finally:
+            if limit is not None:
+                limit.release()
+
+    # ---------- 容器 ----------
+
+    async def list_containers(self, **filters) -> List:
+        return await self.run("list", self.client.containers.list, **filters)
+
+    async def get_container(self, name_or_id: str):
+        return await self.run("get", self.client.containers.get, name_or_id)
+
+    async def find_container(self, name_or_id: str):
+        """与 get_container 相同，但容器不存在时返回 None"""
+        try:
+            return await self.get_container(name_or_id)
+        except docker.errors.NotFound:
+            return None
+
+    async def create_container(self, **kwargs):
+        return await self.run("create", self.client.containers.create, **kwargs)
+
+    async def start(self, container):
+        await self.run("start", container.start)
+
+    async def stop(self, container, timeout: Optional[int] = None):
+        if timeout is None:
+            await self.run("stop", container.stop)
+        else:
+            await self.run("stop", container.stop, timeout=timeout)
+
+    async def restart(self, container):
+        await self.run("restart", container.restart)
+
+    async def remove(self, container, force: bool = False):
+        await self.run("remove", container.remove, force=force)
+
+    async def rename(self, container, name: str):
+        await self.run("rename", container.rename, name)
+
+    async def pause(self, container):
+        await self.run("pause", container.pause)
+
+    async def unpause(self, container):
+        await self.run("unpause", container.unpause)
+
+    async def reload(self, container):
+        await self.run("reload", container.reload)
+
+    async def container_stats(self, container) -> dict:
+        """读取一次容器的资源使用（docker stats 的单次快照）"""
+        return await self.run("stats", container.stats, stream=False)
+
+    async def limit_cpu(self, container, cpu: float, period: int = 100000):
+        """通过 CFS 配额把容器限制在 cpu 个核以内"""
+        await self.run("update", container.update, cpu_period=period, cpu_quota=int(cpu * period))
+
+    # ---------- 镜像 ----------
+
+    async def list_images(self, **filters) -> List:
+        return await self.run("images", self.client.images.list, **filters)
+
+    async def find_image(self, name: str):
+        """按名称或 ID 获取镜像，不存在时返回 None"""
+        try:
+            return await self.run("images", self.client.images.get, name)
+        except docker.errors.ImageNotFound:
+            return None
+
+    async def tag_image(self, image, repository: str, tag: str = "latest"):
+        await self.run("tag", image.tag, repository, tag)
+
+    async def build_image(self, path: str, tag: str, **kwargs):
+        """构建镜像，返回 (镜像, 构建日志)"""
+        return await self.run("build", self.client.images.build, path=path, tag=tag, **kwargs)
+
+    async def build_stream(self, path: str, tag: str, on_output=None, **kwargs) -> Optional[str]:
+        """
+        构建镜像并逐条读取构建输出，on_output 在线程池中被调用；
+        返回镜像 ID，构建出错时抛出 BuildError
+        """
+        def build():
+            image_id = None
+            output = []
+            for chunk in self.client.api.build(path=path, tag=tag, decode=True, rm=True, **kwargs):
+                output.append(chunk)
+                if "error" in chunk:
+                    raise docker.errors.BuildError(chunk["error"].strip(), output)
+                if "ID" in (chunk.get("aux") or {}):
+                    image_id = chunk["aux"]["ID"]
+                if on_output is not None:
+                    on_output(chunk)
+            return image_id
+
+        return await self.run("build", build)
+
+    async def info(self) -> dict:
+        return await self.run("info", self.client.info)
+
+    def stats(self) -> dict:
+        return {"host": self.base_url, "calls": dict(self.calls), "timeouts": dict(self.timeouts)}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.client.close()
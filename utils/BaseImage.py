@@ -0,0 +1,142 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from typing import List, Optional
+
+# 共享依赖镜像的仓库名，标签为依赖内容的哈希
+BASE_REPOSITORY = "aiforge-base"
+# 依赖安装之前允许出现的指令，其中只有 WORKDIR 会带入基础镜像
+PRE_INSTALL_INSTRUCTIONS = {"WORKDIR", "COPY", "ADD", "LABEL", "EXPOSE"}
+# 依赖安装之后允许出现的指令，全部留在模型层
+OVERLAY_INSTRUCTIONS = {"WORKDIR", "COPY", "ADD", "LABEL", "EXPOSE", "ENV", "CMD", "ENTRYPOINT", "USER", "VOLUME"}
+PIP_INSTALL = re.compile(r"^RUN\s+(python3?\s+-m\s+)?pip3?\s+install\s+(.*\s)?-r\s+(\./)?requirements\.txt\s*$",
+                         re.IGNORECASE)
+REQUIREMENT = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$")
+
+
+def read_text(path: str) -> str:
+    """读取文本文件，模板中的 requirements.txt 由 pip freeze 在 Windows 下生成，是带 BOM 的 UTF-16"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16")
+    return data.decode("utf-8-sig")
+
+
+def normalize_requirements(text: str) -> Optional[List[str]]:
+    """
+    规范化依赖列表：去掉注释和空行，包名按 PEP 503 规范化，去重排序；
+    包含 -r、-e、--index-url、本地路径或 URL 等依赖构建上下文的行时返回 None
+    """
+    requirements = set()
+    for raw in text.splitlines():
+        line = raw.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith(("-", ".")) or "/" in line or "\\" in line:
+            return None
+        match = REQUIREMENT.match(line)
+        if match is None:
+            return None
+        name = re.sub(r"[-_.]+", "-", match.group(1)).lower()
+        requirements.add(name + re.sub(r"\s+", "", match.group(2)))
+    return sorted(requirements)
+
+
+def _instructions(dockerfile: str) -> List[str]:
+    """Dockerfile 的指令列表，续行合并为一行，去掉注释和空行"""
+    instructions, current = [], ""
+    for raw in dockerfile.splitlines():
+        line = raw.strip()
+        if not current and (not line or line.startswith("#")):
+            continue
+        if line.endswith("\\"):
+            current += line[:-1].strip() + " "
+            continue
+        instructions.append(current + line)
+        current = ""
+    if current:
+        instructions.append(current.strip())
+    return instructions
+
+
+class LayeredBuild:
+    """模型镜像拆分为按依赖共享的基础镜像和只复制源码的模型层"""
+
+    def __init__(self, base_from: str, workdirs: List[str], install: str, requirements: List[str],
+                 overlay: List[str]):
+        self.requirements = "\n".join(requirements) + "\n"
+        self.base_dockerfile = "\n".join([f"FROM {base_from}", *workdirs, "COPY requirements.txt ./", install]) + "\n"
+        # 基础镜像、依赖安装命令和依赖列表都相同时才共享
+        self.key = hashlib.sha256((self.base_dockerfile + self.requirements).encode("utf-8")).hexdigest()
+        self.base_tag = f"{BASE_REPOSITORY}:{self.key}"
+        self.overlay_dockerfile = "\n".join([f"FROM {self.base_tag}", *overlay]) + "\n"
+
+    def materialize_base(self) -> str:
+        """生成基础镜像的构建上下文（只有 Dockerfile 和规范化后的 requirements.txt），返回临时目录"""
+        directory = tempfile.mkdtemp(prefix="aiforge-base-")
+        with open(os.path.join(directory, "Dockerfile"), "w", encoding="utf-8") as f:
+            f.write(self.base_dockerfile)
+        with open(os.path.join(directory, "requirements.txt"), "w", encoding="utf-8") as f:
+            f.write(self.requirements)
+        return directory
+
+    def materialize_overlay(self) -> str:
+        """把模型层的 Dockerfile 写到构建上下文之外的临时目录，返回文件路径"""
+        directory = tempfile.mkdtemp(prefix="aiforge-overlay-")
+        path = os.path.join(directory, "Dockerfile")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.overlay_dockerfile)
+        return path
+
+    @staticmethod
+    def cleanup(path: str):
+        shutil.rmtree(path if os.path.isdir(path) else os.path.dirname(path), ignore_errors=True)
+
+
+def plan_layered_build(context_dir: str) -> Optional[LayeredBuild]:
+    """
+    识别模板形式的 Dockerfile（单个 FROM、复制源码、pip install -r requirements.txt），
+    返回分层构建方案；其他写法（多阶段、额外的 RUN、安装前的 ENV 等）返回 None，按原样构建
+    """
+    dockerfile_path = os.path.join(context_dir, "Dockerfile")
+    requirements_path = os.path.join(context_dir, "requirements.txt")
+    if not os.path.isfile(dockerfile_path) or not os.path.isfile(requirements_path):
+        return None
+    try:
+        instructions = _instructions(read_text(dockerfile_path))
+        requirements = normalize_requirements(read_text(requirements_path))
+    except UnicodeDecodeError:
+        return None
+    if requirements is None:
+        return None
+
+    base_from, install = None, None
+    workdirs, overlay = [], []
+    for instruction in instructions:
+        keyword, _, argument = instruction.partition(" ")
+        keyword = keyword.upper()
+        if keyword == "FROM":
+            # 多阶段构建、指定平台或别名的不拆分
+            if base_from is not None or not argument or " " in argument.strip():
+                return None
+            base_from = argument.strip()
+        elif base_from is None:
+            return None
+        elif install is None and PIP_INSTALL.match(instruction):
+            install = instruction
+        elif install is None:
+            if keyword not in PRE_INSTALL_INSTRUCTIONS:
+                return None
+            if keyword == "WORKDIR":
+                workdirs.append(instruction)
+            overlay.append(instruction)
+        elif keyword in OVERLAY_INSTRUCTIONS:
+            overlay.append(instruction)
+        else:
+            return None
+    if install is None:
+        return None
+    return LayeredBuild(base_from, workdirs, install, requirements, overlay)
@@ -0,0 +1,204 @@
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from typing import Dict, Optional, Tuple
+
+# 按内容寻址的文件存储：data/blobs/<sha256 前两位>/<sha256>
+BLOB_DIR = os.path.join("data", "blobs")
+# 不进入存储的目录：项目的日志归档以追加方式写入
+IGNORED_DIRS = {"logs"}
+HASH_CHUNK = 1024 * 1024
+
+
+class BlobStore:
+    """
+    模型和项目目录的去重存储：每个文件按 sha256 存放一份，工作区中的文件是指向它的硬链接，
+    复制工作区只需为每个文件建立一个硬链接（不在同一文件系统时退回复制）。
+    同一内容的文件共享 inode，修改工作区中的已有文件前必须调用 detach，
+    或者写入新文件后替换（例如 save_params 之类的整体重写），不能就地修改
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or os.path.join(os.getcwd(), BLOB_DIR))
+        # (st_dev, st_ino) -> sha256，启动时扫描一遍存储目录得到，之后随写入更新
+        self.inodes: Dict[Tuple[int, int], str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.linked = 0
+        self.copied = 0
+        self.hashed_bytes = 0
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if os.path.isdir(self.root):
+                for prefix in os.scandir(self.root):
+                    if prefix.is_dir():
+                        for blob in os.scandir(prefix.path):
+                            stat = blob.stat()
+                            self.inodes[(stat.st_dev, stat.st_ino)] = blob.name
+            self._loaded = True
+
+    def digest_of(self, path: str) -> Optional[str]:
+        """文件已经在存储中时返回其 sha256，只需一次 stat"""
+        self._load()
+        stat = os.stat(path)
+        return self.inodes.get((stat.st_dev, stat.st_ino))
+
+    # ---------- 写入 ----------
+
+    def _hash(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+                self.hashed_bytes += len(chunk)
+        return digest.hexdigest()
+
+    def ingest_file(self, path: str) -> str:
+        """把文件放入存储：内容已存在时把文件替换为指向已有副本的硬链接，否则把文件本身链接进存储"""
+        digest = self.digest_of(path)
+        if digest is not None:
+            return digest
+        digest = self._hash(path)
+        blob = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            # 相同内容已经存在：用指向它的硬链接替换当前文件，释放这一份
+            self._replace_with_link(blob, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # 存储和文件不在同一文件系统，存一份副本
+            shutil.copy2(path, blob)
+        stat = os.stat(blob)
+        with self._lock:
+            self.inodes[(stat.st_dev, stat.st_ino)] = digest
+        return digest
+
+    def ingest_tree(self, directory: str) -> int:
+        """把目录中的所有文件放入存储（已经在存储中的只需一次 stat），返回文件数"""
+        count = 0
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            for name in files:
+                path = os.path.join(root, name)
+                if not os.path.islink(path):
+                    self.ingest_file(path)
+                    count += 1
+        return count
+
+    @staticmethod
+    def _replace_with_link(source: str, target: str):
+        temp = f"{target}.{uuid.uuid4().hex}.tmp"
+        os.link(source, temp)
+        os.replace(temp, target)
+
+    # ---------- 工作区 ----------
+
+    def materialize(self, source: str, target: str):
+        """
+        按 source 的结构创建 target：目录新建，文件放入存储后以硬链接出现在 target 中，
+        source 已经在存储中时只有元数据操作；target 已存在时先删除
+        """
+        if os.path.exists(target):
+            self.remove_tree(target)
+        for root, dirs, files in os.walk(source):
+            dirs[:] = [d for d in dirs if d not in IGNORED_DIRS]
+            destination = os.path.join(target, os.path.relpath(root, source))
+            os.makedirs(destination, exist_ok=True)
+            shutil.copystat(root, destination)
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(destination, name))
+                    continue
+                blob = self._blob_path(self.ingest_file(path))
+                try:
+                    os.link(blob, os.path.join(destination, name))
+                    self.linked += 1
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EMLINK):
+                        raise
+                    shutil.copy2(blob, os.path.join(destination, name))
+                    self.copied += 1
+
+    def detach(self, path: str):
+        """写时复制：修改工作区中的文件前调用，把它换成独立的副本，不影响共享同一内容的其他工作区"""
+        digest = self.digest_of(path)
+        if digest is None and os.stat(path).st_nlink == 1:
+            return
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.copy2(path, temp)
+        os.replace(temp, path)
+        if digest is not None:
+            self._collect(digest)
+
+    def remove_tree(self, directory: str) -> int:
+        """删除工作区，并删除不再被任何工作区引用的内容，返回释放的字节数"""
+        self._load()
+        candidates = set()
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                stat = os.lstat(os.path.join(root, name))
+                digest = self.inodes.get((stat.st_dev, stat.st_ino))
+                if digest is not None:
+                    candidates.add(digest)
+        shutil.rmtree(directory)
+        return sum(self._collect(digest) for digest in candidates)
+
+    def _collect(self, digest: str) -> int:
+        blob = self._blob_path(digest)
+        try:
+            stat = os.stat(blob)
+        except FileNotFoundError:
+            return 0
+        # 只剩存储中的这一个链接
+        if stat.st_nlink > 1:
+            return 0
+        os.remove(blob)
+        with self._lock:
+            self.inodes.pop((stat.st_dev, stat.st_ino), None)
+        return stat.st_size
+
+    def stats(self) -> dict:
+        self._load()
+        with self._lock:
+            digests = list(self.inodes.values())
+        stored = 0
+        for digest in digests:
+            try:
+                stored += os.stat(self._blob_path(digest)).st_size
+            except FileNotFoundError:
+                pass
+        return {
+            "root": self.root,
+            "blobs": len(digests),
+            "stored_bytes": stored,
+            "linked": self.linked,
+            "copied": self.copied,
+            "hashed_bytes": self.hashed_bytes,
+        }
+
+
+blob_store = BlobStore()
+
+
+if __name__ == "__main__":
+    # 把已有的模型和项目目录放入存储，重复的文件合并为硬链接
+    for base in (os.path.join("data", "Model"), os.path.join("data", "Project")):
+        if os.path.isdir(base):
+            for name in sorted(os.listdir(base)):
+                blob_store.ingest_tree(os.path.join(base, name))
+    print(blob_store.stats())
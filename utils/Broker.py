@@ -0,0 +1,325 @@
+import asyncio
+import json
+import os
+import socket
+import uuid
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+# 跨 worker 转发的日志批次：最长等待时间（秒）、最大条数、最大字节数
+BATCH_INTERVAL = 0.01
+BATCH_LINES = 500
+BATCH_BYTES = 48 * 1024
+# Unix 数据报的大小上限：sendto 受发送缓冲区限制，接收端每次最多读取 RECV_BYTES，超过的批次拆开发送
+DATAGRAM_BYTES = 192 * 1024
+RECV_BYTES = 256 * 1024
+# 断线重连间隔（秒）
+RECONNECT_INTERVAL = 1.0
+# Redis 发布订阅使用的频道名
+REDIS_CHANNEL = "aiforge:logs"
+
+
+class LogBroker:
+    """
+    项目日志的跨 worker 发布接口：日志先写入本 worker 的频道，
+    再按批次转发给其他 worker，由各 worker 自行向本地 WebSocket 扇出
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.deliver: Optional[Callable[[str, str, int, str, str], None]] = None
+        self._pending: List[list] = []
+        self._pending_bytes = 0
+        self._timer = None
+        # 单个批次编码后的字节数上限，None 表示不限制
+        self.max_payload: Optional[int] = None
+        self.forwarded_batches = 0
+        self.received_batches = 0
+
+    async def start(self, deliver: Callable[[str, str, int, str, str], None]):
+        """
+        deliver(origin, project_id, seq, message, type) 用于把其他 worker 的日志写入本地频道，
+        seq 是该行在 origin 中的序号
+        """
+        self.deliver = deliver
+
+    async def stop(self):
+        self._flush()
+
+    def forward(self, project_id: str, seq: int, message: str, msg_type: str):
+        """把本 worker 产生的一行日志加入待转发批次"""
+        self._pending.append([project_id, seq, message, msg_type])
+        self._pending_bytes += len(message) + 32
+        if len(self._pending) >= BATCH_LINES or self._pending_bytes >= BATCH_BYTES:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(BATCH_INTERVAL, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        entries = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        for payload in self._encode(entries):
+            self.forwarded_batches += 1
+            self._send(payload)
+
+    def _encode(self, entries: List[list]) -> List[bytes]:
+        """
+        编码一个批次；超过 max_payload 时对半拆开，直到每个批次都不超过上限。
+        待转发字节数按字符估算，中文和转义字符编码后会更长，单行日志也可能超过上限
+        """
+        payload = json.dumps({"origin": self.origin, "entries": entries}, ensure_ascii=False).encode("utf-8")
+        if self.max_payload is None or len(payload) <= self.max_payload:
+            return [payload]
+        if len(entries) > 1:
+            middle = len(entries) // 2
+            return self._encode(entries[:middle]) + self._encode(entries[middle:])
+        # 单行日志超过上限：截断消息内容，保留序号让接收端的序号保持连续
+        project_id, seq, message, msg_type = entries[0]
+        keep = len(message) * self.max_payload // len(payload) // 2
+        if keep <= 0:
+            print(f"[Broker] 项目 {project_id} 的日志批次超过 {self.max_payload} 字节，丢弃")
+            return []
+        return self._encode([[project_id, seq, message[:keep] + " ...[日志过长已截断]", msg_type]])
+
+    def _send(self, payload: bytes):
+        """把一个批次发送给其他 worker，由子类实现"""
+
+    def _receive(self, payload: bytes):
+        try:
+            batch = json.loads(payload)
+        except ValueError as e:
+            print(f"[Broker] 无法解析的日志批次: {e}")
+            return
+        if batch.get("origin") == self.origin or self.deliver is None:
+            return
+        self.received_batches += 1
+        origin = batch.get("origin")
+        for project_id, seq, message, msg_type in batch.get("entries", []):
+            self.deliver(origin, project_id, seq, message, msg_type)
+
+    def stats(self) -> dict:
+        return {
+            "broker": type(self).__name__,
+            "forwarded_batches": self.forwarded_batches,
+            "received_batches": self.received_batches,
+        }
+
+
+class InProcessBroker(LogBroker):
+    """单 worker 部署：不需要转发"""
+
+    def forward(self, project_id: str, seq: int, message: str, msg_type: str):
+        pass
+
+
+class UnixSocketBroker(LogBroker):
+    """
+    同一主机上的多个 worker：每个 worker 在目录中绑定一个 Unix 数据报套接字，
+    发布时把批次发送给目录中的所有其他套接字，失效的套接字文件会被清理
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{self.origin[:8]}.sock")
+        self.sock: Optional[socket.socket] = None
+        self.max_payload = DATAGRAM_BYTES
+
+    async def start(self, deliver):
+        await super().start(deliver)
+        os.makedirs(self.directory, exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), self._on_readable)
+
+    async def stop(self):
+        await super().stop()
+        if self.sock is not None:
+            asyncio.get_running_loop().remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _on_readable(self):
+        while True:
+            try:
+                payload = self.sock.recv(RECV_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._receive(payload)
+
+    def _send(self, payload: bytes):
+        if self.sock is None:
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self.sock.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 对应的 worker 已退出
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                print(f"[Broker] worker {name} 接收缓冲区已满，丢弃一个日志批次")
+            except OSError as e:
+                print(f"[Broker] 发送到 {name} 失败: {e}")
+
+
+def _encode_command(*args) -> bytes:
+    """编码 RESP 命令"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        parts.append(f"${len(arg)}\r\n".encode() + arg + b"\r\n")
+    return b"".join(parts)
+
+
+async def _close_writer(writer: Optional[asyncio.StreamWriter]):
+    """关闭断开或停止的连接，忽略关闭时的错误"""
+    if writer is None:
+        return
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    """读取一个 RESP 回复"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("连接已关闭")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        raise ConnectionError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        return [await _read_reply(reader) for _ in range(int(body))]
+    raise ConnectionError(f"无法识别的回复: {line!r}")
+
+
+class RedisBroker(LogBroker):
+    """
+    基于 Redis 发布订阅的多主机部署：所有 worker 订阅同一频道，
+    只使用 PUBLISH/SUBSCRIBE 两个命令，兼容任何实现了 RESP 协议的服务
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.channel = REDIS_CHANNEL
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=1024)
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self, deliver):
+        await super().start(deliver)
+        self._tasks = [asyncio.create_task(self._publisher()), asyncio.create_task(self._subscriber())]
+
+    async def stop(self):
+        await super().stop()
+        for task in self._tasks:
+            task.cancel()
+        # 等待任务退出，连接在各自的 finally 中关闭
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            try:
+                writer.write(_encode_command("AUTH", self.password))
+                await _read_reply(reader)
+            except BaseException:
+                await _close_writer(writer)
+                raise
+        return reader, writer
+
+    def _send(self, payload: bytes):
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            print("[Broker] Redis 发布队列已满，丢弃一个日志批次")
+
+    async def _publisher(self):
+        # 连接断开时还没有收到回复的批次，重连后先重新发布；
+        # 已经发布过的批次可能因此重复，接收端按序号忽略重复的日志
+        payload = None
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                while True:
+                    if payload is None:
+                        payload = await self._queue.get()
+                    writer.write(_encode_command("PUBLISH", self.channel, payload))
+                    await writer.drain()
+                    await _read_reply(reader)
+                    payload = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Broker] Redis 发布连接断开: {e}")
+            finally:
+                await _close_writer(writer)
+            await asyncio.sleep(RECONNECT_INTERVAL)
+
+    async def _subscriber(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                writer.write(_encode_command("SUBSCRIBE", self.channel))
+                await writer.drain()
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        self._receive(reply[2])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Broker] Redis 订阅连接断开: {e}")
+            finally:
+                await _close_writer(writer)
+            await asyncio.sleep(RECONNECT_INTERVAL)
+
+
+def create_broker(url: str) -> LogBroker:
+    """
+    根据 URL 创建日志代理：
+    memory://                      单 worker（默认）
+    unix:///tmp/aiforge-broker     同一主机的多个 worker
+    redis://:password@host:6379    多主机
+    """
+    scheme = urlparse(url).scheme
+    if scheme == "unix":
+        return UnixSocketBroker(urlparse(url).path)
+    if scheme == "redis":
+        return RedisBroker(url)
+    return InProcessBroker()
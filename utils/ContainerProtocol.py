@@ -0,0 +1,172 @@
+import asyncio
+import json
+import socket as socket_module
+import threading
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+# 协议帧的行首标记，不带标记的行是容器的普通输出
+FRAME_PREFIX = "@@aiforge "
+PROTOCOL_VERSION = 1
+# 握手等待时间（秒），超时视为旧版容器，改用 stdin 模式
+HELLO_TIMEOUT = 3
+# 容器进程启动超过这个时间（秒）仍不回应握手时，同一镜像创建的容器都视为旧版；
+# 刚启动的容器可能还在导入依赖，只记录这一个容器
+STARTUP_GRACE = 30
+RECV_SIZE = 65536
+
+
+class ContainerRequestError(Exception):
+    """容器执行请求时抛出异常"""
+
+    def __init__(self, message: str, details: Optional[str] = None):
+        super().__init__(message)
+        self.details = details
+
+
+class ContainerChannelClosed(ConnectionError):
+    pass
+
+
+def encode_frame(message: dict) -> bytes:
+    return (FRAME_PREFIX + json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def decode_frame(line: str) -> Optional[dict]:
+    """解析一行输出，不是协议帧时返回 None"""
+    if not line.startswith(FRAME_PREFIX):
+        return None
+    try:
+        frame = json.loads(line[len(FRAME_PREFIX):])
+    except ValueError:
+        return None
+    return frame if isinstance(frame, dict) else None
+
+
+class ContainerChannel:
+    """
+    与一个项目容器之间的请求/响应通道：
+    后端向 stdin 写入带请求 id 的 JSON 帧，容器按 id 返回日志、结果或错误帧；
+    一个 attach 连接由后台线程读取并按 id 分发，同一容器可以同时处理多个请求
+    """
+
+    def __init__(self, engine, container_id: str):
+        self.engine = engine
+        self.container_id = container_id
+        self._socket = None
+        self._sock = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, asyncio.Queue] = {}
+        self.closed = False
+        self.requests = 0
+        # 握手时容器声明支持的请求类型，例如常驻推理 serve
+        self.ops = set()
+
+    async def open(self, api):
+        """attach 到容器的 stdin/stdout 并启动读取线程"""
+        self._loop = asyncio.get_running_loop()
+        self._socket = await self.engine.run("attach", api.attach_socket, self.container_id,
+                                             params={'stdin': 1, 'stream': 1, 'stdout': 1, 'stderr': 1})
+        self._sock = self._socket._sock
+        threading.Thread(target=self._read_loop, name=f"channel-{self.container_id[:12]}", daemon=True).start()
+        return self
+
+    async def hello(self) -> bool:
+        """握手，容器在 HELLO_TIMEOUT 内回应时返回 True"""
+        try:
+            frame = await asyncio.wait_for(self.request("hello"), HELLO_TIMEOUT)
+        except (asyncio.TimeoutError, ContainerChannelClosed, ContainerRequestError):
+            return False
+        self.ops = set(frame.get("ops") or ())
+        return frame.get("protocol") == PROTOCOL_VERSION
+
+    @property
+    def inflight(self) -> int:
+        return len(self._pending)
+
+    async def request(self, op: str, params=None,
+                      on_log: Optional[Callable[[str], Awaitable[None]]] = None) -> dict:
+        """发送一个请求并等待结果帧，执行过程中的输出逐行交给 on_log"""
+        if self.closed:
+            raise ContainerChannelClosed("容器连接已关闭")
+        request_id = uuid.uuid4().hex
+        queue: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        self.requests += 1
+        try:
+            data = encode_frame({"v": PROTOCOL_VERSION, "id": request_id, "op": op, "params": params})
+            await self.engine.run("attach", self._sock.sendall, data)
+            while True:
+                frame = await queue.get()
+                kind = frame.get("type")
+                if kind == "log":
+                    if on_log is not None:
+                        await on_log(frame.get("line", ""))
+                elif kind == "error":
+                    raise ContainerRequestError(frame.get("error") or "容器执行失败", frame.get("traceback"))
+                elif kind == "closed":
+                    raise ContainerChannelClosed("容器连接已关闭")
+                else:
+                    return frame
+        finally:
+            self._pending.pop(request_id, None)
+
+    # ---------- 读取线程 ----------
+
+    def _read_loop(self):
+        buffer = bytearray()
+        try:
+            while True:
+                data = self._sock.recv(RECV_SIZE)
+                if not data:
+                    break
+                buffer += data
+                position = buffer.rfind(b"\n") + 1
+                if not position:
+                    continue
+                lines = buffer[:position].decode("utf-8", errors="replace").split("\n")
+                del buffer[:position]
+                lines = [line.strip() for line in lines if line.strip()]
+                if lines:
+                    self._call(self._dispatch, lines)
+        except OSError:
+            pass
+        finally:
+            self._call(self._on_closed)
+
+    def _call(self, callback, *args):
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _dispatch(self, lines):
+        for line in lines:
+            frame = decode_frame(line)
+            if frame is None:
+                # 没有经过协议输出的内容（例如子进程直接写 stdout），归到最近的请求
+                if self._pending:
+                    next(reversed(self._pending.values())).put_nowait({"type": "log", "line": line})
+                continue
+            queue = self._pending.get(frame.get("id"))
+            # 没有 type 的帧是终端回显的请求本身；其他 worker 发起的请求也会被忽略
+            if queue is not None and frame.get("type"):
+                queue.put_nowait(frame)
+
+    def _on_closed(self):
+        self.closed = True
+        for queue in self._pending.values():
+            queue.put_nowait({"type": "closed"})
+
+    def close(self):
+        self.closed = True
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket_module.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self._sock.close()
+            except OSError:
+                pass
@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import docker
+import numpy as np
+from docker.types import CancellableStream
+
+# 降采样后每个点覆盖的秒数
+RESOLUTION = int(os.environ.get("CONTAINER_STATS_RESOLUTION", "5"))
+# 每个项目保留的点数（默认 5 秒一个点，共 1 小时）
+HISTORY_POINTS = int(os.environ.get("CONTAINER_STATS_POINTS", "720"))
+# 对照容器状态缓存、为新容器建立统计流的间隔（秒），只读本地缓存，不访问守护进程
+SYNC_INTERVAL = 2.0
+# 统计流异常断开后，同一个容器多久之后再重连（秒）
+RETRY_DELAY = 10.0
+# 容器不存在后，项目的历史数据再保留多久（秒）
+RETENTION = RESOLUTION * HISTORY_POINTS
+# 长连接数上限，也是连接池大小
+MAX_STREAMS = int(os.environ.get("CONTAINER_STATS_MAX_STREAMS", "512"))
+
+# 每个点的字段：CPU 百分比（100 表示一个核）、常驻内存字节数、网络和块设备的每秒字节数
+FIELDS = ("cpu_percent", "memory_rss", "net_rx", "net_tx", "block_read", "block_write")
+
+
+def parse_sample(sample: dict):
+    """
+    从一条 Docker stats 中取出 (CPU 百分比, 常驻内存, 网络接收/发送累计字节, 块设备读/写累计字节)，
+    CPU 按本条自带的 precpu_stats 计算，与 docker stats 相同；cgroup v1/v2 的字段都支持
+    """
+    cpu = sample.get("cpu_stats") or {}
+    precpu = sample.get("precpu_stats") or {}
+    cpu_delta = (cpu.get("cpu_usage") or {}).get("total_usage", 0) \
+        - (precpu.get("cpu_usage") or {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online = cpu.get("online_cpus") or len((cpu.get("cpu_usage") or {}).get("percpu_usage") or ()) or 1
+    cpu_percent = cpu_delta / system_delta * online * 100 if system_delta > 0 and cpu_delta > 0 else 0.0
+
+    memory = sample.get("memory_stats") or {}
+    detail = memory.get("stats") or {}
+    rss = detail.get("rss", detail.get("anon"))
+    if rss is None:
+        rss = max(memory.get("usage", 0) - detail.get("total_inactive_file", detail.get("inactive_file", 0)), 0)
+
+    rx = tx = 0
+    for network in (sample.get("networks") or {}).values():
+        rx += network.get("rx_bytes", 0)
+        tx += network.get("tx_bytes", 0)
+    read = write = 0
+    for entry in (sample.get("blkio_stats") or {}).get("io_service_bytes_recursive") or ():
+        op = entry.get("op", "").lower()
+        if op == "read":
+            read += entry.get("value", 0)
+        elif op == "write":
+            write += entry.get("value", 0)
+    return cpu_percent, rss, rx, tx, read, write
+
+
+def _json_lines(chunks):
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ResourceRing:
+    """单个项目的定长环形缓冲：时间戳 float64，各字段 float32，写满后覆盖最旧的点"""
+
+    def __init__(self, capacity: int = HISTORY_POINTS):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(FIELDS)), dtype=np.float32)
+        self.head = 0
+        self.size = 0
+        self.latest: Optional[tuple] = None
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def append(self, timestamp: float, values):
+        with self._lock:
+            self.times[self.head] = timestamp
+            self.values[self.head] = values
+            self.head = (self.head + 1) % len(self.times)
+            self.size = min(self.size + 1, len(self.times))
+            self.updated = time.time()
+
+    def snapshot(self):
+        """按时间顺序复制当前数据"""
+        with self._lock:
+            order = (np.arange(self.size) + self.head - self.size) % len(self.times)
+            return self.times[order], self.values[order]
+
+
+class _StatsStream:
+    """一个容器的统计流：逐条计算指标，同一个 RESOLUTION 区间内的样本求平均后写入项目的环形缓冲"""
+
+    def __init__(self, container_id: str, project_id: str, ring: ResourceRing):
+        self.container_id = container_id
+        self.project_id = project_id
+        self.ring = ring
+        self.stream: Optional[CancellableStream] = None
+        self.thread: Optional[threading.Thread] = None
+        self.closed = False
+        self._counters: Optional[tuple] = None
+        self._counted_at = 0.0
+        self._bucket = None
+        self._sums = [0.0] * len(FIELDS)
+        self._count = 0
+
+    def feed(self, sample: dict, now: float):
+        cpu_percent, rss, *counters = parse_sample(sample)
+        rates = [0.0] * len(counters)
+        if self._counters is not None and now > self._counted_at:
+            elapsed = now - self._counted_at
+            # 容器重启后计数器归零，这一条的速率记为 0
+            rates = [max(value - last, 0) / elapsed for value, last in zip(counters, self._counters)]
+        self._counters, self._counted_at = tuple(counters), now
+
+        bucket = int(now // RESOLUTION)
+        if bucket != self._bucket:
+            self.flush()
+            self._bucket = bucket
+        values = (cpu_percent, rss, *rates)
+        for i, value in enumerate(values):
+            self._sums[i] += value
+        self._count += 1
+        self.ring.latest = values
+
+    def flush(self):
+        if not self._count:
+            return
+        self.ring.append(self._bucket * RESOLUTION, [value / self._count for value in self._sums])
+        self._sums = [0.0] * len(FIELDS)
+        self._count = 0
+
+
+class ContainerStatsCollector:
+    """
+    采集单台主机上所有项目容器（project_<id>）的资源使用：每个运行中的容器保持一条
+    Docker stats 长连接（守护进程每秒推送一次），在各自的线程中解析，按 RESOLUTION 降采样后
+    写入每个项目定长的环形缓冲；要采集哪些容器由 DockerStateCache 决定，不额外访问守护进程
+    """
+
+    def __init__(self, docker_host: str, state):
+        # 统计流是长连接：不设超时，连接池按最大流数设置
+        self.api = docker.APIClient(base_url=docker_host, timeout=None, max_pool_size=MAX_STREAMS)
+        self.host = docker_host
+        self.state = state
+        self.rings: Dict[str, ResourceRing] = {}
+        self.streams: Dict[str, _StatsStream] = {}    # 容器 ID -> 统计流
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+        self.errors = 0
+        # 解析和聚合样本累计花费的时间，用于确认采集本身的开销
+        self.busy_seconds = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._supervise, daemon=True, name=f"container-stats-{self.host}")
+        self._thread.start()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            streams = list(self.streams.values())
+        for stream in streams:
+            self._stop(stream)
+
+    # ---------- 统计流 ----------
+
+    def _supervise(self):
+        while not self._closed.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"[ContainerStats] {self.host} 同步容器列表失败: {e}")
+            self._closed.wait(SYNC_INTERVAL)
+
+    def sync(self):
+        """为新出现的运行中项目容器建立统计流，清理已经结束的流和过期的项目数据"""
+        now = time.time()
+        wanted = {}
+        for entry in list(self.state.containers.values()):
+            if entry.name.startswith("project_") and entry.status in ("running", "paused"):
+                wanted[entry.id] = entry.name[len("project_"):]
+        with self._lock:
+            for container_id, stream in list(self.streams.items()):
+                if container_id not in wanted:
+                    self._stop(stream)
+                if stream.closed:
+                    del self.streams[container_id]
+            for container_id, project_id in wanted.items():
+                if container_id in self.streams or self._retry_at.get(container_id, 0) > now:
+                    continue
+                ring = self.rings.get(project_id)
+                if ring is None:
+                    ring = self.rings[project_id] = ResourceRing()
+                stream = _StatsStream(container_id, project_id, ring)
+                stream.thread = threading.Thread(target=self._follow, args=(stream,), daemon=True,
+                                                 name=f"container-stats-{container_id[:12]}")
+                self.streams[container_id] = stream
+                stream.thread.start()
+            live = {stream.project_id for stream in self.streams.values()}
+            for project_id, ring in list(self.rings.items()):
+                if project_id not in live and now - ring.updated > RETENTION:
+                    del self.rings[project_id]
+            self._retry_at = {key: at for key, at in self._retry_at.items() if at > now}
+
+    def _open(self, container_id: str) -> CancellableStream:
+        # 与 APIClient.events 相同的方式包装响应，关闭时可以中断阻塞中的读取；
+        # 守护进程每条统计以换行结尾，按行切分后直接 json.loads，比 docker 库逐段尝试解码的方式省 CPU
+        response = self.api._get(self.api._url("/containers/{0}/stats", container_id),
+                                 params={"stream": True}, stream=True)
+        self.api._raise_for_status(response)
+        return CancellableStream(_json_lines(self.api._stream_helper(response, decode=False)), response)
+
+    def _follow(self, stream: _StatsStream):
+        try:
+            stream.stream = self._open(stream.container_id)
+            if stream.closed:
+                stream.stream.close()
+            for sample in stream.stream:
+                started = time.perf_counter()
+                stream.feed(sample, time.time())
+                self.samples += 1
+                self.busy_seconds += time.perf_counter() - started
+        except Exception as e:
+            if not stream.closed and not self._closed.is_set():
+                self.errors += 1
+                with self._lock:
+                    self._retry_at[stream.container_id] = time.time() + RETRY_DELAY
+                print(f"[ContainerStats] 容器 {stream.container_id[:12]} 统计流断开: {e}")
+        finally:
+            # 容器停止时守护进程结束统计流
+            stream.flush()
+            stream.ring.latest = None
+            stream.closed = True
+
+    def _stop(self, stream: _StatsStream):
+        stream.closed = True
+        if stream.stream is not None:
+            try:
+                stream.stream.close()
+            except Exception:
+                pass
+
+    # ---------- 查询 ----------
+
+    def project_series(self, project_id, points: int = HISTORY_POINTS) -> Optional[dict]:
+        ring = self.rings.get(str(project_id))
+        if ring is None:
+            return None
+        times, values = ring.snapshot()
+        return self._render(times, values, points, ring.latest)
+
+    def host_series(self, points: int = HISTORY_POINTS) -> dict:
+        """按时间戳把所有项目的点相加：CPU 百分比、内存和速率都是可加的"""
+        with self._lock:
+            rings = list(self.rings.values())
+            containers = len(self.streams)
+        snapshots = [ring.snapshot() for ring in rings]
+        latest = [ring.latest for ring in rings if ring.latest is not None]
+        times = np.concatenate([s[0] for s in snapshots]) if snapshots else np.zeros(0)
+        values = np.concatenate([s[1] for s in snapshots]) if snapshots else np.zeros((0, len(FIELDS)))
+        buckets, inverse = np.unique(times, return_inverse=True)
+        totals = np.zeros((len(buckets), len(FIELDS)), dtype=np.float64)
+        np.add.at(totals, inverse, values)
+        current = tuple(np.sum(latest, axis=0)) if latest else None
+        result = self._render(buckets, totals, points, current)
+        result.update(host=self.host, containers=containers, projects=len(rings))
+        return result
+
+    @staticmethod
+    def _render(times: np.ndarray, values: np.ndarray, points: int, latest) -> dict:
+        """超过 points 个点时按相邻区间求平均"""
+        points = max(1, min(points, HISTORY_POINTS))
+        if len(times) > points:
+            starts = np.linspace(0, len(times), points, endpoint=False).astype(np.int64)
+            counts = np.diff(np.append(starts, len(times)))
+            times = times[starts]
+            values = np.add.reduceat(values.astype(np.float64), starts, axis=0) / counts[:, None]
+        return {
+            "resolution": RESOLUTION,
+            "timestamps": times.tolist(),
+            "series": {name: np.round(values[:, i], 2).tolist() for i, name in enumerate(FIELDS)},
+            "current": {name: round(float(value), 2) for name, value in zip(FIELDS, latest)} if latest else None,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "host": self.host,
+            "streams": len(self.streams),
+            "projects": len(self.rings),
+            "samples": self.samples,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
@@ -1,157 +1,218 @@
 import asyncio
 import json
 import time
-from typing import Optional
+from datetime import datetime, timezone
+from typing import List, Optional
 
 import docker
 import os
 import io
 
 from models import Hypara
-from utils.ImageList import ImageList
+from utils.AsyncDocker import AsyncDockerEngine
+from utils.ContainerProtocol import ContainerChannel, ContainerRequestError, STARTUP_GRACE
+from utils.ContainerStats import ContainerStatsCollector
+from utils.DockerState import DockerStateCache, normalize_tag
+from utils.IdleReaper import IdleReaper, RESUME_UNPAUSE, RESUME_START, RESUME_RECREATE
+from utils.ImageBuilder import ImageBuilder, BUILD_SUCCEEDED, find_build_context
+from utils.LogArchive import get_archive
+from utils import MetricExtractor
+from utils.LogStream import ContainerLogReader, LineFramer
+from utils.ModelRuntime import PROTOCOL_FRAMED, PROTOCOL_LABEL, prepare_context, protocol_labels
+from utils.PredictCache import predict_cache
+from utils.ResourceLedger import ResourceLedger
 from utils.ResultGenerator import ResultGenerator
+from utils.Scheduler import PROJECT_CPU, PROJECT_MEMORY
+from utils.WarmPool import WarmPool
 from docker.errors import NotFound, APIError
 from utils.WebSocketConfig import active_connections, broadcast_to_project
 
 
 class DockerCore:
     def __init__(self, docker_host):
+        # 日志流、attach 等长连接使用不设超时的客户端，其余操作通过异步适配层执行
         self.docker_client = docker.DockerClient(base_url=docker_host, timeout=None)
-        self.container_name_to_id = {}  # 映射容器名称到容器 ID
+        self.engine = AsyncDockerEngine(docker_host)
+        # 按镜像预热的空闲容器，项目启动时优先租用
+        self.warm_pool = WarmPool(self.engine, self._container_config, lambda image: self.state.image_id(image))
+        # 按构建上下文内容哈希缓存镜像
+        self.builder = ImageBuilder(self.engine)
         self.containers = {}    # 映射容器名到容器
-        self.cpu_max = 0
-        self.cpu_use = 0  # CPU
+        # 与支持分帧协议的容器之间的通道（按容器名），以及握手失败、只支持 stdin 模式的容器 ID 和镜像 ID，
+        # 同一容器或同一镜像创建的容器不再等待握手超时
+        self.channels = {}
+        self.legacy_containers = set()
+        self.legacy_images = set()
+        self._channel_locks = {}
+        # 本进程内依次执行旧版容器的 stdin 命令；不同 worker 之间由任务调度器限制为同一时间一个推理
+        self._stdin_locks = {}
+        # CPU/内存按项目预留，资源不足时排队
+        self.ledger = ResourceLedger(docker_host)
         self.gpu_max = 0
         self.gpu_use = 0
+        # 空闲的项目容器先暂停后停止，下一次请求时恢复
+        self.reaper = IdleReaper(self)
+        self._resume_locks = {}
 
-        # 初始化容器名称到ID的映射
-        self.initialize_container_map()
-
-    def initialize_container_map(self):
-        """列出所有容器并初始化名称到ID的映射"""
-        containers = self.docker_client.containers.list(all=True)
-        for container in containers:
-            name = container.name
-            container_id = container.id
-            if name:
-                self.container_name_to_id[name] = container_id
-                print(f"name: {name}, id: {container_id}")
+        # 镜像和容器状态缓存：启动时列出一次，之后由事件流更新
+        self.state = DockerStateCache(self.docker_client)
+        self.state.start()
+        # 每个运行中的项目容器一条 stats 长连接，降采样后按项目保存资源使用曲线
+        self.resources = ContainerStatsCollector(docker_host, self.state)
+        self.resources.start()
 
     async def container_creator(self, image_name: str, project_id: int, gpu_need: Optional[int],
                                 cpu_need: Optional[int],
                                 port: int, model_path: str, project_store_path: str, train_dataset_store_path: str,
-                                test_dataset_store_path: str, project_dao_impl):
+                                test_dataset_store_path: str, project_dao_impl, ticket=None):
 
         container_name = f"project_{project_id}"
+        cpu_need = cpu_need or PROJECT_CPU
 
         if gpu_need and gpu_need + self.gpu_use > self.gpu_max:
+            self._abandon(ticket)
             return ResultGenerator.gen_fail_result("GPU 资源不足，无法分配")
-        if cpu_need and cpu_need + self.cpu_use > self.cpu_max:
+        await self.ledger.refresh(self.engine)
+        if not self.ledger.can_ever_fit(cpu_need, PROJECT_MEMORY):
+            self._abandon(ticket)
             return ResultGenerator.gen_fail_result("CPU 资源不足，无法分配")
 
         # 镜像检查
         image_name = image_name + ":latest"
-        print(f"img_name:{image_name} {ImageList.image_list}")
-        if not ImageList.search_image(image_name):
+        if not self.state.has_image(image_name):
+            self._abandon(ticket)
             return ResultGenerator.gen_fail_result("镜像不存在")
 
         # 容器是否已存在检查
         try:
-            existing = self.docker_client.containers.get(container_name)
-            print(f"检测到同名容器 {container_name} 存在，正在删除...")
-            if existing.status == "running":
-                existing.stop()
-            existing.remove(force=True)
-            print(f"容器 {container_name} 删除完成。")
-        except docker.errors.NotFound:
-            pass
+            existing = await self.engine.find_container(container_name)
+            if existing is not None:
+                print(f"检测到同名容器 {container_name} 存在，正在删除...")
+                if existing.status == "running":
+                    await self.engine.stop(existing)
+                await self.engine.remove(existing, force=True)
+                print(f"容器 {container_name} 删除完成。")
         except Exception as e:
+            self._abandon(ticket)
             return ResultGenerator.gen_error_result(code=500, message=f"容器清理失败: {str(e)}")
 
+        model_path = model_path.replace("\\", "/")
+        print("构建镜像名:", image_name)
+        print(truncate_path_from_data(model_path))
+
+        # 预留 CPU/内存，主机已满时排队，分配到资源后在后台创建容器
+        if ticket is None:
+            ticket = self.ledger.request(project_id, cpu_need, PROJECT_MEMORY)
+        if not ticket.admitted:
+            await project_dao_impl.update_project_status_by_id(project_id, "queued")
+            asyncio.create_task(self._create_when_admitted(ticket, image_name, project_id, gpu_need, project_dao_impl))
+            return ResultGenerator.gen_success_result(message="主机资源不足，项目已进入排队", data=ticket.to_dict())
+        return await self._start_project_container(image_name, project_id, gpu_need, cpu_need, project_dao_impl)
+
+    def _abandon(self, ticket):
+        """创建失败时归还调度器已经申请的资源"""
+        if ticket is not None:
+            self.ledger.release(ticket.project_id)
+
+    async def _create_when_admitted(self, ticket, image_name: str, project_id: int, gpu_need: Optional[int],
+                                    project_dao_impl):
+        if not await ticket.wait():
+            print(f"项目 {project_id} 排队超时或已取消")
+            await project_dao_impl.update_project_status_by_id(project_id, "stopped")
+            return
+        result = await self._start_project_container(image_name, project_id, gpu_need, ticket.cpu, project_dao_impl)
+        print(f"排队项目 {project_id} 创建结果: {result}")
+
+    async def _start_project_container(self, image_name: str, project_id: int, gpu_need: Optional[int],
+                                       cpu_need: float, project_dao_impl):
+        container_name = f"project_{project_id}"
         try:
-            model_path = model_path.replace("\\", "/")
-            print("构建镜像名:", image_name)
-            print(truncate_path_from_data(model_path))
-
-            host_dictionary_path = os.path.join(os.getcwd(), "data", "pic")
-            host_dictionary_path2 = os.path.join(os.getcwd(), "data", "dataset")
-            container_dictionary_path = "/app/pic"
-            container_dictionary_path2 = "/app/dataset"
-            volumes = {host_dictionary_path: {'bind': container_dictionary_path, 'mode': 'ro'},
-                       host_dictionary_path2: {'bind': container_dictionary_path2, 'mode': 'ro'}}
-            # 以交互模式创建容器
-            container = self.docker_client.containers.create(
-                image=image_name,
-                name=container_name,
-                stdin_open=True,
-                tty=True,
-                detach=True,
-                volumes=volumes,
-            )
-            # 运行容器
-            container.start()
+            # 优先租用预热容器，没有时再现场创建
+            container = await self.warm_pool.lease(image_name, container_name)
+            if container is None:
+                container = await self.engine.create_container(
+                    image=image_name,
+                    name=container_name,
+                    **self._container_config(image_name)
+                )
+                # 运行容器
+                await self.engine.start(container)
+            # 按预留的核数限制容器的 CPU
+            await self.engine.limit_cpu(container, cpu_need)
 
             # 更新状态
             await project_dao_impl.update_project_status_by_id(project_id, "wait")
 
             # 更新资源使用情况
             self.gpu_use += gpu_need if gpu_need else 0
-            self.cpu_use += cpu_need if cpu_need else 0
 
-            self.container_name_to_id[container_name] = container.id
+            self.state.observe_container(container.id, container_name, image_name, "running")
             self.containers[container_name] = container
+            self.reaper.touch(project_id)
+            # 新容器从镜像中的参数开始
+            await predict_cache.expire(project_id)
 
             return ResultGenerator.gen_success_result(f"Success! Container Id 为 {container.id}")
 
         except Exception as e:
+            self.ledger.release(project_id)
             return ResultGenerator.gen_error_result(code=500, message=f"容器创建失败: {str(e)}")
 
-    def image_creator(self, image_name, pathname):
-        """创建镜像并返回状态"""
-        if self.search_image(image_name):
-            return ResultGenerator.gen_fail_result(message="镜像已存在")
-        else:
-            try:
-                dockerfile_dir = os.path.abspath(pathname)
-
-                self._build_image(dockerfile_dir, image_name)
-
-                return ResultGenerator.gen_success_result(message="镜像创建成功")  # 返回成功状态
-            except Exception as e:
-                print(f"镜像创建失败: {e}")
-                return ResultGenerator.gen_success_result(message=f"镜像创建失败{e}")
-
-    def _build_image(self, dockerfile_dir, image_name):
-        """构建镜像的具体过程"""
-        try:
-            print(dockerfile_dir, image_name)
-            for line in self.docker_client.images.build(path=dockerfile_dir, tag=image_name):
-                print(line)
-            print(f"镜像构建成功: {image_name}")
-            ImageList.add_image(image_name)
-        except Exception as e:
-            print(f"构建镜像失败: {e}")
-
-    def search_image(self, image_name):
-        """搜索镜像是否存在"""
-        images = self.docker_client.images.list()
-        for image in images:
-            if image_name in image.tags:
-                return True
-        return False
+    @staticmethod
+    def _container_config(image_name: str) -> dict:
+        """项目容器的创建参数，预热容器使用同一份配置"""
+        host_dictionary_path = os.path.join(os.getcwd(), "data", "pic")
+        host_dictionary_path2 = os.path.join(os.getcwd(), "data", "dataset")
+        container_dictionary_path = "/app/pic"
+        container_dictionary_path2 = "/app/dataset"
+        volumes = {host_dictionary_path: {'bind': container_dictionary_path, 'mode': 'ro'},
+                   host_dictionary_path2: {'bind': container_dictionary_path2, 'mode': 'ro'}}
+        # 以交互模式创建容器
+        return {
+            "stdin_open": True,
+            "tty": True,
+            "detach": True,
+            "volumes": volumes,
+        }
+
+    async def image_creator(self, image_name, pathname, channel: Optional[str] = None):
+        """
+        创建镜像并返回状态：构建上下文内容相同的镜像已存在时只打标签，
+        同一内容的并发构建合并为一次，构建输出推送到 channel
+        """
+        context_dir = find_build_context(pathname)
+        # 使用旧版 stdin 入口的模型在构建上下文的副本中换上模板入口，容器启动后即可握手使用分帧协议
+        build_dir, installed = await asyncio.to_thread(prepare_context, context_dir)
+        if installed:
+            print(f"[Build] 镜像 {image_name} 装入模板入口: {', '.join(installed)}")
+        labels = await asyncio.to_thread(protocol_labels, build_dir)
+        record = await self.builder.build(image_name, build_dir, channel, temporary=build_dir != context_dir,
+                                          labels=labels)
+        if record.status != BUILD_SUCCEEDED:
+            return ResultGenerator.gen_fail_result(message=f"镜像创建失败{record.error}", data=record.to_dict())
+        # 不等待事件到达，立即记录新标签，随后创建项目容器时可以直接找到
+        image = await self.engine.find_image(image_name)
+        if image is not None:
+            self.state.observe_image(image.id, image.tags, image.attrs.get("RepoDigests"))
+        # 预热池中的容器来自旧镜像；其他 worker 的池在租用时按镜像 ID 发现并丢弃
+        self.warm_pool.discard(normalize_tag(image_name))
+        return ResultGenerator.gen_success_result(message="镜像创建成功", data=record.to_dict())
+
+    async def search_image(self, image_name):
+        """搜索镜像是否存在，只查本地缓存"""
+        return self.state.has_image(image_name)
 
     def check_container_status(self, container_name):
         """检查容器状态"""
-        if container_name not in self.container_name_to_id:
+        entry = self.state.container(container_name)
+        if entry is None:
             return f"容器 {container_name} 不存在"
-        container_info = self.docker_client.containers.get(self.container_name_to_id[container_name]).attrs
-        status = container_info['State']['Status']
-        return status
+        return entry.status
 
     def container_log(self, container_name):
         """获取容器日志"""
         try:
-            container = self.docker_client.containers.get(self.container_name_to_id[container_name])
+            container = self.docker_client.containers.get(self.state.container_id(container_name) or container_name)
             logs = container.logs(stream=True)
             for log in logs:
                 print(log.decode("utf-8"))
@@ -159,124 +220,307 @@ class DockerCore:
             print(f"获取日志失败: {e}")
 
     async def exec_container_log(self, project_id, command, hypara):
+        """
+        在项目容器中执行训练或推理：支持分帧协议的容器复用一个连接并发处理请求并返回结构化结果，
+        旧版容器通过 stdin 写入命令、按完成标记读取日志，同一容器依次执行；
+        相同参数文件和相同输入的推理结果直接从缓存返回；容器因空闲被暂停或停止时先恢复
+        """
         from models import Project
-        container_name = f"project_{project_id}"
-        container = self.containers[container_name]
-
-        print(container.id)
-        socket = self.docker_client.api.attach_socket(container.id,
-                                                      params={'stdin': 1, 'stream': 1, 'stdout': 1, 'stderr': 1})
-
         project = await Project.find_by_id(project_id)
-        hyper_parameters = {}
-        hyper_parameter_list = await Hypara.find_by_project_id(project_id)
-        for file_path in hyper_parameter_list:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-                hyper_parameters.update(data)
-
-        hyper_parameters['train_dataset_id'] = project.train_dataset_id
-        hyper_parameters['test_dataset_id'] = project.test_dataset_id
-        hyper_parameters = json.dumps(hyper_parameters)
-        hyper_parameters += "\n"
-
+        cache_key = None
+        if command == "predict":
+            cache_key = await asyncio.to_thread(predict_cache.key_for, project_id, project.predict_generation,
+                                                project.store_path, hypara)
+            entry = predict_cache.get(cache_key) if cache_key is not None else None
+            if entry is not None:
+                for line in entry.lines:
+                    await self._emit_line(project_id, line, command)
+                archive = await get_archive(project_id)
+                await archive.flush()
+                return ResultGenerator.gen_success_result(message="项目推理完成", data=entry.data)
+
+        self.reaper.begin(project_id)
+        try:
+            container = await self.ensure_container(project)
+        except Exception as e:
+            self.reaper.end(project_id)
+            print(f"[ERROR] 恢复项目 {project_id} 的容器失败: {e}")
+            return ResultGenerator.gen_fail_result(message=f"项目容器恢复失败: {e}")
         await Project.update_project_status_by_id(project_id, "running")
-
-        print(command, hypara, hyper_parameters)
-        # 向容器发送命令
-        socket._sock.send(f"{command}\n".encode())
         if command == "train":
-            socket._sock.send(hyper_parameters.encode())
-            socket._sock.send("\n".encode())
+            MetricExtractor.start_run(project_id, project.store_path)
+            params = await self._hyper_parameters(project)
         else:
-            socket._sock.send(f"{hypara}\n".encode())
+            params = hypara
 
         try:
-            # 实时获取日志
-            # 日志利用 WebSocket 发送给前端
-            # 如果这里不要 buffer 的话，那么将一个字符作为一个消息传递给前端
-            buffer = ""
-            last_chunk_time = 0
-
-            for line in container.logs(stream=True, follow=True):
-                chunk = line.decode('utf-8', errors='ignore')
-                buffer += chunk
-
-                now = time.time()
-
-                if ("TRAIN_COMPLETE" in buffer) or ("PREDICT_COMPLETE" in buffer):
-                    break
-
-                # 优先处理完整行
-                if '\n' in buffer:
-                    while '\n' in buffer:
-                        full_line, buffer = buffer.split('\n', 1)
-                        full_line = full_line.strip()
-                        if full_line:
-                            print(full_line, buffer)
-                            await broadcast_to_project(project_id, full_line, command)
-                        last_chunk_time = 0  # 只在成功发送一行后才更新时间
-                elif last_chunk_time == 0:
-                    last_chunk_time = now
-                elif buffer.strip() and (last_chunk_time != 0) and (now - last_chunk_time > 1):
-                    flushed = buffer.strip()
-                    if flushed:
-                        print(flushed)
-                        await broadcast_to_project(project_id, flushed, command)
-                    buffer = ""
-                    last_chunk_time = now
-
-            # 等待容器真正执行完成
-            container.reload()  # 更新容器状态
-
+            channel = await self._open_channel(container)
+            if channel is None:
+                started = time.perf_counter()
+                async with self._stdin_locks.setdefault(container.id, asyncio.Lock()):
+                    lines = await self._exec_stdin(project_id, container, command, params)
+                data = None
+                # 只缓存读到完成标记的推理，日志流中途断开的结果不完整
+                if cache_key is not None and lines is not None:
+                    predict_cache.put(cache_key, data, lines, time.perf_counter() - started)
+            else:
+                lines = []
+
+                async def on_log(line: str):
+                    lines.append(line)
+                    await self._emit_line(project_id, line, command)
+
+                # 容器提供常驻模型时推理请求交给常驻模型，不再每次加载参数
+                op = "serve" if command == "predict" and "serve" in channel.ops else command
+                started = time.perf_counter()
+                frame = await channel.request(op, params, on_log=on_log)
+                data = frame.get("data")
+                if cache_key is not None:
+                    predict_cache.put(cache_key, data, lines, time.perf_counter() - started)
+            archive = await get_archive(project_id)
+            await archive.flush()
+            if channel is None or not channel.inflight:
+                await Project.update_project_status_by_id(project_id, "wait")
+            return ResultGenerator.gen_success_result(
+                message=f'项目{"推理完成" if command == "predict" else "训练完成"}', data=data)
+
+        except ContainerRequestError as e:
+            # 模型代码抛出的异常，容器仍可继续处理请求
+            await self._emit_line(project_id, f"[ERROR] {e}", command)
+            archive = await get_archive(project_id)
+            await archive.flush()
             await Project.update_project_status_by_id(project_id, "wait")
-            return ResultGenerator.gen_success_result(message=f'项目{ "推理完成" if command == "predict" else "训练完成"}')
+            return ResultGenerator.gen_fail_result(message=f"[ERROR] {e}", data={"traceback": e.details})
 
         except Exception as e:
             await self.stop_container(project_id, await Project.find_by_id(project_id))
             print(f"[ERROR] moca {e}")
             return ResultGenerator.gen_error_result(code=500, message=f"[ERROR] {e}")
 
+        finally:
+            self.reaper.end(project_id)
+            if command == "train":
+                # 训练可能更新了容器中的参数，之前的推理结果不再可用
+                await predict_cache.expire(project_id)
+
+    async def ensure_container(self, project):
+        """
+        返回正在运行的项目容器：被空闲回收暂停的容器 unpause，停止的容器重新启动（保留容器中训练得到的参数），
+        容器已不存在时从模型镜像重建（优先租用预热容器）；各方式的恢复延迟记录在 reaper 中
+        """
+        project_id = project.project_id
+        container_name = f"project_{project_id}"
+        container = self.containers.get(container_name)
+        entry = self.state.container(container_name)
+        if container is not None and entry is not None and entry.id == container.id and entry.status == "running":
+            return container
+
+        async with self._resume_locks.setdefault(container_name, asyncio.Lock()):
+            started = time.perf_counter()
+            # 容器可能由其他 worker 创建或恢复，本 worker 没有缓存
+            container = await self.engine.find_container(container_name)
+            if container is None:
+                tier = RESUME_RECREATE
+                container = await self._recreate_container(project)
+            elif container.status == "paused":
+                tier = RESUME_UNPAUSE
+                await self.engine.unpause(container)
+            elif container.status != "running":
+                tier = RESUME_START
+                await self._reserve(project_id, self._container_cpu(container))
+                await self.engine.start(container)
+                # 进程重新启动，旧的通道已失效
+                self.close_channel(container_name)
+            else:
+                tier = None
+            if tier is not None:
+                elapsed = time.perf_counter() - started
+                self.reaper.record_resume(tier, elapsed)
+                self.state.observe_container(container.id, container_name,
+                                             (container.attrs.get("Config") or {}).get("Image", ""), "running")
+                print(f"项目 {project_id} 的容器已恢复（{tier}，{elapsed * 1000:.0f}ms）")
+            self.containers[container_name] = container
+            return container
+
+    async def _reserve(self, project_id, cpu: float):
+        """恢复容器前重新预留 CPU/内存，主机已满时排队等待"""
+        await self.ledger.refresh(self.engine)
+        ticket = self.ledger.request(project_id, cpu, PROJECT_MEMORY)
+        if not ticket.admitted and not await ticket.wait():
+            raise RuntimeError("主机资源不足")
+
+    async def _recreate_container(self, project):
+        from models import Project
+        image_name = f"{project.model_id}:latest"
+        if not self.state.has_image(image_name):
+            raise RuntimeError(f"镜像 {image_name} 不存在")
+        await self._reserve(project.project_id, PROJECT_CPU)
+        result = await self._start_project_container(image_name, project.project_id, None, PROJECT_CPU, Project)
+        if result["resultCode"] != ResultGenerator.RESULT_CODE_SUCCESS:
+            raise RuntimeError(result["message"])
+        return self.containers[f"project_{project.project_id}"]
+
+    @staticmethod
+    def _container_cpu(container) -> float:
+        host_config = container.attrs.get("HostConfig") or {}
+        quota, period = host_config.get("CpuQuota") or 0, host_config.get("CpuPeriod") or 0
+        return quota / period if quota > 0 and period > 0 else PROJECT_CPU
+
+    @staticmethod
+    async def _hyper_parameters(project) -> dict:
+        """合并项目的超参数文件，附加训练集和测试集 ID"""
+        hyper_parameters = {}
+        for file_path in await Hypara.find_by_project_id(project.project_id):
+            with open(file_path, 'r') as file:
+                hyper_parameters.update(json.load(file))
+        hyper_parameters['train_dataset_id'] = project.train_dataset_id
+        hyper_parameters['test_dataset_id'] = project.test_dataset_id
+        return hyper_parameters
+
+    async def _open_channel(self, container) -> Optional[ContainerChannel]:
+        """返回容器的协议通道，第一次使用时握手；不支持协议的旧版容器返回 None"""
+        if self._is_legacy(container):
+            return None
+        async with self._channel_locks.setdefault(container.id, asyncio.Lock()):
+            # 等锁期间其他请求可能已经握手失败
+            if self._is_legacy(container):
+                return None
+            channel = self.channels.get(container.name)
+            if channel is not None and not channel.closed and channel.container_id == container.id:
+                return channel
+            if channel is not None:
+                channel.close()
+            channel = await ContainerChannel(self.engine, container.id).open(self.docker_client.api)
+            if not await channel.hello():
+                print(f"容器 {container.name} 不支持分帧协议，使用 stdin 模式")
+                channel.close()
+                self.legacy_containers.add(container.id)
+                image_id = container.attrs.get("Image")
+                if image_id and self._uptime(container) > STARTUP_GRACE:
+                    self.legacy_images.add(image_id)
+                self.channels.pop(container.name, None)
+                return None
+            self.channels[container.name] = channel
+            return channel
+
+    def supports_concurrent_predict(self, project_id) -> bool:
+        """
+        项目容器的镜像带有分帧协议标签时可以并发推理；没有标签（旧版 stdin 入口或加标签之前构建的镜像）、
+        容器不存在或本进程已确认握手失败时按旧版容器处理。标签来自守护进程，各 worker 的判断一致
+        """
+        entry = self.state.container(f"project_{project_id}")
+        return entry is not None and entry.labels.get(PROTOCOL_LABEL) == PROTOCOL_FRAMED \
+            and entry.id not in self.legacy_containers
+
+    def _is_legacy(self, container) -> bool:
+        return container.id in self.legacy_containers or container.attrs.get("Image") in self.legacy_images
+
+    @staticmethod
+    def _uptime(container) -> float:
+        """容器进程已运行的秒数，无法解析启动时间时返回 0"""
+        started = (container.attrs.get("State") or {}).get("StartedAt") or ""
+        try:
+            started_at = datetime.strptime(started[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return 0
+        return (datetime.now(timezone.utc) - started_at).total_seconds()
+
+    def close_channel(self, container_name: str):
+        channel = self.channels.pop(container_name, None)
+        if channel is not None:
+            channel.close()
+
+    async def _exec_stdin(self, project_id, container, command, params) -> Optional[List[str]]:
+        """旧版 stdin 模式：写入命令和参数两行，读取日志直到出现完成标记；返回输出的各行，没有读到完成标记时返回 None"""
+        socket = await self.engine.run("attach", self.docker_client.api.attach_socket, container.id,
+                                       params={'stdin': 1, 'stream': 1, 'stdout': 1, 'stderr': 1})
+        if command == "train":
+            payload = f"{command}\n{json.dumps(params)}\n\n"
+        else:
+            payload = f"{command}\n{params}\n"
+        # 只读取写入命令之后的日志：follow 默认从头回放，之前命令的输出和完成标记会被当作本次结果
+        since = time.time()
+        await self.engine.run("attach", socket._sock.sendall, payload.encode())
+
+        # 日志在后台线程中读取，经有界队列交给事件循环，不阻塞其他请求；
+        # 按行切分后发送，不完整的行超过 1 秒仍未换行时直接发送
+        framer = LineFramer()
+        emitted = []
+        async with ContainerLogReader(container, since=since) as reader:
+            while not framer.complete:
+                try:
+                    chunk = await reader.get(timeout=framer.flush_after)
+                except StopAsyncIteration:
+                    break
+                now = time.time()
+                lines = framer.feed(chunk, now) if chunk is not None else []
+                partial = framer.poll(now)
+                if partial:
+                    lines.append(partial)
+                for line in lines:
+                    emitted.append(line)
+                    await self._emit_line(project_id, line, command)
+        rest = framer.flush()
+        if rest:
+            emitted.append(rest)
+            await self._emit_line(project_id, rest, command)
+        # 等待容器真正执行完成
+        await self.engine.reload(container)
+        return emitted if framer.complete else None
+
+    @staticmethod
+    async def _emit_line(project_id, line: str, command: str):
+        """处理容器输出的一行：推送给订阅者、写入日志归档并提取训练指标"""
+        await broadcast_to_project(project_id, line, command)
+        archive = await get_archive(project_id)
+        archive.append(line)
+        if command == "train":
+            run = MetricExtractor.current_run(project_id)
+            if run is not None:
+                run.feed(line)
+
     async def stop_container(self, project_id: int, project):
         from models import Project
         container_name = f"project_{project_id}"
         print(f"container_name: {project_id }")
 
         try:
-            containers = self.docker_client.containers.list(all=True)
-
-            # 输出所有容器的容器名称和容器 ID
-            print("当前 Docker 中的所有容器：")
-            for container in containers:
-                print(f"Container Name: {container.name}, Container ID: {container.id}, Status: {container.status}")
-            container = self.docker_client.containers.get(container_name)
-            container.stop()
-            container.remove()
+            container = await self.engine.get_container(container_name)
+            await self.engine.stop(container)
+            await self.engine.remove(container)
+            self.containers.pop(container_name, None)
+            self.close_channel(container_name)
+            await predict_cache.expire(project_id)
+            self.ledger.release(project_id)
 
             # 更新项目状态
             await Project.update_project_status_by_id(project_id, "stopped")
 
-            # 移除容器名记录
-            self.container_name_to_id.pop(container_name, None)
-
             return ResultGenerator.gen_success_result(message=f"暂停容器 {container_name} 成功")
 
+        except NotFound:
+            # 容器不存在（例如仍在排队），只释放预留或取消排队
+            self.ledger.release(project_id)
+            await Project.update_project_status_by_id(project_id, "stopped")
+            return ResultGenerator.gen_success_result(message=f"容器 {container_name} 不存在，已取消")
+
         except Exception as e:
             print(f"[ERROR] 停止容器失败: {e}")
             return ResultGenerator.gen_error_result(code=500, message="停止容器时出错")
 
-    def list_images(self):
-        """列出所有镜像"""
-        images = self.docker_client.images.list()
-        result = []
-        for image in images:
-            print(image)
-            if image.tags:
-                for tag in image.tags:
-                    result.append(tag)
-            else:
-                result.append("untagged")
-        return result
+    async def remove_project_container(self, project_id: int):
+        """删除项目在本主机上的容器（项目被调度到其他主机时调用），不修改项目状态"""
+        container_name = f"project_{project_id}"
+        try:
+            container = await self.engine.find_container(container_name)
+            if container is not None:
+                await self.engine.remove(container, force=True)
+        except Exception as e:
+            print(f"[ERROR] 删除容器 {container_name} 失败: {e}")
+        self.containers.pop(container_name, None)
+        self.close_channel(container_name)
+        await predict_cache.expire(project_id)
+        self.ledger.release(project_id)
 
 
 def windows_path_to_docker(windows_path: str) -> str:
@@ -1,11 +1,14 @@
 import docker
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastapi import HTTPException
 import asyncio
 
 from utils.DockerCore import DockerCore
-from utils.ImageList import ImageList
+from utils.Scheduler import PlacementScheduler, PROJECT_CPU, PROJECT_MEMORY
+
+# 未记录主机的项目（例如调度器上线前创建的）使用的主机
+DEFAULT_HOST = 'tcp://localhost:2375'
 
 
 class DockerFactory:
@@ -15,6 +18,8 @@ class DockerFactory:
     docker_client_pool: Dict[str, Any] = {}
     # 存储了 Docker 主机地址的列表
     hosts: List[str] = []
+    # 为新的项目容器选择主机
+    scheduler = PlacementScheduler(docker_client_pool)
 
     def __init__(self):
         self.docker_factory = self
@@ -29,7 +34,6 @@ class DockerFactory:
         if host:
             try:
                 docker_core = DockerCore(host)
-                ImageList.load_docker_images(docker_core)  # Assuming async version
                 self.docker_client_pool[host] = docker_core
                 return 200
             except Exception as e:
@@ -49,6 +53,52 @@ class DockerFactory:
             results.append(404)
         return results
 
+    # 按主机地址获取 DockerCore
+    @staticmethod
+    def get_docker_core(host: Optional[str] = None) -> Optional[DockerCore]:
+        pool = DockerFactory.docker_client_pool
+        if host and host in pool:
+            return pool[host]
+        if DEFAULT_HOST in pool:
+            return pool[DEFAULT_HOST]
+        return next(iter(pool.values()), None)
+
+    # 获取项目容器所在主机的 DockerCore
+    @staticmethod
+    def for_project(project) -> Optional[DockerCore]:
+        return DockerFactory.get_docker_core(getattr(project, "docker_host", None))
+
+    # 为项目容器选择主机并申请资源，返回 (DockerCore, 资源申请)；没有主机能容纳时返回 (None, None)
+    @staticmethod
+    async def place_project(project, image_name: str, cpu_need: Optional[float] = None):
+        cpu_need = cpu_need or PROJECT_CPU
+        host = await DockerFactory.scheduler.place(image_name, cpu_need, PROJECT_MEMORY)
+        if host is None:
+            return None, None
+        pool = DockerFactory.docker_client_pool
+        # 选择主机后立即预留，并发的放置请求才能看到这次占用
+        ticket = pool[host].ledger.request(project.project_id, cpu_need, PROJECT_MEMORY)
+        previous = getattr(project, "docker_host", None)
+        if previous and previous != host and previous in pool:
+            # 项目换到了新主机，清理旧主机上的容器
+            asyncio.create_task(pool[previous].remove_project_container(project.project_id))
+        return pool[host], ticket
+
+    # 服务启动时开始回收各主机上空闲的项目容器
+    @staticmethod
+    async def startup() -> None:
+        for docker_core in DockerFactory.docker_client_pool.values():
+            docker_core.reaper.ensure_started()
+
+    # 服务关闭时删除各主机的预热容器，停止订阅事件、资源采集和空闲回收
+    @staticmethod
+    async def shutdown() -> None:
+        for docker_core in DockerFactory.docker_client_pool.values():
+            await docker_core.warm_pool.close()
+            await docker_core.reaper.close()
+            docker_core.resources.close()
+            docker_core.state.close()
+
     # 将 Docker 主机列表写入文件
     async def hosts_to_string(self, pathname: str = "./resources/hosts.txt") -> None:
         """ Saves the list of hosts to the specified file """
@@ -0,0 +1,254 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import docker
+
+# 订阅的事件类型
+EVENT_FILTERS = {"type": ["image", "container"]}
+# 事件流断开后的重连间隔（秒）
+RECONNECT_DELAY = 5
+# 重连时从断开前多少秒开始回放事件，重复的事件按幂等方式处理
+REPLAY_MARGIN = 5
+
+# 容器事件对应的状态，未列出的事件不改变状态
+CONTAINER_STATUS = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+}
+# 需要重新读取镜像信息的镜像事件
+IMAGE_REFRESH_ACTIONS = {"tag", "untag", "pull", "import", "load", "build"}
+
+
+def normalize_tag(name: str) -> str:
+    """没有标签的镜像名补上 :latest（仓库地址中的端口号不算标签）"""
+    return name if ":" in name.rsplit("/", 1)[-1] else f"{name}:latest"
+
+
+class ImageEntry:
+    __slots__ = ("id", "tags", "digests")
+
+    def __init__(self, image_id: str, tags: Set[str], digests: Set[str]):
+        self.id = image_id
+        self.tags = tags
+        self.digests = digests
+
+
+class ContainerEntry:
+    __slots__ = ("id", "name", "image", "status", "labels")
+
+    def __init__(self, container_id: str, name: str, image: str, status: str, labels: Dict[str, str]):
+        self.id = container_id
+        self.name = name
+        self.image = image
+        self.status = status
+        self.labels = labels
+
+
+class DockerStateCache:
+    """
+    单台主机镜像和容器状态的本地缓存：启动时列出一次，之后由 Docker 事件流保持更新，
+    镜像按标签、摘要和 ID 索引，容器按名称和 ID 索引，查询不访问守护进程
+    """
+
+    def __init__(self, client: docker.DockerClient):
+        # 事件流是长连接，使用不设超时的客户端
+        self.client = client
+        self.images: Dict[str, ImageEntry] = {}
+        self.image_by_ref: Dict[str, str] = {}  # 标签或摘要 -> 镜像 ID
+        self.containers: Dict[str, ContainerEntry] = {}
+        self.container_by_name: Dict[str, str] = {}  # 容器名 -> 容器 ID
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stream = None
+        self._closed = False
+        self.seeded_at = 0.0
+        self.events = 0
+        self.reconnects = 0
+
+    def start(self):
+        """列出一次镜像和容器，然后在后台线程中订阅事件"""
+        self.seed()
+        self._thread = threading.Thread(target=self._watch, daemon=True,
+                                        name=f"docker-events-{self.client.api.base_url}")
+        self._thread.start()
+
+    def seed(self):
+        started = time.time()
+        images = self.client.api.images()
+        containers = self.client.api.containers(all=True)
+        with self._lock:
+            self.images.clear()
+            self.image_by_ref.clear()
+            self.containers.clear()
+            self.container_by_name.clear()
+            for image in images:
+                self._set_image(image["Id"], image.get("RepoTags"), image.get("RepoDigests"))
+            for container in containers:
+                name = (container.get("Names") or ["/"])[0].lstrip("/")
+                self._set_container(ContainerEntry(container["Id"], name, container.get("Image", ""),
+                                                   container.get("State", ""), container.get("Labels") or {}))
+        self.seeded_at = started
+
+    def close(self):
+        self._closed = True
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+
+    # ---------- 事件 ----------
+
+    def _watch(self):
+        since = self.seeded_at - REPLAY_MARGIN
+        while not self._closed:
+            try:
+                self._stream = self.client.events(decode=True, since=int(since), filters=EVENT_FILTERS)
+                for event in self._stream:
+                    since = event.get("time", since)
+                    self._apply(event)
+            except Exception as e:
+                if self._closed:
+                    break
+                print(f"[DockerState] {self.client.api.base_url} 事件流断开: {e}")
+            if not self._closed:
+                self.reconnects += 1
+                time.sleep(RECONNECT_DELAY)
+                since -= REPLAY_MARGIN
+
+    def _apply(self, event: dict):
+        self.events += 1
+        action = (event.get("Action") or event.get("status") or "").split(":")[0]
+        actor = event.get("Actor") or {}
+        object_id = actor.get("ID") or event.get("id")
+        attributes = actor.get("Attributes") or {}
+        try:
+            if event.get("Type") == "image":
+                if action == "delete":
+                    with self._lock:
+                        self._drop_image(object_id)
+                elif action in IMAGE_REFRESH_ACTIONS:
+                    self.refresh_image(object_id)
+            elif event.get("Type") == "container":
+                self._apply_container(action, object_id, attributes)
+        except Exception as e:
+            print(f"[DockerState] 处理事件 {event.get('Type')} {action} 失败: {e}")
+
+    def _apply_container(self, action: str, container_id: str, attributes: Dict[str, str]):
+        with self._lock:
+            entry = self.containers.get(container_id)
+            if action == "destroy":
+                if entry is not None:
+                    self._drop_container(entry)
+                return
+            if entry is None:
+                labels = {k: v for k, v in attributes.items() if k not in ("name", "image")}
+                entry = ContainerEntry(container_id, attributes.get("name", ""), attributes.get("image", ""),
+                                       "created", labels)
+                self._set_container(entry)
+            if action == "rename":
+                self.container_by_name.pop(entry.name, None)
+                entry.name = attributes.get("name", entry.name).lstrip("/")
+                self.container_by_name[entry.name] = entry.id
+            elif action in CONTAINER_STATUS:
+                entry.status = CONTAINER_STATUS[action]
+
+    # ---------- 更新 ----------
+
+    def refresh_image(self, name_or_id: str):
+        """重新读取一个镜像的标签和摘要，镜像已删除时移除"""
+        try:
+            image = self.client.api.inspect_image(name_or_id)
+        except docker.errors.ImageNotFound:
+            with self._lock:
+                self._drop_image(self.image_by_ref.get(name_or_id, name_or_id))
+            return
+        self.observe_image(image["Id"], image.get("RepoTags"), image.get("RepoDigests"))
+
+    def observe_image(self, image_id: str, tags, digests=None):
+        """记录本进程刚创建或打标签的镜像，不等待事件到达"""
+        with self._lock:
+            self._set_image(image_id, tags, digests)
+
+    def observe_container(self, container_id: str, name: str, image: str, status: str, labels=None):
+        with self._lock:
+            entry = self.containers.get(container_id)
+            if entry is not None and entry.name != name:
+                self.container_by_name.pop(entry.name, None)
+            self._set_container(ContainerEntry(container_id, name, image, status, labels or {}))
+
+    def _set_image(self, image_id: str, tags, digests):
+        tags = {tag for tag in (tags or ()) if tag and tag != "<none>:<none>"}
+        digests = {digest for digest in (digests or ()) if digest and not digest.startswith("<none>")}
+        previous = self.images.get(image_id)
+        if previous is not None:
+            for ref in previous.tags | previous.digests:
+                if self.image_by_ref.get(ref) == image_id:
+                    del self.image_by_ref[ref]
+        for ref in tags | digests:
+            # 标签从其他镜像移到这个镜像
+            owner = self.images.get(self.image_by_ref.get(ref))
+            if owner is not None and owner.id != image_id:
+                owner.tags.discard(ref)
+                owner.digests.discard(ref)
+            self.image_by_ref[ref] = image_id
+        self.images[image_id] = ImageEntry(image_id, tags, digests)
+
+    def _drop_image(self, image_id: str):
+        entry = self.images.pop(image_id, None)
+        if entry is None:
+            return
+        for ref in entry.tags | entry.digests:
+            if self.image_by_ref.get(ref) == image_id:
+                del self.image_by_ref[ref]
+
+    def _set_container(self, entry: ContainerEntry):
+        self.containers[entry.id] = entry
+        if entry.name:
+            self.container_by_name[entry.name] = entry.id
+
+    def _drop_container(self, entry: ContainerEntry):
+        self.containers.pop(entry.id, None)
+        if self.container_by_name.get(entry.name) == entry.id:
+            del self.container_by_name[entry.name]
+
+    # ---------- 查询 ----------
+
+    def image_id(self, ref: str) -> Optional[str]:
+        """按标签（缺省 latest）、摘要或 ID 查找镜像 ID"""
+        if ref in self.images:
+            return ref
+        if "@" in ref:
+            return self.image_by_ref.get(ref)
+        return self.image_by_ref.get(normalize_tag(ref))
+
+    def has_image(self, ref: str) -> bool:
+        return self.image_id(ref) is not None
+
+    def image_tags(self) -> List[str]:
+        with self._lock:
+            return [ref for ref in self.image_by_ref if "@" not in ref]
+
+    def container(self, name: str) -> Optional[ContainerEntry]:
+        container_id = self.container_by_name.get(name)
+        return self.containers.get(container_id) if container_id else None
+
+    def container_id(self, name: str) -> Optional[str]:
+        return self.container_by_name.get(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(entry.status == "running" for entry in self.containers.values())
+        return {
+            "images": len(self.images),
+            "tags": len(self.image_by_ref),
+            "containers": len(self.containers),
+            "running": running,
+            "events": self.events,
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Optional
+
+# 项目多久没有训练/推理后暂停容器（秒）：暂停后不再占用 CPU，恢复只需一次 unpause
+PAUSE_AFTER = int(os.environ.get("IDLE_PAUSE_AFTER", "900"))
+# 多久没有活动后停止容器（秒）：释放内存和资源预留，容器的文件系统（包括训练得到的参数）保留
+STOP_AFTER = int(os.environ.get("IDLE_STOP_AFTER", "3600"))
+# 检查间隔（秒）
+REAP_INTERVAL = int(os.environ.get("IDLE_REAP_INTERVAL", "60"))
+# 每种恢复方式保留的延迟样本数
+LATENCY_SAMPLES = 500
+
+TIER_PAUSE = "pause"
+TIER_STOP = "stop"
+# 恢复方式：暂停的容器 unpause，停止的容器重新 start，容器已不存在时从镜像（优先预热容器）重建
+RESUME_UNPAUSE = "unpause"
+RESUME_START = "start"
+RESUME_RECREATE = "recreate"
+
+
+class IdleReaper:
+    """
+    回收空闲的项目容器：按项目取最近一次训练/推理的时间，
+    空闲超过 PAUSE_AFTER 暂停容器，超过 STOP_AFTER 停止容器并释放资源预留；
+    执行中的项目不会被回收，下一次请求由 DockerCore.ensure_container 透明地恢复。
+    多个 worker 共用同一批容器，活动时间和执行状态以 job 表为准（所有 worker 的任务都在其中），
+    本进程的记录只补充任务表之外的活动（例如刚创建的容器）
+    """
+
+    def __init__(self, core):
+        self.core = core
+        self.last_active: Dict[str, float] = {}
+        self.busy: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self.reaped: Dict[str, Dict[str, int]] = {tier: {"count": 0, "memory": 0} for tier in (TIER_PAUSE, TIER_STOP)}
+        self.failed = 0
+        self.latencies: Dict[str, Deque[float]] = {
+            tier: deque(maxlen=LATENCY_SAMPLES) for tier in (RESUME_UNPAUSE, RESUME_START, RESUME_RECREATE)
+        }
+
+    # ---------- 活动记录 ----------
+
+    def touch(self, project_id):
+        self.last_active[str(project_id)] = time.time()
+        self.ensure_started()
+
+    def begin(self, project_id):
+        """项目开始执行训练或推理，执行期间不会被回收"""
+        self.busy[str(project_id)] += 1
+        self.touch(project_id)
+
+    def end(self, project_id):
+        project_id = str(project_id)
+        self.busy[project_id] -= 1
+        if self.busy[project_id] <= 0:
+            del self.busy[project_id]
+        self.touch(project_id)
+
+    def record_resume(self, tier: str, seconds: float):
+        self.latencies[tier].append(seconds * 1000)
+
+    # ---------- 回收 ----------
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            try:
+                await self.reap()
+            except Exception as e:
+                print(f"[IdleReaper] 回收失败: {e}")
+
+    async def reap(self, now: Optional[float] = None):
+        """检查一次所有项目容器，返回本次暂停和停止的项目"""
+        from models import Job
+        now = now if now is not None else time.time()
+        result = {TIER_PAUSE: [], TIER_STOP: []}
+        candidates = [entry for entry in list(self.core.state.containers.values())
+                      if entry.name.startswith("project_") and entry.name[len("project_"):].isdigit()
+                      and entry.status in ("running", "paused")]
+        if not candidates:
+            return result
+        # 查询失败时抛出异常，这一轮不回收，避免误停其他 worker 正在使用的容器
+        active, finished = await Job.project_activity([int(entry.name[len("project_"):]) for entry in candidates])
+        for entry in candidates:
+            project_id = entry.name[len("project_"):]
+            if self.busy[project_id] > 0 or int(project_id) in active:
+                continue
+            # 第一次看到的容器（例如服务重启前或其他 worker 创建的）从现在开始计时
+            last_active = self.last_active.setdefault(project_id, now)
+            if int(project_id) in finished:
+                last_active = max(last_active, finished[int(project_id)].timestamp())
+            idle = now - last_active
+            if idle >= STOP_AFTER:
+                tier = TIER_STOP
+            elif idle >= PAUSE_AFTER and entry.status == "running":
+                tier = TIER_PAUSE
+            else:
+                continue
+            try:
+                # 查询之后其他 worker 可能刚领取了这个项目的任务
+                if int(project_id) in (await Job.project_activity([int(project_id)]))[0]:
+                    continue
+                await self._reap(project_id, entry, tier)
+                result[tier].append(project_id)
+            except Exception as e:
+                self.failed += 1
+                print(f"[IdleReaper] 回收项目 {project_id} 的容器失败: {e}")
+        return result
+
+    async def _reap(self, project_id: str, entry, tier: str):
+        engine = self.core.engine
+        container = await engine.get_container(entry.id)
+        memory = await self._memory_usage(container)
+        if tier == TIER_PAUSE:
+            await engine.pause(container)
+        else:
+            if container.status == "paused":
+                await engine.unpause(container)
+            await engine.stop(container)
+            # 进程已退出：关闭通道，释放 CPU/内存预留
+            self.core.close_channel(entry.name)
+            self.core.ledger.release(project_id)
+        self.reaped[tier]["count"] += 1
+        self.reaped[tier]["memory"] += memory
+        print(f"[IdleReaper] 项目 {project_id} 空闲，已{'暂停' if tier == TIER_PAUSE else '停止'}容器，"
+              f"内存 {memory / 1024 ** 2:.1f}MB")
+
+    async def _memory_usage(self, container) -> int:
+        try:
+            stats = await self.core.engine.container_stats(container)
+        except Exception:
+            return 0
+        memory = stats.get("memory_stats") or {}
+        # 与 docker stats 相同，扣除可回收的页缓存
+        cache = (memory.get("stats") or {}).get("inactive_file", 0)
+        return max(memory.get("usage", 0) - cache, 0)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def stats(self) -> dict:
+        resume = {}
+        for tier, samples in self.latencies.items():
+            ordered = sorted(samples)
+            resume[tier] = {
+                "count": len(ordered),
+                "p50_ms": round(statistics.median(ordered), 2) if ordered else None,
+                "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2) if ordered else None,
+            }
+        return {
+            "pause_after": PAUSE_AFTER,
+            "stop_after": STOP_AFTER,
+            "busy": len(self.busy),
+            "paused": self.reaped[TIER_PAUSE],
+            "stopped": self.reaped[TIER_STOP],
+            "memory_reclaimed": self.reaped[TIER_STOP]["memory"],
+            "failed": self.failed,
+            "resume": resume,
+        }
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional, Set
+
+from utils.BaseImage import LayeredBuild, plan_layered_build
+from utils.WebSocketConfig import broadcast_to_project
+
+# 构建结果按上下文哈希额外打上的标签，内容相同的上下文直接复用
+CACHE_REPOSITORY = "aiforge-build"
+# 计算哈希时忽略的文件和目录，不影响镜像运行
+IGNORED_NAMES = {"__pycache__", ".idea", ".git", ".DS_Store"}
+HASH_CHUNK = 1024 * 1024
+
+# 构建状态
+BUILD_HASHING = "hashing"
+BUILD_BUILDING = "building"
+BUILD_SUCCEEDED = "succeeded"
+BUILD_FAILED = "failed"
+
+
+def context_hash(path: str) -> str:
+    """构建上下文（Dockerfile、requirements.txt 和源码）的内容哈希，按相对路径排序依次计入路径、大小和内容"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES)
+        for name in sorted(files):
+            if name in IGNORED_NAMES:
+                continue
+            full_path = os.path.join(root, name)
+            relative = os.path.relpath(full_path, path).replace(os.sep, "/")
+            digest.update(f"{relative}\0{os.path.getsize(full_path)}\0".encode("utf-8"))
+            with open(full_path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_build_context(path: str) -> str:
+    """模型目录下包含 Dockerfile 的目录（上传的压缩包解压后通常多一层目录）"""
+    if os.path.isfile(os.path.join(path, "Dockerfile")):
+        return path
+    for name in sorted(os.listdir(path)):
+        candidate = os.path.join(path, name)
+        if os.path.isfile(os.path.join(candidate, "Dockerfile")):
+            return candidate
+    return path
+
+
+def _format_output(chunk: dict) -> Optional[str]:
+    """把一条构建输出转为一行文本，空行返回 None"""
+    if "stream" in chunk:
+        line = chunk["stream"].strip()
+    elif "status" in chunk:
+        line = " ".join(part for part in (chunk.get("id"), chunk["status"], chunk.get("progress")) if part)
+    else:
+        return None
+    return line or None
+
+
+class BuildRecord:
+    """一次镜像构建请求的状态"""
+    __slots__ = ("image", "channel", "key", "status", "cached", "coalesced", "error", "started",
+                 "finished", "task")
+
+    def __init__(self, image: str, channel: Optional[str] = None):
+        self.image = image
+        self.channel = channel
+        self.key = None
+        self.status = BUILD_HASHING
+        self.cached = False
+        self.coalesced = False
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (BUILD_SUCCEEDED, BUILD_FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "image": self.image,
+            "key": self.key,
+            "status": self.status,
+            "cached": self.cached,
+            "coalesced": self.coalesced,
+            "error": self.error,
+            "duration": round((self.finished or time.time()) - self.started, 2),
+        }
+
+
+class ImageBuilder:
+    """
+    单台主机的镜像构建：按构建上下文的内容哈希缓存镜像，已有相同哈希的镜像时只打标签，
+    同一哈希的并发构建合并为一次；依赖相同的模型共享 aiforge-base 基础镜像；
+    构建在后台执行，输出通过 /ws 推送给发起者的频道
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.records: Dict[str, BuildRecord] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._channels: Dict[str, Set[str]] = {}
+        self._bases: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.builds = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.base_builds = 0
+        self.base_hits = 0
+
+    def submit(self, image_name: str, context_dir: str, channel: Optional[str] = None,
+               temporary: bool = False, labels: Optional[Dict[str, str]] = None) -> BuildRecord:
+        """
+        提交后台构建并立即返回，构建结果见 record.task；
+        temporary 为 True 时 context_dir 是临时目录，不再需要时（包括构建在等待者取消后才结束）删除；
+        labels 写入镜像，并计入缓存的哈希
+        """
+        record = BuildRecord(image_name, channel)
+        self.records[image_name] = record
+        record.task = asyncio.create_task(self._process(record, os.path.abspath(context_dir), temporary,
+                                                        labels or {}))
+        self._tasks.add(record.task)
+        record.task.add_done_callback(self._tasks.discard)
+        return record
+
+    async def build(self, image_name: str, context_dir: str, channel: Optional[str] = None,
+                    temporary: bool = False, labels: Optional[Dict[str, str]] = None) -> BuildRecord:
+        """构建并等待完成"""
+        record = self.submit(image_name, context_dir, channel, temporary, labels)
+        return await record.task
+
+    def _discard_context(self, context_dir: str):
+        task = asyncio.ensure_future(asyncio.to_thread(shutil.rmtree, context_dir, True))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def find(self, image_name: str) -> Optional[BuildRecord]:
+        return self.records.get(image_name)
+
+    async def _process(self, record: BuildRecord, context_dir: str, temporary: bool = False,
+                       labels: Dict[str, str] = None) -> BuildRecord:
+        # 临时上下文交给实际执行的构建任务后，由该任务结束时删除
+        owned = temporary
+        try:
+            record.key = await asyncio.to_thread(context_hash, context_dir)
+            if labels:
+                # 没有标签时构建的旧缓存镜像不能复用
+                record.key = hashlib.sha256(f"{record.key}\0{json.dumps(labels, sort_keys=True)}".encode()).hexdigest()
+            cache_tag = f"{CACHE_REPOSITORY}:{record.key}"
+            image = await self.engine.find_image(cache_tag)
+            if image is not None:
+                record.cached = True
+                self.cache_hits += 1
+            else:
+                if record.channel:
+                    self._channels.setdefault(record.key, set()).add(record.channel)
+                task = self._inflight.get(record.key)
+                if task is None:
+                    task = asyncio.create_task(self._build(record.key, context_dir, cache_tag, labels))
+                    self._inflight[record.key] = task
+                    if owned:
+                        task.add_done_callback(lambda _: self._discard_context(context_dir))
+                        owned = False
+                else:
+                    record.coalesced = True
+                    self.coalesced += 1
+                record.status = BUILD_BUILDING
+                await self._publish(record.channel, record.to_dict())
+                # 某个等待者被取消时不影响其他等待同一构建的请求
+                image = await asyncio.shield(task)
+            repository, _, tag = record.image.partition(":")
+            await self.engine.tag_image(image, repository, tag or "latest")
+            record.status = BUILD_SUCCEEDED
+            print(f"[Build] 镜像 {record.image} 就绪 (key={record.key[:12]}, cached={record.cached}, "
+                  f"coalesced={record.coalesced})")
+        except Exception as e:
+            print(f"[Build] 镜像 {record.image} 构建失败: {e}")
+            record.status = BUILD_FAILED
+            record.error = str(e)
+            self.failures += 1
+        finally:
+            if owned:
+                # 命中缓存或合并到其他上下文的构建，计算哈希后就不再需要
+                self._discard_context(context_dir)
+            record.finished = time.time()
+            await self._publish(record.channel, record.to_dict())
+        return record
+
+    async def _build(self, key: str, context_dir: str, cache_tag: str, labels: Dict[str, str] = None):
+        """
+        实际执行构建，返回镜像对象；同一 key 的所有等待者共享结果。
+        模板形式的 Dockerfile 拆成共享的依赖基础镜像和只复制源码的模型层
+        """
+        loop = asyncio.get_running_loop()
+        self.builds += 1
+
+        def on_output(chunk):
+            loop.call_soon_threadsafe(self._on_output, key, chunk)
+
+        try:
+            plan = await asyncio.to_thread(plan_layered_build, context_dir)
+            if plan is None:
+                image_id = await self.engine.build_stream(context_dir, cache_tag, on_output=on_output,
+                                                          labels=labels or None)
+            else:
+                await self._ensure_base(plan, on_output)
+                dockerfile = plan.materialize_overlay()
+                try:
+                    image_id = await self.engine.build_stream(context_dir, cache_tag, on_output=on_output,
+                                                              dockerfile=dockerfile, labels=labels or None)
+                finally:
+                    plan.cleanup(dockerfile)
+            image = await self.engine.find_image(image_id or cache_tag)
+            if image is None:
+                raise RuntimeError(f"构建完成但找不到镜像 {cache_tag}")
+            return image
+        finally:
+            self._inflight.pop(key, None)
+            self._channels.pop(key, None)
+
+    async def _ensure_base(self, plan: LayeredBuild, on_output):
+        """依赖基础镜像不存在时构建，同一依赖的并发构建合并为一次"""
+        if await self.engine.find_image(plan.base_tag) is not None:
+            self.base_hits += 1
+            return
+        task = self._bases.get(plan.key)
+        if task is None:
+            task = asyncio.create_task(self._build_base(plan, on_output))
+            self._bases[plan.key] = task
+            task.add_done_callback(lambda _: self._bases.pop(plan.key, None))
+        else:
+            self.base_hits += 1
+        await asyncio.shield(task)
+
+    async def _build_base(self, plan: LayeredBuild, on_output):
+        self.base_builds += 1
+        directory = await asyncio.to_thread(plan.materialize_base)
+        try:
+            await self.engine.build_stream(directory, plan.base_tag, on_output=on_output)
+        finally:
+            plan.cleanup(directory)
+
+    def _on_output(self, key: str, chunk: dict):
+        line = _format_output(chunk)
+        if line is None:
+            return
+        for channel in self._channels.get(key, ()):
+            asyncio.ensure_future(self._publish(channel, {"key": key, "line": line}))
+
+    @staticmethod
+    async def _publish(channel: Optional[str], message: dict):
+        if not channel:
+            return
+        try:
+            await broadcast_to_project(channel, json.dumps(message, ensure_ascii=False), "build")
+        except Exception as e:
+            print(f"[Build] 推送构建进度失败: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "builds": self.builds,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "base_builds": self.base_builds,
+            "base_hits": self.base_hits,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,235 @@
+import asyncio
+import bisect
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境只运行单个 worker，不需要跨进程加锁
+    fcntl = None
+
+# 每个压缩块最多包含的行数/未压缩字节数，读取时最多只需解压一个块
+BLOCK_LINES = 1000
+BLOCK_BYTES = 64 * 1024
+# 单个段文件的压缩后大小上限，超过后开启新段
+SEGMENT_BYTES = 8 * 1024 * 1024
+# 未满一个块的日志最长等待多久写盘（秒）
+FLUSH_INTERVAL = 1.0
+# 单次范围查询最多返回的行数
+MAX_RANGE_LINES = 5000
+
+# 索引记录：块首行号、块在段文件中的偏移、压缩后长度、行数
+_INDEX_RECORD = struct.Struct("<QQII")
+# 多个 worker 追加同一项目日志时互斥用的锁文件
+LOCK_NAME = ".lock"
+
+
+def logs_dir(project_id) -> str:
+    return os.path.join(os.getcwd(), "data", "Project", str(project_id), "logs")
+
+
+class _Segment:
+    """一个段文件 segment_<首行号>.log.z 及其稀疏索引 segment_<首行号>.idx"""
+
+    def __init__(self, directory: str, first_line: int):
+        self.first_line = first_line
+        name = f"segment_{first_line:012d}"
+        self.data_path = os.path.join(directory, name + ".log.z")
+        self.index_path = os.path.join(directory, name + ".idx")
+
+    def read_index(self) -> List[tuple]:
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, "rb") as f:
+            raw = f.read()
+        # 忽略写入中断留下的不完整记录
+        usable = len(raw) - len(raw) % _INDEX_RECORD.size
+        return [_INDEX_RECORD.unpack_from(raw, i) for i in range(0, usable, _INDEX_RECORD.size)]
+
+    def last_record(self) -> Optional[tuple]:
+        """只读取索引的最后一条完整记录"""
+        try:
+            with open(self.index_path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                usable = size - size % _INDEX_RECORD.size
+                if usable == 0:
+                    return None
+                f.seek(usable - _INDEX_RECORD.size)
+                return _INDEX_RECORD.unpack(f.read(_INDEX_RECORD.size))
+        except FileNotFoundError:
+            return None
+
+    def end_line(self) -> int:
+        """段中最后一行之后的行号"""
+        record = self.last_record()
+        return record[0] + record[3] if record else self.first_line
+
+
+class ProjectLogArchive:
+    """
+    项目训练日志归档：按块压缩后追加写入段文件，并为每个块记录行号索引，
+    范围查询只需定位并解压一个块；写盘在线程中批量完成，不阻塞事件循环。
+    多个 worker 可能追加同一项目的日志（例如任务被另一个 worker 领取），
+    每次写块前持有锁文件并从磁盘重新读取段列表和最后一个块的位置，不信任本进程缓存的行号和偏移
+    """
+
+    def __init__(self, project_id, directory: str = None):
+        self.project_id = project_id
+        self.directory = directory or logs_dir(project_id)
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._flush_task = None
+        self._timer = None
+        self._segments: List[_Segment] = []
+        self.next_line = 0
+        self._sync()
+
+    def _scan(self) -> List[_Segment]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [_Segment(self.directory, int(name[len("segment_"):-len(".log.z")]))
+                for name in sorted(os.listdir(self.directory))
+                if name.startswith("segment_") and name.endswith(".log.z")]
+
+    def _sync(self):
+        """从磁盘恢复段列表和下一行的行号；目录被重建、没有段文件时沿用当前行号"""
+        self._segments = self._scan()
+        if self._segments:
+            self.next_line = self._segments[-1].end_line()
+
+    # ---------- 写入 ----------
+
+    def append(self, line: str):
+        """记录一行日志，仅写入内存批次，满一个块或超时后由后台线程落盘"""
+        self._pending.append(line)
+        self._pending_bytes += len(line) + 1
+        if len(self._pending) >= BLOCK_LINES or self._pending_bytes >= BLOCK_BYTES:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(FLUSH_INTERVAL, self._schedule_flush)
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            lines = self._pending
+            self._pending = []
+            self._pending_bytes = 0
+            await asyncio.to_thread(self._write_blocks, lines)
+
+    async def flush(self):
+        """
+        等待所有已记录的日志写盘：所有写入都经过同一个 _flush_task，
+        不会有两个线程同时写块、打乱块的顺序；等待期间新追加的日志也一并写入
+        """
+        while self._pending or (self._flush_task is not None and not self._flush_task.done()):
+            self._schedule_flush()
+            await self._flush_task
+
+    def _write_blocks(self, lines: List[str]):
+        """按 BLOCK_LINES/BLOCK_BYTES 切分批次后逐块写入"""
+        block: List[str] = []
+        size = 0
+        for line in lines:
+            block.append(line)
+            size += len(line) + 1
+            if len(block) >= BLOCK_LINES or size >= BLOCK_BYTES:
+                self._write_block(block)
+                block = []
+                size = 0
+        if block:
+            self._write_block(block)
+
+    def _write_block(self, lines: List[str]):
+        data = zlib.compress(("\n".join(lines) + "\n").encode("utf-8"), 6)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_NAME), "ab") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                # 其他 worker 可能已经追加了块或开启了新段
+                self._sync()
+                segment = self._segments[-1] if self._segments else None
+                if segment is None or os.path.getsize(segment.data_path) >= SEGMENT_BYTES:
+                    segment = _Segment(self.directory, self.next_line)
+                    self._segments.append(segment)
+                with open(segment.data_path, "ab") as f:
+                    # 偏移取段文件的实际大小：写入中断留下的没有索引的数据也不会让后面的块错位
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(data)
+                # 数据写入后再写索引，读取方看到的索引总是指向完整的块
+                with open(segment.index_path, "ab") as f:
+                    f.write(_INDEX_RECORD.pack(self.next_line, offset, len(data), len(lines)))
+                self.next_line += len(lines)
+
+    # ---------- 读取 ----------
+
+    def line_count(self) -> int:
+        """已落盘的总行数，按磁盘上最后一个块计算，包括其他 worker 写入的日志"""
+        segments = self._scan()
+        return segments[-1].end_line() if segments else self.next_line
+
+    def read_lines(self, from_line: int = 0, limit: int = 100) -> List[str]:
+        """读取 [from_line, from_line + limit) 范围内已落盘的日志，只解压涉及的块"""
+        limit = max(min(limit, MAX_RANGE_LINES), 0)
+        from_line = max(from_line, 0)
+        if limit == 0:
+            return []
+        # 段列表从磁盘读取，其他 worker 开启的新段也能查到
+        segments = self._scan()
+        if not segments:
+            return []
+        result: List[str] = []
+        position = max(bisect.bisect_right([s.first_line for s in segments], from_line) - 1, 0)
+        for segment in segments[position:]:
+            index = segment.read_index()
+            block = max(bisect.bisect_right([record[0] for record in index], from_line) - 1, 0)
+            try:
+                f = open(segment.data_path, "rb")
+            except OSError:
+                # 段文件已被删除（例如项目目录被重建）
+                continue
+            with f:
+                for first_line, offset, length, count in index[block:]:
+                    if first_line + count <= from_line:
+                        continue
+                    f.seek(offset)
+                    try:
+                        lines = zlib.decompress(f.read(length)).decode("utf-8").split("\n")[:count]
+                    except (zlib.error, OSError, UnicodeDecodeError) as e:
+                        # 损坏的块（例如旧版本多个 worker 同时写入留下的）跳过，不影响其他块
+                        print(f"[LogArchive] 项目 {self.project_id} 的日志块 {segment.data_path}@{offset} 损坏: {e}")
+                        continue
+                    skip = max(from_line - first_line, 0)
+                    result.extend(lines[skip:skip + limit - len(result)])
+                    if len(result) >= limit:
+                        return result
+        return result
+
+
+_archives: Dict[str, ProjectLogArchive] = {}
+# 正在扫描已有段文件的项目，并发的第一次访问共用一次扫描
+_loading: Dict[str, asyncio.Task] = {}
+
+
+async def get_archive(project_id) -> ProjectLogArchive:
+    """返回项目的日志归档；第一次使用时在线程中读取已有段文件的索引，不阻塞事件循环"""
+    project_id = str(project_id)
+    archive = _archives.get(project_id)
+    if archive is not None:
+        return archive
+    task = _loading.get(project_id)
+    if task is None:
+        task = _loading[project_id] = asyncio.create_task(asyncio.to_thread(ProjectLogArchive, project_id))
+        task.add_done_callback(lambda _: _loading.pop(project_id, None))
+    archive = await asyncio.shield(task)
+    return _archives.setdefault(project_id, archive)
@@ -0,0 +1,219 @@
+import asyncio
+import codecs
+import threading
+from typing import List, Optional
+
+# 读取线程结束时放入队列的哨兵
+_END = object()
+# 容器端命令执行完成的标记
+COMPLETE_SENTINELS = ("TRAIN_COMPLETE", "PREDICT_COMPLETE")
+# 不完整的行超过该时间（秒）仍未换行时直接输出
+PARTIAL_FLUSH_AFTER = 1.0
+# ContainerLogReader.get 一次最多合并的字节数
+COALESCE_BYTES = 256 * 1024
+
+
+class LineFramer:
+    """
+    把容器输出的字节流切分为行：
+    每个分块先按 UTF-8 解码（分块边界切断的多字节字符留到下一块），尚未换行的内容按分块保存在列表中，
+    只在新数据和未换行内容的最后几个字符中查找换行符和完成标记，遇到换行或完成标记时才拼接，整体为线性复杂度；
+    新数据中没有换行符、也没有完成标记的末字符时只追加到列表，小分块的开销与原先的字符串拼接相当
+    """
+
+    def __init__(self, sentinels=COMPLETE_SENTINELS, flush_after: float = PARTIAL_FLUSH_AFTER):
+        self._parts: List[str] = []
+        self._undecoded = b""
+        self._sentinels = list(sentinels)
+        # 完成标记只可能结束在新数据中，新数据不含任何标记的末字符时无需查找
+        self._tails = {sentinel[-1] for sentinel in self._sentinels}
+        # 完成标记可能跨越两个分块，需要回看的字符数
+        self._overlap = max((len(sentinel) for sentinel in self._sentinels), default=1) - 1
+        # 未换行内容的最后 _overlap 个字符，用于查找跨分块的完成标记
+        self._tail = ""
+        self._partial_since: Optional[float] = None
+        self.flush_after = flush_after
+        self.complete = False
+
+    def feed(self, chunk: bytes, now: float) -> List[str]:
+        """追加一个分块，返回其中完整的非空行；遇到完成标记时输出标记之前的内容并置 complete"""
+        if self.complete:
+            return []
+        if self._undecoded:
+            chunk = self._undecoded + chunk
+        text, consumed = codecs.utf_8_decode(chunk, "ignore", False)
+        self._undecoded = chunk[consumed:] if consumed < len(chunk) else b""
+        parts = self._parts
+        for tail in self._tails:
+            if tail in text:
+                break
+        else:
+            tail = None
+        if tail is not None:
+            # 只回看未换行内容的末尾，找到完成标记后才拼接整行
+            window = self._tail + text
+            end = len(window)
+            for sentinel in self._sentinels:
+                index = window.find(sentinel, 0, end)
+                if index != -1:
+                    end = index
+            if end < len(window):
+                head = "".join(parts)
+                pending = head[:len(head) - len(self._tail)] + window[:end]
+                self.complete = True
+                parts.clear()
+                self._tail = ""
+                self._partial_since = None
+                return [line for line in map(str.strip, pending.split("\n")) if line]
+
+        position = text.rfind("\n")
+        if position == -1:
+            if text:
+                parts.append(text)
+                self._keep_tail(text)
+                if self._partial_since is None:
+                    self._partial_since = now
+            return []
+        # 之前的内容不含换行符，从最后一个换行符处切开，之前的完整行一次性切分
+        if parts:
+            parts.append(text[:position])
+            complete = "".join(parts)
+            parts.clear()
+        else:
+            complete = text[:position]
+        rest = text[position + 1:]
+        self._tail = ""
+        if rest:
+            parts.append(rest)
+            self._keep_tail(rest)
+            self._partial_since = now
+        else:
+            self._partial_since = None
+        return [line for line in map(str.strip, complete.split("\n")) if line]
+
+    def _keep_tail(self, text: str):
+        tail = self._tail + text if len(text) < self._overlap else text
+        self._tail = tail[max(len(tail) - self._overlap, 0):]
+
+    def poll(self, now: float) -> Optional[str]:
+        """不完整的行等待超过 flush_after 秒时输出"""
+        if self._partial_since is not None and now - self._partial_since > self.flush_after:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        """输出缓冲区中剩余的内容"""
+        line = "".join(self._parts).strip()
+        self._parts.clear()
+        self._tail = ""
+        self._partial_since = None
+        return line or None
+
+
+class ContainerLogReader:
+    """
+    在后台线程中读取容器日志流，通过有界 asyncio 队列交给事件循环，
+    避免同步的 docker SDK 阻塞 uvicorn 的事件循环
+    """
+
+    def __init__(self, container, max_chunks: int = 1024, **log_kwargs):
+        self.container = container
+        self.max_chunks = max_chunks
+        self.log_kwargs = log_kwargs
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # 队列容量由信号量限制，读取线程无需等待事件循环即可判断是否可写
+        self._slots = threading.BoundedSemaphore(max_chunks)
+        self._loop = None
+        self._thread = None
+        self._stream = None
+        self._closed = threading.Event()
+        # get 合并数据块时取到的结束标记或异常，留到下一次读取时处理
+        self._deferred = None
+
+    def start(self):
+        """启动读取线程，必须在事件循环中调用"""
+        self._loop = asyncio.get_running_loop()
+        name = getattr(self.container, "name", None) or "container"
+        self._thread = threading.Thread(target=self._run, name=f"log-reader-{name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _put(self, item) -> bool:
+        """把数据放入队列；队列满时阻塞读取线程，从而对 Docker 日志流形成背压"""
+        while not self._closed.is_set():
+            if self._slots.acquire(timeout=0.5):
+                try:
+                    self._loop.call_soon_threadsafe(self.queue.put_nowait, item)
+                except RuntimeError:
+                    # 事件循环已关闭
+                    return False
+                return True
+        return False
+
+    def _run(self):
+        try:
+            self._stream = self.container.logs(stream=True, follow=True, **self.log_kwargs)
+            for chunk in self._stream:
+                if self._closed.is_set() or not self._put(chunk):
+                    return
+        except Exception as e:
+            if not self._closed.is_set():
+                self._put(e)
+        finally:
+            if not self._closed.is_set():
+                self._put(_END)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._deferred is not None:
+            item, self._deferred = self._deferred, None
+        else:
+            item = await self.queue.get()
+            self._slots.release()
+        if item is _END:
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    async def get(self, timeout: float = None):
+        """
+        读取下一段数据，超时返回 None，日志流结束时抛出 StopAsyncIteration；
+        队列中已经积压的数据块（最多 COALESCE_BYTES）合并后一起返回，日志输出很快、分块很小时
+        减少逐块处理的次数
+        """
+        try:
+            chunk = await asyncio.wait_for(self.__anext__(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.queue.empty():
+            return chunk
+        chunks = [chunk]
+        size = len(chunk)
+        while size < COALESCE_BYTES and not self.queue.empty():
+            item = self.queue.get_nowait()
+            self._slots.release()
+            if item is _END or isinstance(item, Exception):
+                self._deferred = item
+                break
+            chunks.append(item)
+            size += len(item)
+        return b"".join(chunks)
+
+    def close(self):
+        """停止读取线程并关闭底层日志流"""
+        self._closed.set()
+        stream = self._stream
+        if stream is not None and hasattr(stream, "close"):
+            try:
+                stream.close()
+            except Exception as e:
+                print(f"[LogStream] 关闭日志流失败: {e}")
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import time
+from array import array
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 默认的 key:value / key=value 指标格式，例如 "train acc:0.9123, test acc:0.9050"、"loss=0.25"
+DEFAULT_METRIC_PATTERN = r"(?P<name>[A-Za-z][\w.-]*(?: [A-Za-z][\w.-]*)*)\s*[:=]\s*(?P<value>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+# 默认的步数格式，例如 "=== epoch - 3 ==="、"iter 120"、"step=5"
+DEFAULT_STEP_PATTERN = r"\b(?:epoch|iter|step)\s*[-:=]?\s*(?P<step>\d+)\b"
+# 这些名称表示步数而不是指标
+STEP_NAMES = {"epoch", "iter", "step"}
+# 模型目录中的指标配置文件，格式为 {"patterns": [...], "step_pattern": "..."}
+METRICS_CONFIG_FILE = "metrics.json"
+# 每个项目在内存中保留的训练记录数
+MAX_RUNS_PER_PROJECT = 5
+# 下采样允许的最大点数
+MAX_POINTS = 5000
+
+
+class MetricSeries:
+    """单个指标序列：步数和数值分别存放在紧凑数组中（uint32 + float32）"""
+    __slots__ = ("steps", "values")
+
+    def __init__(self):
+        self.steps = array("I")
+        self.values = array("f")
+
+    def append(self, step: int, value: float):
+        self.steps.append(step)
+        self.values.append(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def snapshot(self):
+        """复制当前数据；array 被 numpy 引用期间无法追加，因此不直接共享缓冲区"""
+        return (np.frombuffer(self.steps, dtype=np.uint32).copy(),
+                np.frombuffer(self.values, dtype=np.float32).copy())
+
+
+class MetricExtractor:
+    """按模型配置的正则从训练日志行中提取指标"""
+
+    def __init__(self, patterns: Optional[List[str]] = None, step_pattern: Optional[str] = None):
+        self.patterns = [re.compile(p) for p in (patterns or [DEFAULT_METRIC_PATTERN])]
+        # 默认格式不区分大小写（"Epoch 2/10"）；模型自带的格式按原样编译
+        self.step_pattern = re.compile(step_pattern) if step_pattern \
+            else re.compile(DEFAULT_STEP_PATTERN, re.IGNORECASE)
+
+    @staticmethod
+    def from_directory(directory: str) -> "MetricExtractor":
+        """在项目目录（含一层子目录）中查找 metrics.json，找不到时使用默认格式"""
+        if not directory or not os.path.isdir(directory):
+            return MetricExtractor()
+        candidates = [os.path.join(directory, METRICS_CONFIG_FILE)]
+        candidates += [os.path.join(directory, name, METRICS_CONFIG_FILE) for name in sorted(os.listdir(directory))]
+        for path in candidates:
+            if os.path.isfile(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        config = json.load(f)
+                    return MetricExtractor(config.get("patterns"), config.get("step_pattern"))
+                except (ValueError, re.error) as e:
+                    print(f"[Metric] 指标配置 {path} 无效: {e}")
+        return MetricExtractor()
+
+    def step(self, line: str) -> Optional[int]:
+        match = self.step_pattern.search(line)
+        return int(match.group("step")) if match else None
+
+    def extract(self, line: str):
+        """返回 [(指标名, 数值)]，指标名统一为小写下划线形式，如 train_acc"""
+        result = []
+        for pattern in self.patterns:
+            for match in pattern.finditer(line):
+                name = re.sub(r"[\s.-]+", "_", match.group("name").strip()).lower()
+                if name in STEP_NAMES:
+                    continue
+                try:
+                    result.append((name, float(match.group("value"))))
+                except ValueError:
+                    continue
+        return result
+
+
+class RunMetrics:
+    """一次训练的全部指标序列"""
+
+    def __init__(self, run_id: int, extractor: MetricExtractor):
+        self.run_id = run_id
+        self.extractor = extractor
+        self.series: Dict[str, MetricSeries] = {}
+        self.current_step: Optional[int] = None
+
+    def feed(self, line: str):
+        step = self.extractor.step(line)
+        if step is not None:
+            self.current_step = step
+        for name, value in self.extractor.extract(line):
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = MetricSeries()
+            # 日志中没有步数时按出现顺序编号
+            series.append(self.current_step if self.current_step is not None else len(series), value)
+
+    def snapshot(self, names: Optional[List[str]] = None) -> dict:
+        return {name: series.snapshot() for name, series in self.series.items() if not names or name in names}
+
+    def summary(self) -> dict:
+        return {"run_id": self.run_id, "metrics": {name: len(series) for name, series in self.series.items()}}
+
+
+_runs: Dict[str, List[RunMetrics]] = {}
+
+
+def start_run(project_id, directory: str) -> RunMetrics:
+    """开始记录一次训练的指标，只保留最近 MAX_RUNS_PER_PROJECT 次"""
+    runs = _runs.setdefault(str(project_id), [])
+    run = RunMetrics(int(time.time() * 1000), MetricExtractor.from_directory(directory))
+    runs.append(run)
+    del runs[:-MAX_RUNS_PER_PROJECT]
+    return run
+
+
+def current_run(project_id) -> Optional[RunMetrics]:
+    runs = _runs.get(str(project_id))
+    return runs[-1] if runs else None
+
+
+def list_runs(project_id) -> List[dict]:
+    return [run.summary() for run in _runs.get(str(project_id), [])]
+
+
+def find_run(project_id, run_id: Optional[int] = None) -> Optional[RunMetrics]:
+    if run_id is None:
+        return current_run(project_id)
+    for run in _runs.get(str(project_id), []):
+        if run.run_id == run_id:
+            return run
+    return None
+
+
+def downsample(snapshot: dict, points: int) -> dict:
+    """对 RunMetrics.snapshot() 的结果逐个序列做 LTTB 下采样，可在线程中执行"""
+    points = min(max(points, 3), MAX_POINTS)
+    result = {}
+    for name, (steps, values) in snapshot.items():
+        indices = lttb(steps.astype(np.float64), values.astype(np.float64), points)
+        result[name] = {"steps": steps[indices].tolist(), "values": values[indices].tolist()}
+    return result
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 下采样，返回保留点的下标；
+    首尾点固定保留，中间每个桶选取与前一选中点、后一桶均值构成三角形面积最大的点
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = length - 1
+    bucket_size = (length - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        if end >= next_end:
+            avg_x, avg_y = x[-1], y[-1]
+        else:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        selected = start + int(areas.argmax())
+        indices[i + 1] = selected
+    return indices
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Tuple
+
+# 模型容器入口模板（分帧协议、常驻模型和合批），构建镜像前装入构建上下文的副本，不改动上传的模型目录
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "data", "resources", "model_template")
+RUNTIME_FILES = ("main.py", "resident.py", "batcher.py")
+# 模板 main.py 中的分帧前缀和文档首行：自带分帧入口的模型不替换，旧的模板入口随模板更新
+FRAME_MARKER = "@@aiforge"
+TEMPLATE_HEADER = "模型容器入口模板"
+# 入口支持分帧协议的镜像打上的标签，容器继承镜像标签，各 worker 据此判断能否并发推理
+PROTOCOL_LABEL = "aiforge.protocol"
+PROTOCOL_FRAMED = "framed"
+# 装入模板入口的构建上下文副本所在目录，构建结束后删除
+BUILD_DIR = os.path.join("data", "cache", "build")
+# 模板 predict.py 改写自这些 predict.py（sha256），内容完全相同时一并替换，获得常驻模式和合批
+PORTED_PREDICT = {
+    "0b18c0f97da97596346558a58d0e4acbf16e84ee66ecdb64d1a3983111a89872",  # Neural-Network
+}
+
+
+def _sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _is_replaceable(path: str) -> bool:
+    """旧版入口（逐行 input() 读取 train/predict 命令并调用 train.py / predict.py），或者之前装入的模板入口"""
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        source = f.read()
+    if FRAME_MARKER in source:
+        return TEMPLATE_HEADER in source
+    return "input()" in source and "from train import train" in source and "from predict import predict" in source
+
+
+def _replace(source: str, target: str):
+    """先写临时文件再替换：目标可能是去重存储中与其他模型共享的硬链接，不能原地改写"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".runtime-")
+    try:
+        with os.fdopen(fd, "wb") as f, open(source, "rb") as src:
+            shutil.copyfileobj(src, f)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def needs_runtime(context_dir: str) -> bool:
+    """使用旧版 stdin 入口或旧模板入口的模型；没有 main.py 或者自带其他入口的模型保持不变"""
+    main_path = os.path.join(context_dir, "main.py")
+    return os.path.isfile(main_path) and _is_replaceable(main_path)
+
+
+def install_runtime(context_dir: str) -> List[str]:
+    """
+    把模板入口装入构建上下文，返回替换的文件名；模板入口兼容旧版 stdin 命令。
+    context_dir 应是 prepare_context 创建的副本
+    """
+    if not needs_runtime(context_dir):
+        return []
+    installed = []
+    for name in RUNTIME_FILES:
+        source, target = os.path.join(TEMPLATE_DIR, name), os.path.join(context_dir, name)
+        if not os.path.isfile(target) or _sha256(source) != _sha256(target):
+            _replace(source, target)
+            installed.append(name)
+    predict_path = os.path.join(context_dir, "predict.py")
+    if os.path.isfile(predict_path) and _sha256(predict_path) in PORTED_PREDICT:
+        _replace(os.path.join(TEMPLATE_DIR, "predict.py"), predict_path)
+        installed.append("predict.py")
+    return installed
+
+
+def _link_or_copy(source: str, target: str):
+    # 副本中的文件只会被 _replace 整体替换，可以与上传的文件共用 inode
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def prepare_context(context_dir: str) -> Tuple[str, List[str]]:
+    """
+    需要装入模板入口时，把构建上下文硬链接（不支持时复制）到 BUILD_DIR 下的临时目录再替换入口文件，
+    返回 (构建目录, 替换的文件名)；不需要替换时返回原目录。上传的模型目录始终保持不变
+    """
+    if not needs_runtime(context_dir):
+        return context_dir, []
+    parent = os.path.join(os.getcwd(), BUILD_DIR)
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix="context-", dir=parent)
+    try:
+        shutil.copytree(context_dir, build_dir, symlinks=True, dirs_exist_ok=True, copy_function=_link_or_copy)
+        installed = install_runtime(build_dir)
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    if not installed:
+        # 已经是当前的模板入口
+        shutil.rmtree(build_dir, ignore_errors=True)
+        return context_dir, []
+    return build_dir, installed
+
+
+def protocol_labels(context_dir: str) -> Dict[str, str]:
+    """入口（main.py）支持分帧协议时返回镜像标签；旧版 stdin 入口返回空字典"""
+    main_path = os.path.join(context_dir, "main.py")
+    if not os.path.isfile(main_path):
+        return {}
+    with open(main_path, encoding="utf-8", errors="ignore") as f:
+        return {PROTOCOL_LABEL: PROTOCOL_FRAMED} if FRAME_MARKER in f.read() else {}
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 推理结果缓存的总字节数上限
+CACHE_BYTES = int(os.environ.get("PREDICT_CACHE_BYTES", str(64 * 1024 * 1024)))
+# 单条结果超过该大小时不缓存
+MAX_ENTRY_BYTES = CACHE_BYTES // 16
+# 参数文件名
+PARAMS_FILE = "params.pkl"
+# 计算项目文件指纹时跳过的目录：日志归档写在项目目录下，每次运行都会变化
+IGNORED_DIRS = {"logs", "__pycache__", ".idea", ".git"}
+# 容器内的图片目录，对应主机上的 data/pic
+CONTAINER_PIC_DIR = "/app/pic/"
+# 项目其余文件的指纹缓存多久（秒）；参数文件每次都检查
+TREE_TTL = 1.0
+# 每条缓存除结果和日志以外的估计开销
+ENTRY_OVERHEAD = 256
+HASH_CHUNK = 1024 * 1024
+
+
+class _FileHasher:
+    """按 (路径, mtime, 大小) 缓存文件内容的 sha256，文件没有变化时不重复读取"""
+
+    def __init__(self, limit: int = 4096):
+        self.limit = limit
+        self._digests: "OrderedDict[str, Tuple[tuple, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, path: str) -> str:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._digests.get(path)
+            if cached is not None and cached[0] == signature:
+                self._digests.move_to_end(path)
+                return cached[1]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._digests[path] = (signature, digest.hexdigest())
+            if len(self._digests) > self.limit:
+                self._digests.popitem(last=False)
+        return digest.hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ("data", "lines", "elapsed", "size")
+
+    def __init__(self, data, lines: List[str], elapsed: float, size: int):
+        self.data = data
+        self.lines = lines
+        self.elapsed = elapsed
+        self.size = size
+
+
+class PredictCache:
+    """
+    推理结果的 LRU 缓存，按字节数限制总大小：
+    键由项目 ID、项目的缓存代数、项目参数文件的内容哈希、项目其他文件的指纹和输入内容的哈希组成，
+    项目文件变化时键随之变化。缓存代数保存在 project 表中，训练结束或项目容器重建时由 expire 增加，
+    所有进程的下一次推理都会读到新代数，之前（包括其他进程中、增加代数前已经开始）的结果不再命中
+    """
+
+    def __init__(self, capacity: int = CACHE_BYTES):
+        self.capacity = capacity
+        self.entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+        self.hasher = _FileHasher()
+        # 项目目录 -> (过期时间, 其余文件的指纹, 参数文件路径)
+        self._trees: Dict[str, Tuple[float, str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 键 ----------
+
+    def _scan_tree(self, store_path: str) -> Tuple[str, List[str]]:
+        """遍历项目目录：其余文件按路径、mtime 和大小计算指纹，并找出参数文件"""
+        fingerprint = hashlib.sha256()
+        params_paths = []
+        for root, dirs, files in os.walk(store_path):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name == PARAMS_FILE:
+                    params_paths.append(path)
+                    continue
+                stat = os.stat(path)
+                fingerprint.update(f"{os.path.relpath(path, store_path)}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+        return fingerprint.hexdigest(), params_paths
+
+    def project_fingerprint(self, store_path: str) -> Optional[str]:
+        """参数文件的内容哈希加上其余文件的指纹，项目目录不存在时返回 None"""
+        if not store_path or not os.path.isdir(store_path):
+            return None
+        now = time.monotonic()
+        cached = self._trees.get(store_path)
+        if cached is None or cached[0] < now:
+            cached = (now + TREE_TTL, *self._scan_tree(store_path))
+            self._trees[store_path] = cached
+        _, tree, params_paths = cached
+        fingerprint = hashlib.sha256(tree.encode())
+        try:
+            for path in params_paths:
+                fingerprint.update(f"{path}:{self.hasher.digest(path)}\n".encode())
+        except FileNotFoundError:
+            # 参数文件被删除或正在替换，这次不缓存，下次重新遍历
+            self._trees.pop(store_path, None)
+            return None
+        return fingerprint.hexdigest()
+
+    def input_digest(self, params) -> str:
+        """图片输入按文件内容计算哈希，其他输入按内容本身"""
+        if isinstance(params, str) and params.startswith(CONTAINER_PIC_DIR):
+            path = os.path.join(os.getcwd(), "data", "pic", os.path.basename(params))
+            if os.path.isfile(path):
+                return "file:" + self.hasher.digest(path)
+        raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return "value:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def key_for(self, project_id, generation: int, store_path: str, params) -> Optional[tuple]:
+        """
+        计算缓存键，generation 是请求开始时从 project 表读到的缓存代数；
+        需要读取文件，应在线程中调用；无法确定项目文件时返回 None（不缓存）
+        """
+        fingerprint = self.project_fingerprint(store_path)
+        if fingerprint is None:
+            return None
+        return int(project_id), generation, fingerprint, self.input_digest(params)
+
+    # ---------- 读写 ----------
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.elapsed
+            return entry
+
+    def put(self, key: tuple, data, lines: List[str], elapsed: float):
+        size = ENTRY_OVERHEAD + len(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")) \
+            + sum(len(line.encode("utf-8")) for line in lines)
+        if size > MAX_ENTRY_BYTES:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self.entries[key] = CacheEntry(data, list(lines), elapsed, size)
+            self.bytes += size
+            while self.bytes > self.capacity and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def invalidate(self, project_id):
+        """删除本进程中一个项目的缓存条目"""
+        project_id = int(project_id)
+        with self._lock:
+            stale = [key for key in self.entries if key[0] == project_id]
+            for key in stale:
+                self.bytes -= self.entries.pop(key).size
+            if stale:
+                self.invalidations += 1
+
+    async def expire(self, project_id):
+        """训练结束、容器重建或重置后调用：增加 project 表中的缓存代数，并删除本进程中的旧条目"""
+        from models import Project
+        try:
+            await Project.bump_predict_generation(int(project_id))
+        except Exception as e:
+            print(f"[PredictCache] 更新项目 {project_id} 的缓存代数失败: {e}")
+        self.invalidate(project_id)
+
+    def stats(self, project_id=None) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+            if project_id is not None:
+                stats["project_entries"] = sum(key[0] == int(project_id) for key in self.entries)
+            return stats
+
+
+predict_cache = PredictCache()
@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from utils.Scheduler import PROJECT_CPU, PROJECT_MEMORY
+
+# 可分配给项目容器的比例，其余留给守护进程和系统
+CPU_FRACTION = 1.0
+MEMORY_FRACTION = 0.9
+# 没有历史数据时假定的容器存活时间（秒），用于估算排队时间
+DEFAULT_DURATION = 600
+# 存活时间的指数平均系数
+DURATION_ALPHA = 0.2
+# 排队超过该时间（秒）仍未分配则放弃
+QUEUE_TIMEOUT = 1800
+# 与守护进程核对容器是否仍在运行的间隔（秒），以及新预留的宽限期
+RECONCILE_INTERVAL = 15
+RECONCILE_GRACE = 60
+# 分配前账本距上次核对超过该时间（秒）时先重新核对
+REFRESH_INTERVAL = 5
+
+
+class Reservation:
+    __slots__ = ("project_id", "cpu", "memory", "since", "external")
+
+    def __init__(self, project_id: str, cpu: float, memory: int, external: bool = False):
+        self.project_id = project_id
+        self.cpu = cpu
+        self.memory = memory
+        self.since = time.time()
+        # 按守护进程中已有的容器补记（服务启动前或其他 worker 创建），不是本进程分配的
+        self.external = external
+
+
+class Ticket:
+    """一次资源申请，admitted 为 True 表示已预留；否则在队列中等待"""
+
+    def __init__(self, ledger: "ResourceLedger", project_id: str, cpu: float, memory: int):
+        self.ledger = ledger
+        self.project_id = project_id
+        self.cpu = cpu
+        self.memory = memory
+        self.enqueued_at = time.time()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def admitted(self) -> bool:
+        return self.future.done() and not self.future.cancelled() and self.future.result()
+
+    async def wait(self, timeout: float = QUEUE_TIMEOUT) -> bool:
+        """等待分配，超时或被取消时返回 False"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.future), timeout)
+        except asyncio.TimeoutError:
+            self.ledger.cancel(self.project_id)
+            return False
+        except asyncio.CancelledError:
+            if self.future.cancelled():
+                return False
+            raise
+
+    def to_dict(self) -> dict:
+        position = self.ledger.position(self.project_id)
+        return {
+            "host": self.ledger.host,
+            "admitted": self.admitted,
+            "position": position,
+            "estimated_wait": None if self.admitted else round(self.ledger.estimate_wait(self.project_id), 1),
+        }
+
+
+class ResourceLedger:
+    """
+    单台主机的 CPU/内存账本：总量来自守护进程报告的 NCPU 和 MemTotal，
+    容器创建前预留、停止或退出后释放；资源不足时按先来先到排队，不超额分配。
+    每个 worker 进程有自己的账本，通过定期核对和分配前的 refresh 把守护进程中其他 worker 创建的项目容器计入占用；
+    其他 worker 已预留但尚未创建容器的资源要到下一次核对才能看到，这段时间内的并发创建仍可能超额
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.ncpu = 0.0
+        self.memory = 0
+        self.cpu_reserved = 0.0
+        self.memory_reserved = 0
+        self.reservations: Dict[str, Reservation] = {}
+        self.queue: Deque[Ticket] = deque()
+        self.average_duration = DEFAULT_DURATION
+        self._reconciler: Optional[asyncio.Task] = None
+        self.reconciled_at = 0.0
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.released_total = 0
+        self.exited_total = 0
+        self.adopted_total = 0
+
+    @property
+    def initialized(self) -> bool:
+        return self.ncpu > 0
+
+    async def initialize(self, engine):
+        """从守护进程读取主机规格，并启动定期核对"""
+        if self.initialized:
+            return
+        info = await engine.info()
+        self.ncpu = info.get("NCPU", 0) * CPU_FRACTION
+        self.memory = int(info.get("MemTotal", 0) * MEMORY_FRACTION)
+        await self.reconcile(engine)
+        if self._reconciler is None:
+            self._reconciler = asyncio.create_task(self._reconcile_loop(engine))
+
+    async def refresh(self, engine):
+        """分配前调用：账本距上次核对超过 REFRESH_INTERVAL 时重新核对，其他 worker 新建的容器计入占用"""
+        await self.initialize(engine)
+        if time.time() - self.reconciled_at > REFRESH_INTERVAL:
+            await self.reconcile(engine)
+
+    def _adopt(self, project_id: str, container):
+        """为账本中没有的项目容器补记预留，CPU 按容器的配额计算"""
+        host_config = container.attrs.get("HostConfig") or {}
+        quota, period = host_config.get("CpuQuota") or 0, host_config.get("CpuPeriod") or 0
+        cpu = quota / period if quota > 0 and period > 0 else PROJECT_CPU
+        self.reservations[project_id] = Reservation(project_id, cpu, PROJECT_MEMORY, external=True)
+        self.cpu_reserved += cpu
+        self.memory_reserved += PROJECT_MEMORY
+
+    # ---------- 预留与释放 ----------
+
+    def can_ever_fit(self, cpu: float, memory: int) -> bool:
+        return cpu <= self.ncpu and memory <= self.memory
+
+    def fits(self, cpu: float, memory: int) -> bool:
+        return self.cpu_reserved + cpu <= self.ncpu and self.memory_reserved + memory <= self.memory
+
+    def request(self, project_id, cpu: float, memory: int) -> Ticket:
+        """
+        申请资源：没有人排队且资源足够时立即预留，否则进入队列；
+        同一项目之前的预留或排队（例如重建容器）会先被释放
+        """
+        project_id = str(project_id)
+        self.release(project_id)
+        ticket = Ticket(self, project_id, cpu, memory)
+        if not self.queue and self.fits(cpu, memory):
+            self._reserve(ticket)
+        else:
+            self.queue.append(ticket)
+            self.queued_total += 1
+        return ticket
+
+    def _reserve(self, ticket: Ticket):
+        self.reservations[ticket.project_id] = Reservation(ticket.project_id, ticket.cpu, ticket.memory)
+        self.cpu_reserved += ticket.cpu
+        self.memory_reserved += ticket.memory
+        self.admitted_total += 1
+        ticket.future.set_result(True)
+
+    def release(self, project_id) -> bool:
+        """释放项目的预留或取消排队，返回是否有预留被释放"""
+        project_id = str(project_id)
+        reservation = self.reservations.pop(project_id, None)
+        if reservation is None:
+            self.cancel(project_id)
+            return False
+        self.cpu_reserved -= reservation.cpu
+        self.memory_reserved -= reservation.memory
+        self.released_total += 1
+        if not reservation.external:
+            # 补记的预留不知道容器的创建时间，不计入存活时间
+            duration = time.time() - reservation.since
+            self.average_duration += DURATION_ALPHA * (duration - self.average_duration)
+        self._admit()
+        return True
+
+    def cancel(self, project_id):
+        project_id = str(project_id)
+        for ticket in list(self.queue):
+            if ticket.project_id == project_id:
+                self.queue.remove(ticket)
+                ticket.future.cancel()
+        self._admit()
+
+    def _admit(self):
+        # 严格按顺序分配，避免大的申请一直被小的插队
+        while self.queue and self.fits(self.queue[0].cpu, self.queue[0].memory):
+            self._reserve(self.queue.popleft())
+
+    # ---------- 排队估算 ----------
+
+    def position(self, project_id) -> Optional[int]:
+        project_id = str(project_id)
+        for i, ticket in enumerate(self.queue):
+            if ticket.project_id == project_id:
+                return i
+        return None
+
+    def estimate_wait(self, project_id=None, cpu: float = 0, memory: int = 0) -> float:
+        """
+        估算排队时间（秒）：假设每个容器存活 average_duration，按预计结束时间依次释放，
+        模拟队列中排在前面的申请逐个被分配；project_id 为空时估算一个新申请
+        """
+        now = time.time()
+        ends = [(max(r.since + self.average_duration, now), r.cpu, r.memory) for r in self.reservations.values()]
+        heapq.heapify(ends)
+        free_cpu = self.ncpu - self.cpu_reserved
+        free_memory = self.memory - self.memory_reserved
+        clock = now
+        waiters = [(t.project_id, t.cpu, t.memory) for t in self.queue]
+        if project_id is None:
+            waiters.append((None, cpu, memory))
+        for waiter_id, need_cpu, need_memory in waiters:
+            while (need_cpu > free_cpu or need_memory > free_memory) and ends:
+                clock, freed_cpu, freed_memory = heapq.heappop(ends)
+                free_cpu += freed_cpu
+                free_memory += freed_memory
+            free_cpu -= need_cpu
+            free_memory -= need_memory
+            heapq.heappush(ends, (clock + self.average_duration, need_cpu, need_memory))
+            if waiter_id == (str(project_id) if project_id is not None else None):
+                return clock - now
+        return 0.0
+
+    # ---------- 与守护进程核对 ----------
+
+    async def _reconcile_loop(self, engine):
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            try:
+                await self.reconcile(engine)
+            except Exception as e:
+                print(f"[Ledger] 核对 {self.host} 资源失败: {e}")
+
+    async def reconcile(self, engine):
+        """
+        释放容器已经退出或被删除的项目的预留，并为账本中没有的项目容器补记预留；
+        本进程刚分配、容器还在创建的预留有 RECONCILE_GRACE 的宽限期
+        """
+        containers = await engine.list_containers(filters={"name": "project_"})
+        self.reconciled_at = now = time.time()
+        running = {container.name[len("project_"):]: container for container in containers
+                   if container.name.startswith("project_")}
+        for project_id, reservation in list(self.reservations.items()):
+            if project_id not in running and (reservation.external or now - reservation.since > RECONCILE_GRACE):
+                print(f"[Ledger] 项目 {project_id} 的容器已退出，释放资源")
+                self.exited_total += 1
+                self.release(project_id)
+        adopted = 0
+        for project_id, container in running.items():
+            if project_id not in self.reservations:
+                self._adopt(project_id, container)
+                adopted += 1
+        if adopted:
+            self.adopted_total += adopted
+            print(f"[Ledger] 补记 {self.host} 上 {adopted} 个不在账本中的项目容器")
+
+    def stats(self) -> dict:
+        return {
+            "host": self.host,
+            "ncpu": self.ncpu,
+            "memory": self.memory,
+            "cpu_reserved": self.cpu_reserved,
+            "memory_reserved": self.memory_reserved,
+            "reservations": len(self.reservations),
+            "external": sum(reservation.external for reservation in self.reservations.values()),
+            "queued": len(self.queue),
+            "average_duration": round(self.average_duration, 1),
+            "estimated_wait": round(self.estimate_wait(), 1),
+            "admitted_total": self.admitted_total,
+            "queued_total": self.queued_total,
+            "released_total": self.released_total,
+            "exited_total": self.exited_total,
+            "adopted_total": self.adopted_total,
+        }
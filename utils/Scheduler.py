@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+
+# 未指定需求时每个项目容器按 1 核、1 GB 计算
+PROJECT_CPU = 1.0
+PROJECT_MEMORY = 1024 * 1024 * 1024
+# 每核允许的容器数，用于把容器数量归一化
+CONTAINERS_PER_CPU = 2
+# 打分权重：空闲 CPU、空闲内存、镜像本地性、容器数量（越多越差）
+WEIGHT_CPU = 0.35
+WEIGHT_MEMORY = 0.25
+WEIGHT_IMAGE = 0.3
+WEIGHT_CONTAINERS = 0.1
+# 镜像本地性得分：有预热容器、已有镜像、需要构建
+LOCALITY_WARM = 1.0
+LOCALITY_IMAGE = 0.7
+LOCALITY_NONE = 0.0
+# 主机镜像列表的缓存时间（秒）
+SNAPSHOT_TTL = 5
+
+
+class HostState:
+    """打分所需的主机状态快照"""
+    __slots__ = ("host", "ncpu", "memory", "cpu_used", "memory_used", "containers", "images", "warm", "taken_at")
+
+    def __init__(self, host: str, ncpu: float, memory: int, cpu_used: float = 0, memory_used: int = 0,
+                 containers: int = 0, images: Iterable[str] = (), warm: Iterable[str] = ()):
+        self.host = host
+        self.ncpu = ncpu
+        self.memory = memory
+        self.cpu_used = cpu_used
+        self.memory_used = memory_used
+        self.containers = containers
+        self.images = set(images)
+        self.warm = set(warm)
+        self.taken_at = time.time()
+
+    def reserve(self, image: str, cpu_need: float, memory_need: int):
+        self.cpu_used += cpu_need
+        self.memory_used += memory_need
+        self.containers += 1
+        self.images.add(image)
+        self.warm.discard(image)
+
+    def to_dict(self) -> dict:
+        return {
+            "host": self.host,
+            "ncpu": self.ncpu,
+            "memory": self.memory,
+            "cpu_used": self.cpu_used,
+            "memory_used": self.memory_used,
+            "containers": self.containers,
+            "images": len(self.images),
+        }
+
+
+def score_host(state: HostState, image: str, cpu_need: float, memory_need: int) -> Optional[float]:
+    """主机得分，资源不足时返回 None"""
+    if state.ncpu <= 0 or state.memory <= 0:
+        return None
+    free_cpu = (state.ncpu - state.cpu_used - cpu_need) / state.ncpu
+    free_memory = (state.memory - state.memory_used - memory_need) / state.memory
+    if free_cpu < 0 or free_memory < 0:
+        return None
+    if image in state.warm:
+        locality = LOCALITY_WARM
+    elif image in state.images:
+        locality = LOCALITY_IMAGE
+    else:
+        locality = LOCALITY_NONE
+    crowding = min(state.containers / (state.ncpu * CONTAINERS_PER_CPU), 1.0)
+    return (WEIGHT_CPU * free_cpu + WEIGHT_MEMORY * free_memory
+            + WEIGHT_IMAGE * locality - WEIGHT_CONTAINERS * crowding)
+
+
+def choose_host(states: Iterable[HostState], image: str, cpu_need: float,
+                memory_need: int) -> Optional[HostState]:
+    """选出得分最高的主机，同分时选容器少的"""
+    best, best_key = None, None
+    for state in states:
+        score = score_host(state, image, cpu_need, memory_need)
+        if score is None:
+            continue
+        key = (score, -state.containers)
+        if best_key is None or key > best_key:
+            best, best_key = state, key
+    return best
+
+
+class PlacementScheduler:
+    """为新的项目容器在 DockerFactory.docker_client_pool 的主机中选择一台"""
+
+    def __init__(self, pool: Dict[str, object]):
+        self.pool = pool
+        self._states: Dict[str, HostState] = {}
+        self._lock = asyncio.Lock()
+        self.placements: Dict[str, int] = {}
+        self.rejected = 0
+
+    async def _collect(self, host: str, docker_core) -> Optional[HostState]:
+        try:
+            await docker_core.ledger.refresh(docker_core.engine)
+        except Exception as e:
+            print(f"[Scheduler] 主机 {host} 不可用: {e}")
+            return None
+        # 镜像列表来自事件驱动的本地缓存，不访问守护进程
+        return HostState(host, docker_core.ledger.ncpu, docker_core.ledger.memory,
+                         images=docker_core.state.image_tags())
+
+    async def snapshot(self) -> List[HostState]:
+        """返回所有可用主机的状态：镜像列表过期时并发刷新，资源和预热容器每次从本地账本读取"""
+        now = time.time()
+        stale = [host for host in self.pool
+                 if host not in self._states or now - self._states[host].taken_at > SNAPSHOT_TTL]
+        if stale:
+            states = await asyncio.gather(*(self._collect(host, self.pool[host]) for host in stale))
+            for host, state in zip(stale, states):
+                if state is None:
+                    self._states.pop(host, None)
+                else:
+                    self._states[host] = state
+        result = []
+        for host, state in self._states.items():
+            docker_core = self.pool.get(host)
+            if docker_core is None:
+                continue
+            ledger = docker_core.ledger
+            state.ncpu, state.memory = ledger.ncpu, ledger.memory
+            state.cpu_used, state.memory_used = ledger.cpu_reserved, ledger.memory_reserved
+            state.containers = len(ledger.reservations)
+            state.warm = {image for image, idle in docker_core.warm_pool.stats()["idle"].items() if idle}
+            result.append(state)
+        return result
+
+    async def place(self, image: str, cpu_need: Optional[float] = None,
+                    memory_need: Optional[int] = None) -> Optional[str]:
+        """
+        选择主机；所有主机都已满时选预计等待最短的主机排队，
+        没有任何主机能容纳该需求时返回 None。调用方应立即在返回的主机账本上申请资源
+        """
+        cpu_need = cpu_need or PROJECT_CPU
+        memory_need = memory_need or PROJECT_MEMORY
+        async with self._lock:
+            states = await self.snapshot()
+            # 已有排队的主机不再接收新项目，否则新申请只会排在队尾
+            available = [s for s in states if not self.pool[s.host].ledger.queue]
+            state = choose_host(available, image, cpu_need, memory_need)
+            if state is None:
+                ledgers = [self.pool[s.host].ledger for s in states]
+                ledgers = [ledger for ledger in ledgers if ledger.can_ever_fit(cpu_need, memory_need)]
+                if not ledgers:
+                    self.rejected += 1
+                    return None
+                host = min(ledgers, key=lambda ledger: ledger.estimate_wait(cpu=cpu_need, memory=memory_need)).host
+            else:
+                host = state.host
+            self.placements[host] = self.placements.get(host, 0) + 1
+            return host
+
+    def stats(self) -> dict:
+        return {
+            "hosts": [state.to_dict() for state in self._states.values()],
+            "placements": dict(self.placements),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from typing import AsyncIterator, Dict, List, Optional
+
+from fastapi import UploadFile
+
+# 写盘、计算哈希和解压时每次处理的字节数，内存占用与上传大小无关
+CHUNK_SIZE = 1024 * 1024
+# 解压限制：单个文件和全部文件解压后的大小、条目数
+MAX_ENTRY_BYTES = int(os.environ.get("UPLOAD_MAX_ENTRY_BYTES", str(8 * 1024 ** 3)))
+MAX_TOTAL_BYTES = int(os.environ.get("UPLOAD_MAX_TOTAL_BYTES", str(32 * 1024 ** 3)))
+MAX_ENTRIES = int(os.environ.get("UPLOAD_MAX_ENTRIES", "100000"))
+# 单个文件解压后与压缩后大小之比的上限；小文件（例如文本）压缩比本来就高，不检查
+MAX_RATIO = int(os.environ.get("UPLOAD_MAX_RATIO", "200"))
+RATIO_MIN_BYTES = 1024 * 1024
+# 已结束的上传进度保留多久（秒）
+PROGRESS_TTL = 3600
+
+STAGE_RECEIVING = "receiving"
+STAGE_EXTRACTING = "extracting"
+STAGE_DONE = "done"
+STAGE_FAILED = "failed"
+
+
+class UploadRejected(Exception):
+    """压缩包超出解压限制或包含非法路径"""
+
+
+class UploadProgress:
+    """一次上传的进度：接收（写盘并计算 sha256）和解压两个阶段"""
+
+    def __init__(self, upload_id: str, total: Optional[int] = None):
+        self.upload_id = upload_id
+        self.stage = STAGE_RECEIVING
+        self.received = 0
+        self.total = total
+        self.sha256: Optional[str] = None
+        self.extracted = 0
+        self.extract_total = 0
+        self.entries = 0
+        self.entries_total = 0
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.updated = self.started
+
+    def finish(self, error: Optional[str] = None):
+        self.stage = STAGE_FAILED if error else STAGE_DONE
+        self.error = error
+        self.updated = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "upload_id": self.upload_id,
+            "stage": self.stage,
+            "received": self.received,
+            "total": self.total,
+            "sha256": self.sha256,
+            "extracted": self.extracted,
+            "extract_total": self.extract_total,
+            "entries": self.entries,
+            "entries_total": self.entries_total,
+            "error": self.error,
+            "elapsed": round(self.updated - self.started, 2),
+        }
+
+
+uploads: Dict[str, UploadProgress] = {}
+
+
+def start_progress(upload_id: Optional[str] = None, total: Optional[int] = None) -> UploadProgress:
+    """登记一次上传；客户端可以自带 upload_id，在上传过程中查询进度"""
+    now = time.time()
+    for key, progress in list(uploads.items()):
+        if progress.stage in (STAGE_DONE, STAGE_FAILED) and now - progress.updated > PROGRESS_TTL:
+            del uploads[key]
+    progress = UploadProgress(upload_id or uuid.uuid4().hex, total)
+    uploads[progress.upload_id] = progress
+    return progress
+
+
+def get_progress(upload_id: str) -> Optional[UploadProgress]:
+    return uploads.get(upload_id)
+
+
+# ---------- 接收 ----------
+
+def _copy_file(source, path: str, progress: UploadProgress) -> str:
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            f.write(chunk)
+            digest.update(chunk)
+            progress.received += len(chunk)
+            progress.updated = time.time()
+    progress.sha256 = digest.hexdigest()
+    return progress.sha256
+
+
+async def save_upload(file: UploadFile, path: str, progress: UploadProgress) -> str:
+    """把表单上传的文件按块写到 path，同时计算 sha256；读写都在线程中完成"""
+    if progress.total is None:
+        progress.total = file.size
+    await file.seek(0)
+    return await asyncio.to_thread(_copy_file, file.file, path, progress)
+
+
+def _write_chunk(f, digest, data: bytes):
+    f.write(data)
+    digest.update(data)
+
+
+async def save_stream(chunks: AsyncIterator[bytes], path: str, progress: UploadProgress) -> str:
+    """把请求体直接按块写到 path（不经过表单解析的临时文件），同时计算 sha256"""
+    digest = hashlib.sha256()
+    pending: List[bytes] = []
+    pending_size = 0
+    f = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            pending.append(chunk)
+            pending_size += len(chunk)
+            progress.received += len(chunk)
+            progress.updated = time.time()
+            # 攒够一块再交给线程写盘，避免每个小块都切换一次线程
+            if pending_size >= CHUNK_SIZE:
+                await asyncio.to_thread(_write_chunk, f, digest, b"".join(pending))
+                pending, pending_size = [], 0
+        if pending:
+            await asyncio.to_thread(_write_chunk, f, digest, b"".join(pending))
+    finally:
+        await asyncio.to_thread(f.close)
+    progress.sha256 = digest.hexdigest()
+    return progress.sha256
+
+
+# ---------- 解压 ----------
+
+def _check_archive(archive: zipfile.ZipFile, target: str) -> List[zipfile.ZipInfo]:
+    """按中央目录检查条目数、声明的大小、压缩比和路径，全部通过才开始解压"""
+    infos = archive.infolist()
+    if len(infos) > MAX_ENTRIES:
+        raise UploadRejected(f"压缩包条目数 {len(infos)} 超过上限 {MAX_ENTRIES}")
+    total = 0
+    for info in infos:
+        name = info.filename.replace("\\", "/")
+        if name.startswith("/") or ".." in name.split("/") or ":" in name.split("/")[0]:
+            raise UploadRejected(f"压缩包包含非法路径: {info.filename}")
+        if info.file_size > MAX_ENTRY_BYTES:
+            raise UploadRejected(f"{info.filename} 解压后 {info.file_size} 字节，超过单个文件上限 {MAX_ENTRY_BYTES}")
+        if info.file_size > RATIO_MIN_BYTES and info.file_size > max(info.compress_size, 1) * MAX_RATIO:
+            raise UploadRejected(f"{info.filename} 的压缩比超过 {MAX_RATIO}")
+        total += info.file_size
+    if total > MAX_TOTAL_BYTES:
+        raise UploadRejected(f"压缩包解压后共 {total} 字节，超过上限 {MAX_TOTAL_BYTES}")
+    os.makedirs(target, exist_ok=True)
+    if total > shutil.disk_usage(target).free:
+        raise UploadRejected("磁盘空间不足，无法解压")
+    return infos
+
+
+def _extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, path: str, progress: UploadProgress):
+    """按块解压一个文件；实际数据超过中央目录声明的大小时中止，不信任声明的大小"""
+    written = 0
+    with archive.open(info) as source, open(path, "wb") as f:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            written += len(chunk)
+            if written > info.file_size:
+                raise UploadRejected(f"{info.filename} 的实际大小超过声明的 {info.file_size} 字节")
+            f.write(chunk)
+            progress.extracted += len(chunk)
+            progress.updated = time.time()
+
+
+def extract_zip(zip_path: str, target: str, progress: UploadProgress) -> int:
+    """
+    在检查限制后把压缩包解压到 target，返回解压的文件数；阻塞调用，应在线程中执行。
+    超出限制时抛出 UploadRejected，并删除这次新建的文件（已经存在、被覆盖的文件保留）
+    """
+    progress.stage = STAGE_EXTRACTING
+    extracted = 0
+    created: List[str] = []
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            infos = _check_archive(archive, target)
+            progress.entries_total = len(infos)
+            progress.extract_total = sum(info.file_size for info in infos)
+            for info in infos:
+                path = os.path.join(target, *info.filename.replace("\\", "/").split("/"))
+                if info.is_dir():
+                    os.makedirs(path, exist_ok=True)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if not os.path.lexists(path):
+                        created.append(path)
+                    extracted += 1
+                    _extract_entry(archive, info, path, progress)
+                progress.entries += 1
+        return extracted
+    except Exception:
+        for path in created:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
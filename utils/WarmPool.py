@@ -0,0 +1,261 @@
+import asyncio
+import os
+import re
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+# 每个热门镜像保持的空闲容器数
+WARM_POOL_SIZE = int(os.environ.get("WARM_POOL_SIZE", "1"))
+# 同时维护预热容器的镜像数，按最近使用次数排序
+POPULAR_IMAGES = 4
+# 空闲容器的最长存活时间（秒），超时后销毁并重建
+IDLE_TTL = 600
+# 镜像超过该时间（秒）没有被使用就不再预热
+DEMAND_TTL = 1800
+# 所有空闲容器的内存预算，以及每个空闲容器的估算占用
+MEMORY_BUDGET = int(os.environ.get("WARM_POOL_MEMORY_MB", "4096")) * 1024 * 1024
+CONTAINER_MEMORY = 512 * 1024 * 1024
+# 后台清理和补充的间隔（秒）
+JANITOR_INTERVAL = 30
+
+POOL_LABEL = "aiforge.pool"
+OWNER_LABEL = "aiforge.pool.owner"
+CREATED_LABEL = "aiforge.pool.created"
+
+
+class WarmContainer:
+    __slots__ = ("container", "image", "image_id", "created_at")
+
+    def __init__(self, container, image: str, created_at: float):
+        self.container = container
+        self.image = image
+        # 创建时标签指向的镜像 ID；标签重新构建后这个容器不能再租出
+        self.image_id = container.attrs.get("Image")
+        self.created_at = created_at
+
+
+class WarmPool:
+    """
+    按镜像预先启动的空闲容器池：项目启动时直接租用一个并重命名为 project_<id>，
+    随后在后台补充；只为最近常用的镜像预热，受空闲时间和总内存预算限制。
+    池按标签组织，租用时核对标签当前指向的镜像 ID，重新构建之前启动的容器直接销毁
+    """
+
+    def __init__(self, engine, container_config: Callable[[str], dict],
+                 resolve_image: Optional[Callable[[str], Optional[str]]] = None):
+        self.engine = engine
+        # container_config(image) 返回创建项目容器所用的参数，保证预热容器与直接创建的一致
+        self.container_config = container_config
+        # resolve_image(tag) 返回标签当前指向的镜像 ID，未知时返回 None（不核对）
+        self.resolve_image = resolve_image
+        self.owner = uuid.uuid4().hex[:12]
+        self._idle: Dict[str, Deque[WarmContainer]] = {}
+        self._creating: Dict[str, int] = {}
+        self._refills: Dict[str, asyncio.Task] = {}
+        self._demand: Dict[str, List[float]] = {}  # 镜像 -> [使用次数, 最近使用时间]
+        self._janitor: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.stale = 0
+        self.failed = 0
+
+    # ---------- 租用 ----------
+
+    async def lease(self, image: str, name: str):
+        """取出一个空闲容器并重命名为 name，没有可用容器时返回 None"""
+        self._ensure_janitor()
+        demand = self._demand.setdefault(image, [0, 0.0])
+        demand[0] += 1
+        demand[1] = time.time()
+
+        idle = self._idle.get(image)
+        current = self.resolve_image(image) if self.resolve_image is not None else None
+        while idle:
+            warm = idle.popleft()
+            if current is not None and warm.image_id != current:
+                self.stale += 1
+                self._destroy(warm.container)
+                continue
+            if time.time() - warm.created_at > IDLE_TTL:
+                self.expired += 1
+                self._destroy(warm.container)
+                continue
+            try:
+                await self.engine.rename(warm.container, name)
+                await self.engine.reload(warm.container)
+                if warm.container.status != "running":
+                    raise RuntimeError(f"状态为 {warm.container.status}")
+            except Exception as e:
+                print(f"[WarmPool] 预热容器 {warm.container.id[:12]} 不可用: {e}")
+                self._destroy(warm.container)
+                continue
+            self.hits += 1
+            self._schedule_refill(image)
+            return warm.container
+
+        self.misses += 1
+        self._schedule_refill(image)
+        return None
+
+    # ---------- 补充 ----------
+
+    def _popular_images(self) -> List[str]:
+        now = time.time()
+        recent = [(count, image) for image, (count, last) in self._demand.items() if now - last <= DEMAND_TTL]
+        recent.sort(reverse=True)
+        return [image for _, image in recent[:POPULAR_IMAGES]]
+
+    def _reserved_memory(self) -> int:
+        count = sum(len(idle) for idle in self._idle.values()) + sum(self._creating.values())
+        return count * CONTAINER_MEMORY
+
+    def _schedule_refill(self, image: str):
+        task = self._refills.get(image)
+        if task is not None and not task.done():
+            return
+        if image not in self._popular_images():
+            return
+        self._refills[image] = asyncio.create_task(self._refill(image))
+
+    async def _refill(self, image: str):
+        idle = self._idle.setdefault(image, deque())
+        while len(idle) < WARM_POOL_SIZE:
+            if self._reserved_memory() + CONTAINER_MEMORY > MEMORY_BUDGET and not self._evict_for(image):
+                return
+            self._creating[image] = self._creating.get(image, 0) + 1
+            try:
+                container = await self._create(image)
+            except Exception as e:
+                self.failed += 1
+                print(f"[WarmPool] 预热 {image} 失败: {e}")
+                return
+            finally:
+                self._creating[image] -= 1
+            idle.append(WarmContainer(container, image, time.time()))
+            self.created += 1
+
+    async def _create(self, image: str):
+        name = f"warm_{re.sub(r'[^a-zA-Z0-9_.-]', '_', image)}_{uuid.uuid4().hex[:8]}"
+        config = dict(self.container_config(image))
+        config["labels"] = {**config.get("labels", {}), POOL_LABEL: "warm", OWNER_LABEL: self.owner,
+                            CREATED_LABEL: str(int(time.time()))}
+        container = await self.engine.create_container(image=image, name=name, **config)
+        try:
+            await self.engine.start(container)
+        except Exception:
+            self._destroy(container)
+            raise
+        return container
+
+    def discard(self, image: str):
+        """镜像重新构建后销毁该标签的全部空闲容器，下次租用时按新镜像补充"""
+        idle = self._idle.get(image)
+        while idle:
+            self.stale += 1
+            self._destroy(idle.popleft().container)
+
+    def _evict_for(self, image: str) -> bool:
+        """为 image 腾出预算：销毁一个使用次数更少的镜像的空闲容器"""
+        count = self._demand.get(image, [0])[0]
+        candidates = [(self._demand.get(other, [0])[0], other) for other, idle in self._idle.items()
+                      if other != image and idle]
+        if not candidates:
+            return False
+        victim_count, victim = min(candidates)
+        if victim_count >= count:
+            return False
+        self._destroy(self._idle[victim].pop().container)
+        self.evicted += 1
+        return True
+
+    def _destroy(self, container):
+        asyncio.create_task(self._remove(container))
+
+    async def _remove(self, container):
+        try:
+            await self.engine.remove(container, force=True)
+        except Exception as e:
+            print(f"[WarmPool] 删除预热容器失败: {e}")
+
+    # ---------- 后台清理 ----------
+
+    def _ensure_janitor(self):
+        if self._janitor is None or self._janitor.done():
+            self._janitor = asyncio.create_task(self._run_janitor())
+
+    async def _run_janitor(self):
+        await self._remove_orphans()
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL)
+            try:
+                self._expire()
+                for image in self._popular_images():
+                    self._schedule_refill(image)
+            except Exception as e:
+                print(f"[WarmPool] 清理失败: {e}")
+
+    def _expire(self):
+        now = time.time()
+        popular = set(self._popular_images())
+        for image, idle in self._idle.items():
+            keep = deque()
+            for warm in idle:
+                if image not in popular:
+                    self.evicted += 1
+                    self._destroy(warm.container)
+                elif now - warm.created_at > IDLE_TTL:
+                    self.expired += 1
+                    self._destroy(warm.container)
+                else:
+                    keep.append(warm)
+            idle.clear()
+            idle.extend(keep)
+
+    async def _remove_orphans(self):
+        """删除其他进程遗留且已超过空闲时间的预热容器（例如服务异常退出）"""
+        try:
+            containers = await self.engine.list_containers(all=True, filters={"label": f"{POOL_LABEL}=warm"})
+        except Exception as e:
+            print(f"[WarmPool] 查询遗留预热容器失败: {e}")
+            return
+        now = time.time()
+        for container in containers:
+            labels = container.labels or {}
+            if labels.get(OWNER_LABEL) == self.owner or not container.name.startswith("warm_"):
+                continue
+            if now - int(labels.get(CREATED_LABEL, 0)) > IDLE_TTL:
+                await self._remove(container)
+
+    async def close(self):
+        """停止后台任务并删除所有空闲容器"""
+        tasks = [task for task in self._refills.values() if not task.done()]
+        if self._janitor is not None:
+            tasks.append(self._janitor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        idle = [warm.container for pool in self._idle.values() for warm in pool]
+        self._idle.clear()
+        await asyncio.gather(*(self._remove(container) for container in idle))
+
+    def stats(self) -> dict:
+        leases = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / leases, 4) if leases else None,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "stale": self.stale,
+            "failed": self.failed,
+            "idle": {image: len(idle) for image, idle in self._idle.items() if idle},
+            "popular_images": self._popular_images(),
+            "memory_reserved": self._reserved_memory(),
+            "memory_budget": MEMORY_BUDGET,
+        }
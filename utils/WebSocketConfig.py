@@ -1,28 +1,356 @@
+import asyncio
 import json
 import uuid
-from typing import Dict, List
+from collections import deque
+from typing import Dict, List, Optional
 from fastapi import WebSocket
 
-active_connections: List[WebSocket] = []
-subscriptions: Dict[str, List[WebSocket]] = {}
+from config.settings import LOG_BROKER_URL
+from utils.Broker import LogBroker, create_broker
 
+# 每个项目频道的日志环形缓冲区上限（行数、估算内存），用于订阅时回放；
+# 订阅者落后超出缓冲区时跳过最旧的日志
+LOG_BUFFER_LINES = 5000
+LOG_BUFFER_BYTES = 2 * 1024 * 1024
+# 每条日志除文本外的估算内存开销
+ENTRY_OVERHEAD = 120
+# 写任务单次最多取出的日志条数
+SEND_CHUNK = 256
+# 单次发送超时时间（秒），超时视为连接已失效
+SEND_TIMEOUT = 10
 
-async def broadcast_to_project(project_id: int, message: str, command: str):
+MESSAGE_TYPES = {
+    "train": "log",
+    "predict": "chat",
+    "job": "job",
+    "build": "build",
+}
+# 二进制批量帧的首字节：消息类型编码
+BINARY_TYPE_CODES = {
+    "log": 0,
+    "chat": 1,
+    "job": 2,
+    "build": 3,
+}
+
+
+class Entry:
+    """
+    频道中的一条日志，seq 在项目内单调递增，客户端据此断点续传；
+    旧协议的 JSON 帧在第一次需要时才序列化
+    """
+    __slots__ = ("seq", "message", "type", "_frame")
+
+    def __init__(self, seq: int, message: str, type: str):
+        self.seq = seq
+        self.message = message
+        self.type = type
+        self._frame = None
+
+    @property
+    def size(self) -> int:
+        return len(self.message) + ENTRY_OVERHEAD
+
+    def frame(self) -> str:
+        if self._frame is None:
+            self._frame = json.dumps({"message_id": str(uuid.uuid4()), 'message': self.message, 'type': self.type,
+                                      "entry": 'info', "seq": self.seq})
+        return self._frame
+
+
+class BatchOptions:
+    """
+    批量模式参数，由订阅消息中的 batch 字段指定，例如
+    {"action": "subscribe", "channel": "project_1", "batch": {"interval_ms": 100, "max_kb": 16, "binary": true}}
+    """
+
+    def __init__(self, interval_ms: int = 100, max_kb: int = 16, binary: bool = False):
+        self.interval = max(int(interval_ms), 1) / 1000
+        self.max_bytes = max(int(max_kb), 1) * 1024
+        self.binary = bool(binary)
+
+    @staticmethod
+    def from_message(batch) -> Optional["BatchOptions"]:
+        if not batch:
+            return None
+        if batch is True:
+            return BatchOptions()
+        return BatchOptions(interval_ms=batch.get("interval_ms", 100), max_kb=batch.get("max_kb", 16),
+                            binary=batch.get("binary", False))
+
+
+def encode_batch(msg_type: str, seq: int, lines: List[str], binary: bool):
+    """
+    将同一类型、序号连续的多行日志编码为一个帧，seq 为第一行的序号：
+    文本模式为 {"type": "log", "seq": 0, "lines": [...]}，
+    二进制模式为 1 字节类型编码 + 8 字节大端序号 + 以换行分隔的 UTF-8 文本
     """
-    向某个项目频道的所有订阅者广播消息
-    """
-    websockets = subscriptions[str(project_id)]
-    print(f"subscriptions: {subscriptions} {websockets} {project_id}")
-    if websockets is None:
-        print(f"[Warning] 没有订阅者，项目 {project_id} 的消息无法广播")
-        return
-    unique_string = str(uuid.uuid4())
-    type = {
-        "train": "log",
-        "predict": "chat",
-    }
-    for ws in websockets:
+    if binary:
+        header = bytes((BINARY_TYPE_CODES.get(msg_type, 0),)) + seq.to_bytes(8, "big")
+        return header + "\n".join(lines).encode("utf-8")
+    return json.dumps({"type": msg_type, "seq": seq, "lines": lines}, ensure_ascii=False)
+
+
+class Subscriber:
+    """
+    单个 WebSocket 订阅者：拥有独立的发送游标和写任务，
+    慢客户端只会丢弃自己落后的旧消息，不会拖慢其他订阅者和日志生产者
+    """
+
+    def __init__(self, websocket: WebSocket, channel: "Channel", batch: Optional[BatchOptions] = None,
+                 cursor: Optional[int] = None):
+        self.websocket = websocket
+        self.channel = channel
+        self.batch = batch
+        self.cursor = channel.next_seq if cursor is None else cursor
+        self.sent = 0
+        self.dropped = 0
+        self.task = asyncio.create_task(self._batch_writer() if batch else self._writer())
+
+    def _take(self) -> List[Entry]:
+        entries, dropped = self.channel.entries_since(self.cursor)
+        if dropped:
+            self.dropped += dropped
+            self.channel.dropped += dropped
+        self.cursor += dropped + len(entries)
+        return entries
+
+    async def _writer(self):
+        """旧协议：每行一个 JSON 帧"""
         try:
-            await ws.send_text(json.dumps({"message_id": unique_string, 'message': message, 'type': type[command], "entry": 'info'}))
+            while True:
+                await self.channel.wait_for(self.cursor)
+                entries = self._take()
+                await asyncio.wait_for(self._send([(entry.frame(), 1) for entry in entries]), SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"[WebSocket] 发送失败: {e}")
+            self._evict(e)
+
+    async def _batch_writer(self):
+        """批量协议：每 interval 或累计超过 max_bytes 时合并为一个帧发送"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await self.channel.wait_for(self.cursor)
+                deadline = loop.time() + self.batch.interval
+                pending: List[Entry] = []
+                size = 0
+                while True:
+                    entries = self._take()
+                    pending.extend(entries)
+                    size += sum(len(entry.message) + 1 for entry in entries)
+                    remaining = deadline - loop.time()
+                    if size >= self.batch.max_bytes or remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self.channel.wait_for(self.cursor), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                await asyncio.wait_for(self._send(self._encode(pending)), SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._evict(e)
+
+    def _encode(self, entries: List[Entry]):
+        """按消息类型分组，连续且序号相邻的同类型日志合并为一帧"""
+        frames = []
+        lines = []
+        msg_type = None
+        first_seq = next_seq = 0
+        for entry in entries:
+            if lines and (entry.type != msg_type or entry.seq != next_seq):
+                frames.append((encode_batch(msg_type, first_seq, lines, self.batch.binary), len(lines)))
+                lines = []
+            if not lines:
+                first_seq = entry.seq
+            msg_type = entry.type
+            next_seq = entry.seq + 1
+            lines.append(entry.message)
+        if lines:
+            frames.append((encode_batch(msg_type, first_seq, lines, self.batch.binary), len(lines)))
+        return frames
+
+    async def _send(self, frames):
+        for frame, count in frames:
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+            self.sent += count
+            self.channel.delivered += count
+            self.channel.frames_sent += 1
+            self.channel.bytes_sent += len(frame)
+
+    def _evict(self, e: Exception):
+        print(f"[WebSocket] 发送失败，移除订阅者: {e}")
+        self.channel.evicted += 1
+        self.channel.subscribers.pop(self.websocket, None)
+
+    def close(self):
+        if not self.task.done():
+            self.task.cancel()
+
+
+class Channel:
+    """
+    项目频道：所有订阅者共享一个按行数和内存限制的日志环形缓冲区，
+    发布只需追加一次，与订阅者数量无关；新订阅者可从缓冲区回放历史日志
+    """
+
+    def __init__(self, project_id: str, max_lines: int = LOG_BUFFER_LINES, max_bytes: int = LOG_BUFFER_BYTES):
+        self.project_id = project_id
+        self.subscribers: Dict[WebSocket, Subscriber] = {}
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.entries = deque()
+        self.buffer_bytes = 0
+        self.next_seq = 0
+        # 其他 worker 转发来的最后一行在该 worker 中的序号，用于去重；本地序号在收到时重新分配
+        self.remote_seq: Dict[str, int] = {}
+        self._new_entry = asyncio.Event()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+
+    @property
+    def first_seq(self) -> int:
+        """缓冲区中最旧一行的序号"""
+        return self.next_seq - len(self.entries)
+
+    def replay_cursor(self, since: Optional[int] = None, last: Optional[int] = None) -> int:
+        """
+        计算订阅的起始序号：since 为客户端已收到的最后一行序号，
+        last 为回放最近的行数，均未指定时只接收新日志
+        """
+        if since is not None:
+            # 序号超出当前范围（例如后端重启后序号重新计数）时从最新位置开始
+            return min(max(int(since) + 1, self.first_seq), self.next_seq)
+        if last:
+            return max(self.next_seq - int(last), self.first_seq)
+        return self.next_seq
+
+    def add(self, websocket: WebSocket, batch: Optional[BatchOptions] = None, cursor: Optional[int] = None):
+        self.remove(websocket)
+        self.subscribers[websocket] = Subscriber(websocket, self, batch, cursor)
+
+    def remove(self, websocket: WebSocket):
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is not None:
+            subscriber.close()
+
+    def publish(self, message: str, msg_type: str) -> Entry:
+        """追加一行日志，分配本频道的下一个序号"""
+        entry = Entry(self.next_seq, message, msg_type)
+        self.entries.append(entry)
+        self.buffer_bytes += entry.size
+        while len(self.entries) > self.max_lines or (self.buffer_bytes > self.max_bytes and len(self.entries) > 1):
+            self.buffer_bytes -= self.entries.popleft().size
+        self.next_seq += 1
+        self.published += 1
+        # 唤醒所有等待中的写任务
+        event, self._new_entry = self._new_entry, asyncio.Event()
+        event.set()
+        return entry
+
+    def publish_remote(self, origin: str, seq: int, message: str, msg_type: str) -> Optional[Entry]:
+        """
+        追加其他 worker 转发来的一行日志：seq 是该行在 origin 频道中的序号，各 worker 独立计数，
+        只用来按 origin 去重（例如重连后重新发布的批次），写入时分配本频道的序号
+        """
+        if seq <= self.remote_seq.get(origin, -1):
+            return None
+        self.remote_seq[origin] = seq
+        return self.publish(message, msg_type)
+
+    async def wait_for(self, seq: int):
+        """等待序号为 seq 的消息发布"""
+        while self.next_seq <= seq:
+            await self._new_entry.wait()
+
+    def entries_since(self, seq: int, limit: int = SEND_CHUNK):
+        """返回从 seq 开始的至多 limit 条日志，以及已被挤出缓冲区而跳过的条数"""
+        first = self.first_seq
+        dropped = max(first - seq, 0)
+        start = max(seq - first, 0)
+        end = min(start + limit, len(self.entries))
+        entries = self.entries
+        # deque 按下标访问时从较近的一端开始，尾部读取无需遍历整个缓冲区
+        return [entries[i] for i in range(start, end)], dropped
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "first_seq": self.first_seq,
+            "next_seq": self.next_seq,
+            "buffered_lines": len(self.entries),
+            "buffered_bytes": self.buffer_bytes,
+        }
+
+
+active_connections: List[WebSocket] = []
+subscriptions: Dict[str, Channel] = {}
+broker: LogBroker = create_broker(LOG_BROKER_URL)
+
+
+def get_channel(project_id) -> Channel:
+    project_id = str(project_id)
+    channel = subscriptions.get(project_id)
+    if channel is None:
+        channel = subscriptions[project_id] = Channel(project_id)
+    return channel
+
+
+def subscribe(project_id, websocket: WebSocket, batch: Optional[BatchOptions] = None,
+              since: Optional[int] = None, last: Optional[int] = None) -> int:
+    """
+    将 WebSocket 加入项目频道，batch 为空时使用旧的逐行协议；
+    先从环形缓冲区回放 since/last 指定的历史日志再切换为实时推送，返回回放起始序号
+    """
+    channel = get_channel(project_id)
+    cursor = channel.replay_cursor(since, last)
+    channel.add(websocket, batch, cursor)
+    return cursor
+
+
+def unsubscribe_all(websocket: WebSocket):
+    """连接断开时从所有频道移除"""
+    for channel in subscriptions.values():
+        channel.remove(websocket)
+
+
+def channel_stats() -> dict:
+    """各项目频道的发送计数"""
+    return {project_id: channel.stats() for project_id, channel in subscriptions.items()}
+
+
+def _deliver_remote(origin: str, project_id: str, seq: int, message: str, msg_type: str):
+    """写入其他 worker 转发来的日志"""
+    get_channel(project_id).publish_remote(origin, seq, message, msg_type)
+
+
+async def start_broker():
+    await broker.start(_deliver_remote)
+
+
+async def stop_broker():
+    await broker.stop()
+
+
+async def broadcast_to_project(project_id: int, message: str, command: str):
+    """
+    向某个项目频道的所有订阅者广播消息，只负责写入环形缓冲区，不等待发送完成；
+    多 worker 部署时同时经日志代理转发给其他 worker
+    """
+    entry = get_channel(project_id).publish(message, MESSAGE_TYPES[command])
+    broker.forward(str(project_id), entry.seq, entry.message, entry.type)